@@ -1,25 +1,102 @@
 #!/usr/bin/env python3
 import os
-from fastapi import FastAPI, HTTPException
+import base64
+import gzip
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-import yt_dlp
 from database import Database
-import redis
+from ingestion import DownloadManager
+from audio_pcm import find_pcm
+from jobs import queue_keys
+from workers import count_by_kind, queue_active_workers
+from video_cache import VideoCache
+from events import EventHub, format_sse, stream_id_key
+import metrics
+from metrics import gauge, histogram, render, worker_sources
+import redis.asyncio as aioredis
 from config import *
 
 app = FastAPI()
 db = Database()
+video_cache = VideoCache(db)
+# Client Redis asyncio partagé par toutes les requêtes (créé au démarrage)
+redis_client = None
+# Diffusion SSE des événements publiés par les workers
+event_hub = None
 
-# Configuration de yt-dlp
-ydl_opts = {
-    'format': 'bestaudio/best',
-    'postprocessors': [{
-        'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'mp3',
-        'preferredquality': '192',
-    }],
-    'outtmpl': os.path.join(AUDIO_DIR, '%(id)s.%(ext)s'),
-}
+REQUEST_SECONDS = histogram(
+    "http_request_seconds", "Latence des handlers de l'API jusqu'à l'envoi des en-têtes", ["method", "handler", "status"]
+)
+QUEUE_DEPTH = gauge("queue_depth", "Tâches en attente par queue", ["queue"])
+QUEUE_DELAYED = gauge("queue_delayed", "Tâches en attente d'un nouvel essai", ["queue"])
+QUEUE_DEAD = gauge("queue_dead", "Tâches en lettres mortes", ["queue"])
+ACTIVE_WORKERS = gauge("active_workers", "Workers ayant signalé leur présence", ["kind"])
+EVENT_CLIENTS = gauge("event_clients", "Clients connectés à /api/events")
+
+class RequestMetricsMiddleware:
+    """Chronomètre chaque requête HTTP, par handler et statut
+
+    Middleware ASGI pur: la durée est mesurée jusqu'au début de la réponse,
+    ce qui vaut aussi pour les flux SSE de longue durée.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                # Renseigné par le routeur; le nom du handler garde une cardinalité bornée
+                endpoint = scope.get("endpoint")
+                handler = getattr(endpoint, "__name__", "unmatched")
+                REQUEST_SECONDS.labels(scope["method"], handler, message["status"]).observe(time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
+
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.on_event("startup")
+def setup_database():
+    db.setup_database()
+
+@app.on_event("startup")
+async def open_redis():
+    global redis_client
+    pool = aioredis.ConnectionPool(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, max_connections=REDIS_MAX_CONNECTIONS
+    )
+    redis_client = aioredis.Redis(connection_pool=pool)
+    video_cache.redis = redis_client if VIDEO_CACHE_REDIS else None
+    global event_hub
+    event_hub = EventHub(redis_client, status_source=queue_status)
+    event_hub.start()
+
+@app.on_event("shutdown")
+async def close_redis():
+    if event_hub is not None:
+        await event_hub.stop()
+    if redis_client is not None:
+        await redis_client.close()
+        await redis_client.connection_pool.disconnect()
+
+# Les téléchargements tournent dans un pool de threads, hors de la boucle d'événements
+downloads = DownloadManager(db)
+
+async def in_thread(function, *args):
+    """Appel bloquant (MySQL, disque) exécuté dans le pool de threads par défaut"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
 
 class VideoRequest(BaseModel):
     youtube_id: str
@@ -27,84 +104,278 @@ class VideoRequest(BaseModel):
 @app.post("/api/videos")
 async def add_video(video: VideoRequest):
     try:
-        # Vérifier si le dossier audio existe
-        os.makedirs(AUDIO_DIR, exist_ok=True)
-        
-        # Télécharger l'audio de la vidéo YouTube
-        video_url = f"https://www.youtube.com/watch?v={video.youtube_id}"
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([video_url])
-        
-        # Chemin du fichier audio
-        audio_path = os.path.join(AUDIO_DIR, f"{video.youtube_id}.mp3")
-        
-        # Ajouter l'entrée dans la base de données
-        video_id = db.add_video(video.youtube_id, audio_path)
-        
-        # Ajouter le fichier à la queue de traitement
-        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-        redis_client.lpush(TRANSCRIPTION_QUEUE, audio_path)
-        
+        # Insertion MySQL et XADD de l'événement `created`: hors de la boucle d'événements
+        job, created = await in_thread(downloads.submit, video.youtube_id)
         return {
             "status": "success",
-            "message": "Vidéo ajoutée avec succès",
-            "video_id": video_id,
-            "youtube_id": video.youtube_id
+            "message": "Vidéo ajoutée avec succès" if created else "Vidéo déjà en cours de téléchargement",
+            "video_id": job.video_id,
+            "youtube_id": video.youtube_id,
+            "job_id": job.id,
+            "job_status": job.status
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def serialize_video(video_data):
+    """Sérialisation identique à la réponse JSON par défaut de FastAPI"""
+    return json.dumps(jsonable_encoder(video_data), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match: `*` ou liste d'ETags séparés par des virgules, comparaison faible (W/)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
 @app.get("/api/videos/{video_id}")
-async def get_video(video_id: int):
+async def get_video(video_id: int, request: Request):
     try:
-        video_data = db.get_video(video_id)
-        if not video_data:
+        job = downloads.get_job(video_id)
+        if job:
+            # Téléchargement récent: la progression change sans écriture en base, pas de cache
+            video_data = await in_thread(db.get_video, video_id)
+            if not video_data:
+                raise HTTPException(status_code=404, detail="Vidéo non trouvée")
+            video_data["download"] = job.to_dict()
+            return video_data
+
+        try:
+            version = await video_cache.version(video_id)
+        except Exception as e:
+            print(f"Cache vidéo indisponible: {e}")
+            video_data = await in_thread(db.get_video, video_id)
+            if not video_data:
+                raise HTTPException(status_code=404, detail="Vidéo non trouvée")
+            return video_data
+        if version is None:
+            raise HTTPException(status_code=404, detail="Vidéo non trouvée")
+
+        # La vidéo existe (version non nulle): If-None-Match peut être honoré
+        etag = video_cache.etag(video_id, version)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        def load():
+            video_data = db.get_video(video_id)
+            return serialize_video(video_data) if video_data else None
+
+        body = await video_cache.get_body(video_id, version, load)
+        if body is None:
             raise HTTPException(status_code=404, detail="Vidéo non trouvée")
-        return video_data
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = gzip.decompress(body)
+        headers["Vary"] = "Accept-Encoding"
+        return Response(content=body, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def encode_cursor(key):
+    created_at, video_id = key
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{video_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, video_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(video_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+@app.get("/api/videos/{video_id}/segments")
+async def get_video_segments(
+    video_id: int,
+    start: Optional[float] = Query(None, alias="from"),
+    end: Optional[float] = Query(None, alias="to"),
+    words: bool = False
+):
+    """Segments de la transcription compris dans une plage horaire (en secondes)"""
+    try:
+        segments = await in_thread(db.get_segments, video_id, start, end, words)
+        if segments is None:
+            raise HTTPException(status_code=404, detail="Transcription non trouvée")
+        return {"video_id": video_id, "from": start, "to": end, "segments": segments}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/videos")
-async def list_videos():
-    """Liste toutes les vidéos"""
+async def list_videos(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = Query(None, regex="^(pending|processing|completed|error)$")
+):
+    """Liste les vidéos par pages, sans les transcriptions
+
+    La transcription complète reste disponible via GET /api/videos/{id}.
+    """
     try:
-        videos = db.get_all_videos()
-        return videos
+        after = decode_cursor(cursor) if cursor else None
+        videos, next_key = await in_thread(db.get_videos_page, limit, after, status)
+        return {
+            "items": videos,
+            "next_cursor": encode_cursor(next_key) if next_key else None
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def queue_status():
+    """État des queues et des workers, lu dans Redis en un seul aller-retour"""
+    pipe = redis_client.pipeline(transaction=False)
+    for queue in (TRANSCRIPTION_QUEUE, TRANSLATION_QUEUE):
+        keys = queue_keys(queue)
+        pipe.llen(queue)
+        pipe.zcard(keys["delayed"])
+        pipe.llen(keys["dead"])
+    queue_active_workers(pipe)
+    (transcription, transcription_delayed, transcription_dead,
+     translation, translation_delayed, translation_dead, _, workers) = await pipe.execute()
+    return {
+        "transcription_queue": transcription,
+        "translation_queue": translation,
+        "transcription_retries": transcription_delayed,
+        "transcription_dead": transcription_dead,
+        "translation_retries": translation_delayed,
+        "translation_dead": translation_dead,
+        "active_workers": count_by_kind(workers),
+    }
+
 @app.get("/api/system/status")
 async def system_status():
     """Obtient l'état du système"""
     try:
-        redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-        return {
-            "transcription_queue": redis_client.llen(TRANSCRIPTION_QUEUE),
-            "translation_queue": redis_client.llen(TRANSLATION_QUEUE),
-            "active_workers": count_active_workers()
-        }
+        status = await queue_status()
+        status["database"] = await in_thread(db.get_metrics)
+        status["video_cache"] = video_cache.stats()
+        status["event_clients"] = len(event_hub.subscribers) if event_hub else 0
+        return status
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métriques de l'API et des workers au format texte Prometheus"""
+    status = await queue_status()
+    for queue, name in ((TRANSCRIPTION_QUEUE, "transcription"), (TRANSLATION_QUEUE, "translation")):
+        QUEUE_DEPTH.labels(queue).set(status[f"{name}_queue"])
+        QUEUE_DELAYED.labels(queue).set(status[f"{name}_retries"])
+        QUEUE_DEAD.labels(queue).set(status[f"{name}_dead"])
+    for kind in list(ACTIVE_WORKERS.children):
+        ACTIVE_WORKERS.labels(*kind).set(0)
+    for kind, count in status["active_workers"].items():
+        ACTIVE_WORKERS.labels(kind).set(count)
+    EVENT_CLIENTS.set(len(event_hub.subscribers) if event_hub else 0)
+
+    # Instantanés poussés par les workers avec leur signal de présence
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(METRICS_KEY)
+    pipe.zrange(WORKERS_KEY, 0, -1)
+    raw, members = await pipe.execute()
+    sources, stale = worker_sources(raw, members)
+    if stale:
+        await redis_client.hdel(METRICS_KEY, *stale)
+
+    body = render([(metrics.registry.dump(), [])] + sources)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/events")
+async def stream_events(request: Request, video_id: Optional[int] = None):
+    """Progression des tâches en Server-Sent Events (voir events.py)
+
+    Sans `video_id`, le client reçoit les événements de toutes les vidéos et
+    un instantané de l'état des queues toutes les EVENTS_STATUS_INTERVAL
+    secondes.
+    """
+    if event_hub is None:
+        raise HTTPException(status_code=503, detail="Événements indisponibles")
+    if len(event_hub.subscribers) >= EVENTS_MAX_CLIENTS:
+        raise HTTPException(status_code=503, detail="Trop de clients connectés")
+
+    subscription = event_hub.subscribe(video_id)
+    last_event_id = request.headers.get("last-event-id")
+
+    async def generate():
+        try:
+            # Abonné avant le rejeu: rien n'est perdu, les doublons sont écartés par id
+            last_sent = None
+            if last_event_id:
+                try:
+                    missed = await event_hub.replay(last_event_id)
+                except Exception as e:
+                    print(f"Rejeu impossible depuis {last_event_id}: {e}")
+                    missed = [{"event": "resync"}]
+                for event in missed:
+                    if subscription.wants(event):
+                        yield format_sse(event)
+                    last_sent = event.get("id", last_sent)
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await subscription.get(EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if last_sent and "id" in event and stream_id_key(event["id"]) <= stream_id_key(last_sent):
+                    continue
+                yield format_sse(event)
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def remove_video(video_id):
+    """Supprime les fichiers puis la ligne d'une vidéo; False si elle n'existe pas"""
+    video = db.get_video(video_id)
+    if not video:
+        return False
+
+    # Supprimer les fichiers
+    if os.path.exists(video["audio_path"]):
+        os.remove(video["audio_path"])
+    chemin_pcm = find_pcm(video["audio_path"])
+    if chemin_pcm:
+        os.remove(chemin_pcm)
+
+    # Supprimer de la base de données
+    db.delete_video(video_id)
+    return True
+
 @app.delete("/api/videos/{video_id}")
 async def delete_video(video_id: int):
     """Supprime une vidéo et ses fichiers associés"""
     try:
-        video = db.get_video(video_id)
-        if not video:
+        if not await in_thread(remove_video, video_id):
             raise HTTPException(status_code=404, detail="Vidéo non trouvée")
-            
-        # Supprimer les fichiers
-        if os.path.exists(video["audio_path"]):
-            os.remove(video["audio_path"])
-            
-        # Supprimer de la base de données
-        db.delete_video(video_id)
         return {"status": "success", "message": "Vidéo supprimée"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("shutdown")
+def shutdown_downloads():
+    downloads.shutdown()
+    db.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import os
+import subprocess
+import numpy as np
+
+# Format attendu par WhisperX: 16 kHz, mono, float32
+SAMPLE_RATE = 16000
+PCM_SUFFIX = ".16k.f32"
+
+def pcm_path(audio_path):
+    """Chemin de l'artefact PCM associé à un fichier audio"""
+    return os.path.splitext(audio_path)[0] + PCM_SUFFIX
+
+def decode_to_pcm(audio_path, output_path=None):
+    """Décode un fichier audio une seule fois en PCM 16 kHz mono float32 brut
+
+    Le fichier produit n'a pas d'en-tête: il peut être mappé en mémoire tel
+    quel et passé directement à WhisperX.
+    """
+    output_path = output_path or pcm_path(audio_path)
+    temp_path = output_path + ".tmp"
+    commande = [
+        "ffmpeg", "-nostdin", "-y",
+        "-threads", "0",
+        "-i", audio_path,
+        "-f", "f32le",
+        "-ac", "1",
+        "-acodec", "pcm_f32le",
+        "-ar", str(SAMPLE_RATE),
+        temp_path
+    ]
+    try:
+        subprocess.run(commande, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(f"Échec du décodage de {audio_path}: {e.stderr.decode(errors='replace')}") from e
+    os.replace(temp_path, output_path)
+    return output_path
+
+def load_pcm(path):
+    """Mappe un artefact PCM en mémoire sans le copier"""
+    return np.memmap(path, dtype=np.float32, mode="r")
+
+def find_pcm(audio_path):
+    """Retourne l'artefact PCM d'un fichier audio s'il existe"""
+    path = pcm_path(audio_path)
+    return path if os.path.exists(path) else None
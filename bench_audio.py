@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Compare le chemin MP3 historique et l'artefact PCM 16 kHz
+
+Pour chaque fichier, on mesure:
+  - chemin MP3: encodage MP3 192 kbps (post-traitement yt-dlp) puis décodage
+    en PCM 16 kHz comme le fait whisperx.load_audio à chaque transcription;
+  - chemin PCM: décodage unique en artefact float32 puis lecture mappée en
+    mémoire par le worker.
+
+Les fichiers de `audios/` sont déjà en MP3: ils servent ici de flux "natif".
+
+Usage: python bench_audio.py [fichier_audio ...]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from audio_pcm import SAMPLE_RATE, decode_to_pcm, load_pcm
+
+FICHIERS_PAR_DEFAUT = ["audios/cartma.mp3", "audios/vedo.mp3"]
+
+def encoder_mp3(source, destination):
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-y", "-i", source, "-vn", "-acodec", "libmp3lame", "-b:a", "192k", destination],
+        check=True, capture_output=True
+    )
+
+def decoder_comme_whisperx(chemin):
+    """Équivalent de whisperx.load_audio (s16le via un pipe FFmpeg)"""
+    sortie = subprocess.run(
+        ["ffmpeg", "-nostdin", "-threads", "0", "-i", chemin, "-f", "s16le",
+         "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"],
+        check=True, capture_output=True
+    ).stdout
+    return np.frombuffer(sortie, np.int16).flatten().astype(np.float32) / 32768.0
+
+def lire_pcm(chemin):
+    """Mappe l'artefact et force la lecture de toutes les pages"""
+    audio = load_pcm(chemin)
+    np.sum(audio)
+    return audio
+
+def chronometrer(fonction, *args):
+    debut = time.perf_counter()
+    resultat = fonction(*args)
+    return resultat, time.perf_counter() - debut
+
+def mesurer(source, repertoire):
+    nom = os.path.splitext(os.path.basename(source))[0]
+
+    chemin_mp3 = os.path.join(repertoire, f"{nom}.mp3")
+    _, temps_encodage = chronometrer(encoder_mp3, source, chemin_mp3)
+    audio_mp3, temps_decodage = chronometrer(decoder_comme_whisperx, chemin_mp3)
+
+    chemin_pcm = os.path.join(repertoire, f"{nom}.16k.f32")
+    _, temps_artefact = chronometrer(decode_to_pcm, source, chemin_pcm)
+    audio_pcm, temps_lecture = chronometrer(lire_pcm, chemin_pcm)
+
+    return {
+        "fichier": os.path.basename(source),
+        "duree": len(audio_pcm) / SAMPLE_RATE,
+        "mp3_ingestion": temps_encodage,
+        "mp3_chargement": temps_decodage,
+        # FFmpegExtractAudio supprime l'original après conversion: seul le mp3 reste
+        "mp3_disque": os.path.getsize(chemin_mp3),
+        "pcm_ingestion": temps_artefact,
+        "pcm_chargement": temps_lecture,
+        "pcm_disque": os.path.getsize(source) + os.path.getsize(chemin_pcm),
+        "echantillons": (len(audio_mp3), len(audio_pcm))
+    }
+
+def main():
+    fichiers = sys.argv[1:] or FICHIERS_PAR_DEFAUT
+    with tempfile.TemporaryDirectory() as repertoire:
+        for source in fichiers:
+            r = mesurer(source, repertoire)
+            print("=" * 60)
+            print(f"{r['fichier']} ({r['duree']:.1f}s d'audio)")
+            print(f"{'':<8}{'ingestion':>12}{'chargement':>14}{'disque':>14}")
+            print(f"{'MP3':<8}{r['mp3_ingestion']:>11.2f}s{r['mp3_chargement']:>13.3f}s{r['mp3_disque'] / 1e6:>11.1f} MB")
+            print(f"{'PCM':<8}{r['pcm_ingestion']:>11.2f}s{r['pcm_chargement']:>13.3f}s{r['pcm_disque'] / 1e6:>11.1f} MB")
+            print(f"Échantillons (MP3, PCM): {r['echantillons']}")
+
+if __name__ == "__main__":
+    main()
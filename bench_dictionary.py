@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Latence de `dict_cli.py search`: balayage LIKE '%mot%' contre la recherche indexée
+
+Sans --db, un dictionnaire synthétique de la taille de de-en.txt est généré
+dans un fichier temporaire (schéma de translate_dictionary.py).
+
+Usage: python bench_dictionary.py [--db dictionary.sqlite] [--rows 1000000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from dictionary_search import ensure_search_index, search
+
+SYLLABES = ["haus", "auf", "gabe", "bahn", "hof", "stra", "ße", "schön", "müll", "über",
+            "ge", "hen", "zeit", "ung", "keit", "wald", "berg", "tür", "bäck", "er",
+            "kin", "der", "gar", "ten", "arbeit", "los", "spiel", "platz", "wort", "buch"]
+REQUETES = ["Haus", "Bahnhof", "schön", "Strasse", "Spielplatz", "Kindergarten", "Arbeit", "Tür"]
+
+def creer_dictionnaire(chemin, lignes):
+    conn = sqlite3.connect(chemin)
+    conn.execute("""
+        CREATE TABLE dictionary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            de TEXT NOT NULL,
+            en TEXT NOT NULL,
+            fr TEXT NOT NULL,
+            wordType TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    aleatoire = random.Random(42)
+
+    def mot():
+        texte = "".join(aleatoire.choice(SYLLABES) for _ in range(aleatoire.randint(1, 4)))
+        return texte[:1].upper() + texte[1:]
+
+    conn.executemany(
+        "INSERT INTO dictionary (de, en, fr, wordType) VALUES (?, ?, ?, ?)",
+        ((mot(), f"word {i}", f"mot {i}", "n") for i in range(lignes))
+    )
+    for lang in ("de", "en", "fr"):
+        conn.execute(f"CREATE INDEX idx_{lang} ON dictionary({lang})")
+    conn.commit()
+    return conn
+
+def mesurer(fonction, repetitions=5):
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append(1000 * (time.perf_counter() - debut))
+    return statistics.median(durees)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Dictionnaire existant (copié avant indexation si besoin)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as repertoire:
+        if args.db:
+            conn = sqlite3.connect(args.db)
+        else:
+            print(f"Génération de {args.rows} entrées...")
+            conn = creer_dictionnaire(os.path.join(repertoire, "dictionary.sqlite"), args.rows)
+
+        debut = time.perf_counter()
+        if ensure_search_index(conn):
+            print(f"Index de recherche créé en {time.perf_counter() - debut:.1f}s")
+
+        print(f"{'requête':<14}{'LIKE':>10}{'indexée':>10}{'fuzzy':>10}   (ms, médiane)")
+        for mot_cherche in REQUETES:
+            like = mesurer(lambda: conn.execute(
+                "SELECT de, en, fr, wordType FROM dictionary WHERE de LIKE ? LIMIT 10",
+                (f"%{mot_cherche}%",)
+            ).fetchall())
+            indexee = mesurer(lambda: search(conn, mot_cherche))
+            fuzzy = mesurer(lambda: search(conn, mot_cherche, fuzzy=True, limit=50))
+            print(f"{mot_cherche:<14}{like:>10.2f}{indexee:>10.2f}{fuzzy:>10.2f}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
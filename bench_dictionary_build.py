@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Débit de `translate_dictionary.py --bulk` de 1 à N processus de traduction
+
+Chaque mesure part d'une base vide dans un répertoire temporaire et traduit
+les mêmes premières lignes de de-en.txt.
+
+Usage: python bench_dictionary_build.py [--max-workers N] [--lines 20000] [--chunk-lines 2000]
+"""
+import argparse
+import os
+import tempfile
+import translate_dictionary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default=translate_dictionary.INPUT_FILE)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--chunk-lines", type=int, default=2000,
+                        help="lignes par bloc: plusieurs blocs pour que lecture, traduction et écriture se recouvrent")
+    args = parser.parse_args()
+
+    input_file = os.path.abspath(args.input)
+    resultats = []
+    with tempfile.TemporaryDirectory() as repertoire:
+        workers = 1
+        while workers <= args.max_workers:
+            translate_dictionary.DB_PATH = os.path.join(repertoire, f"dictionary_{workers}.sqlite")
+            conn = translate_dictionary.setup_database()
+            print(f"\n=== {workers} processus ===")
+            rate = translate_dictionary.bulk_build(
+                conn, input_file, args.batch_size, chunk_lines=args.chunk_lines, workers=workers, max_lines=args.lines
+            )
+            conn.close()
+            resultats.append((workers, rate))
+            workers *= 2
+
+    base = resultats[0][1] or 1.0
+    print(f"\n{'processus':>10}{'entrées/s':>12}{'accélération':>14}")
+    for workers, rate in resultats:
+        print(f"{workers:>10}{rate:>12.1f}{rate / base:>13.2f}x")
+
+if __name__ == "__main__":
+    main()
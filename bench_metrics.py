@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Coût de l'instrumentation (metrics.py) sur les chemins chauds
+
+Mesure une observation d'histogramme, la sélection d'une série par labels,
+le gestionnaire `timed` et le décorateur, en un seul thread puis avec des
+threads concurrents (contention sur le verrou d'une même série), ainsi que
+l'instantané envoyé par les workers et le rendu de /metrics.
+
+Usage: python bench_metrics.py [--iterations 200000] [--threads 4]
+"""
+import argparse
+import threading
+import time
+from metrics import histogram, registry, render, timed
+
+def mesurer(nom, fonction, iterations):
+    debut = time.perf_counter()
+    for _ in range(iterations):
+        fonction()
+    duree = time.perf_counter() - debut
+    print(f"{nom:<32} {1e9 * duree / iterations:8.0f} ns/appel")
+
+def mesurer_threads(nom, fonction, iterations, threads):
+    def boucle():
+        for _ in range(iterations):
+            fonction()
+
+    workers = [threading.Thread(target=boucle) for _ in range(threads)]
+    debut = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duree = time.perf_counter() - debut
+    print(f"{nom:<32} {1e9 * duree / (iterations * threads):8.0f} ns/appel ({threads} threads)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    simple = histogram("bench_seconds", "Banc d'essai")
+    par_label = histogram("bench_labels_seconds", "Banc d'essai", ["pair"])
+    serie = par_label.labels("de-fr")
+
+    @timed(serie)
+    def fonction_decoree():
+        pass
+
+    def bloc_chronometre():
+        with timed(serie):
+            pass
+
+    mesurer("référence (appel vide)", lambda: None, args.iterations)
+    mesurer("observe()", lambda: simple.observe(0.01), args.iterations)
+    mesurer("labels().observe()", lambda: par_label.labels("de-fr").observe(0.01), args.iterations)
+    mesurer("with timed(...)", bloc_chronometre, args.iterations)
+    mesurer("@timed", fonction_decoree, args.iterations)
+    mesurer_threads("observe() concurrent", lambda: serie.observe(0.01), args.iterations // args.threads, args.threads)
+
+    debut = time.perf_counter()
+    instantane = registry.dumps()
+    print(f"{'instantané worker (JSON)':<32} {1000 * (time.perf_counter() - debut):8.2f} ms, {len(instantane)} octets")
+    debut = time.perf_counter()
+    texte = render([(registry.dump(), [])])
+    print(f"{'rendu /metrics':<32} {1000 * (time.perf_counter() - debut):8.2f} ms, {len(texte)} octets")
+
+if __name__ == "__main__":
+    main()
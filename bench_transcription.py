@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Débit du worker de transcription selon le nombre de transcriptions simultanées
+
+Pour chaque valeur de --workers, charge un TranscripteurPersistant avec ce
+nombre de réplicas CTranslate2 (`num_workers`) puis transcrit les fichiers
+depuis autant de threads, comme boucle_worker dans consommer_queue. Le débit
+est donné en secondes d'audio transcrites par seconde réelle; avec un seul
+réplica partagé, N > 1 n'apporterait rien (appels sérialisés).
+
+Usage: python bench_transcription.py [--workers 1 2] [--threads 4] [--repeat 2] [fichier_audio ...]
+"""
+import argparse
+import queue
+import threading
+import time
+from transcribe_api import TranscripteurPersistant
+
+FICHIERS_PAR_DEFAUT = ["audios/cartma.mp3", "audios/vedo.mp3"]
+
+def mesurer(nombre_workers, threads, fichiers):
+    transcripteur = TranscripteurPersistant(threads=threads, workers=nombre_workers)
+    # Premier passage hors mesure (allocation des réplicas, caches)
+    transcripteur.transcrire(fichiers[0])
+
+    durees_audio = {fichier: len(transcripteur.charger_audio(fichier)) / 16000 for fichier in set(fichiers)}
+    taches = queue.Queue()
+    for fichier in fichiers:
+        taches.put(fichier)
+
+    def boucle():
+        while True:
+            try:
+                fichier = taches.get_nowait()
+            except queue.Empty:
+                return
+            transcripteur.transcrire(fichier)
+
+    threads_workers = [threading.Thread(target=boucle) for _ in range(nombre_workers)]
+    debut = time.perf_counter()
+    for thread in threads_workers:
+        thread.start()
+    for thread in threads_workers:
+        thread.join()
+    duree = time.perf_counter() - debut
+    return sum(durees_audio[fichier] for fichier in fichiers), duree
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fichiers", nargs="*", default=FICHIERS_PAR_DEFAUT)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--threads", type=int, default=4, help="coeurs par transcription")
+    parser.add_argument("--repeat", type=int, default=2, help="passages sur la liste de fichiers")
+    args = parser.parse_args()
+
+    fichiers = args.fichiers * args.repeat
+    reference = None
+    for nombre_workers in args.workers:
+        audio, duree = mesurer(nombre_workers, args.threads, fichiers)
+        debit = audio / duree
+        reference = reference or debit
+        print(
+            f"{nombre_workers} worker(s) x {args.threads} coeurs: {len(fichiers)} fichiers, "
+            f"{audio:.0f}s d'audio en {duree:.1f}s -> {debit:.2f}x temps réel "
+            f"({debit / reference:.2f}x par rapport à {args.workers[0]} worker)"
+        )
+
+if __name__ == "__main__":
+    main()
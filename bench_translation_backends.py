@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Compare les backends d'inférence Marian (torch, int8, onnx) sur les sous-titres
+
+Chaque backend est mesuré dans un processus séparé (TRANSLATION_BACKEND passé
+par l'environnement, serveur de modèles désactivé) pour que la mémoire
+résidente ne compte que ses modèles.
+Les traductions sont comparées à celles du backend torch: le banc échoue si la
+similarité moyenne passe sous --min-similarity.
+
+Usage: python bench_translation_backends.py [transcription.json] [--backends torch,int8,onnx]
+                                            [--source de] [--target fr] [--limit N]
+"""
+import argparse
+import difflib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from bench_translation_routes import charger_phrases, percentile
+
+def mesurer_backend(backend, phrases, source, target, batch_size):
+    """Exécuté dans le processus enfant: charge le modèle, mesure latence et débit"""
+    from translation_routes import generate_batch, get_model
+
+    debut = time.perf_counter()
+    tokenizer, _ = get_model(source, target, backend)
+    chargement = time.perf_counter() - debut
+
+    latences = []
+    for phrase in phrases:
+        debut = time.perf_counter()
+        generate_batch([phrase], source, target, batch_size)
+        latences.append(time.perf_counter() - debut)
+
+    debut = time.perf_counter()
+    traductions = generate_batch(phrases, source, target, batch_size)
+    lot = time.perf_counter() - debut
+    tokens = sum(len(ids) for ids in tokenizer(text_target=traductions)["input_ids"])
+
+    return {
+        "backend": backend,
+        "chargement": chargement,
+        "p50": percentile(latences, 50),
+        "p95": percentile(latences, 95),
+        "tokens_par_seconde": tokens / lot if lot else 0.0,
+        # ru_maxrss est en kilo-octets sous Linux
+        "rss_mo": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "traductions": traductions,
+    }
+
+def lancer_enfant(backend, args):
+    sortie = subprocess.run(
+        [sys.executable, __file__, args.transcription, "--source", args.source, "--target", args.target,
+         "--limit", str(args.limit), "--batch-size", str(args.batch_size), "--backend", backend],
+        check=True, capture_output=True, text=True,
+        # Serveur de modèles écarté: on mesure le backend demandé, dans ce processus
+        env={**os.environ, "TRANSLATION_BACKEND": backend, "MODEL_SERVER_MODE": "off"}
+    ).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+def similarite(reference, traductions):
+    """Part de traductions identiques et similarité moyenne (difflib) à la référence"""
+    identiques = sum(a == b for a, b in zip(reference, traductions))
+    ratios = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(reference, traductions)]
+    return identiques / len(reference), sum(ratios) / len(ratios)
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai des backends de traduction")
+    parser.add_argument("transcription", nargs="?", default="tex.json")
+    parser.add_argument("--backends", default="torch,int8,onnx")
+    parser.add_argument("--source", default="de")
+    parser.add_argument("--target", default="fr")
+    parser.add_argument("--limit", type=int, default=200, help="Nombre de phrases")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-similarity", type=float, default=0.9)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    phrases = charger_phrases(args.transcription, args.limit)
+    if args.backend:
+        print(json.dumps(mesurer_backend(args.backend, phrases, args.source, args.target, args.batch_size), ensure_ascii=False))
+        return
+
+    backends = args.backends.split(",")
+    if backends[0] != "torch":
+        backends.insert(0, "torch")
+    resultats = [lancer_enfant(backend, args) for backend in dict.fromkeys(backends)]
+    reference = resultats[0]["traductions"]
+
+    print(f"{len(phrases)} phrases {args.source} -> {args.target}")
+    print(f"{'backend':<10}{'chargement':>12}{'p50':>10}{'p95':>10}{'tokens/s':>11}{'RSS':>10}{'identiques':>12}{'similarité':>12}")
+    echec = False
+    for r in resultats:
+        identiques, ratio = similarite(reference, r["traductions"])
+        echec = echec or ratio < args.min_similarity
+        print(f"{r['backend']:<10}{r['chargement']:>11.1f}s{r['p50'] * 1000:>8.0f}ms{r['p95'] * 1000:>8.0f}ms"
+              f"{r['tokens_par_seconde']:>11.1f}{r['rss_mo']:>7.0f} Mo{identiques:>12.1%}{ratio:>12.1%}")
+    if echec:
+        print(f"\nSimilarité sous le seuil de {args.min_similarity:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Compare la traduction directe DE->FR et le pivot DE->EN->FR
+
+Chaque route est mesurée dans un processus séparé pour que la mémoire
+résidente (ru_maxrss) ne compte que les modèles de cette route. Les phrases
+viennent des segments d'une transcription WhisperX (tex.json par défaut).
+
+Usage: python bench_translation_routes.py [transcription.json] [--limit N] [--batch-size B]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROUTES = {
+    "direct": [("de", "fr")],
+    "pivot": [("de", "en"), ("en", "fr")],
+}
+
+def charger_phrases(chemin, limite):
+    with open(chemin, encoding="utf-8") as f:
+        transcription = json.load(f)
+    phrases = [segment["text"].strip() for segment in transcription.get("segments", [])]
+    return [phrase for phrase in phrases if phrase][:limite]
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+def mesurer_route(nom, phrases, batch_size):
+    """Exécuté dans le processus enfant: charge la route puis traduit phrase par phrase"""
+    from translation_routes import get_model, translate_along
+
+    route = ROUTES[nom]
+    debut = time.perf_counter()
+    for source, target in route:
+        get_model(source, target)
+    chargement = time.perf_counter() - debut
+
+    latences = []
+    traductions = []
+    for phrase in phrases:
+        debut = time.perf_counter()
+        traductions.extend(translate_along([phrase], route, batch_size))
+        latences.append(time.perf_counter() - debut)
+
+    debut = time.perf_counter()
+    translate_along(phrases, route, batch_size)
+    lot = time.perf_counter() - debut
+
+    return {
+        "route": nom,
+        "chargement": chargement,
+        "p50": percentile(latences, 50),
+        "p95": percentile(latences, 95),
+        "lot": lot,
+        "phrases_par_seconde": len(phrases) / lot if lot else 0.0,
+        # ru_maxrss est en kilo-octets sous Linux
+        "rss_mo": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "exemples": traductions[:3],
+    }
+
+def lancer_enfant(nom, args):
+    sortie = subprocess.run(
+        [sys.executable, __file__, args.transcription, "--limit", str(args.limit),
+         "--batch-size", str(args.batch_size), "--route", nom],
+        check=True, capture_output=True, text=True,
+        # Serveur de modèles écarté: la route et la mémoire mesurées sont celles de ce processus
+        env={**os.environ, "MODEL_SERVER_MODE": "off"}
+    ).stdout
+    return json.loads(sortie.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai des routes de traduction")
+    parser.add_argument("transcription", nargs="?", default="tex.json")
+    parser.add_argument("--limit", type=int, default=100, help="Nombre de phrases")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--route", choices=ROUTES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.route:
+        phrases = charger_phrases(args.transcription, args.limit)
+        print(json.dumps(mesurer_route(args.route, phrases, args.batch_size), ensure_ascii=False))
+        return
+
+    resultats = [lancer_enfant(nom, args) for nom in ROUTES]
+    print(f"{'route':<10}{'chargement':>12}{'p50':>10}{'p95':>10}{'lot':>10}{'phrases/s':>12}{'RSS':>10}")
+    for r in resultats:
+        print(f"{r['route']:<10}{r['chargement']:>11.1f}s{r['p50'] * 1000:>8.0f}ms{r['p95'] * 1000:>8.0f}ms"
+              f"{r['lot']:>9.1f}s{r['phrases_par_seconde']:>12.1f}{r['rss_mo']:>7.0f} Mo")
+    for r in resultats:
+        print(f"\n{r['route']}:")
+        for exemple in r["exemples"]:
+            print(f"  {exemple}")
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,69 @@ import os
 # Chemins
 MODEL_PATH = "./opus-mt-de-fr"
 OUTPUT_DIR = "./output"
+AUDIO_DIR = "./audios"
+
+# API
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+# Configuration MySQL
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "heysprech"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_DATABASE", "heysprech"),
+    "port": int(os.getenv("DB_PORT", "3306")),
+}
+DB_POOL_NAME = "heysprech"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # 32 maximum avec mysql-connector
+DB_POOL_TIMEOUT = 10  # secondes d'attente d'une connexion libre
+DB_PING_IDLE = 60  # secondes d'inactivité après lesquelles une connexion est vérifiée (ping)
 
 # Configuration Redis
 REDIS_HOST = "localhost"
 REDIS_PORT = 6379
 REDIS_DB = 0
+REDIS_MAX_CONNECTIONS = 50  # pool asyncio partagé par les requêtes de l'API
+
+# Cache des réponses GET /api/videos/{id} (voir video_cache.py)
+VIDEO_CACHE_SIZE = 256  # entrées en mémoire par processus
+VIDEO_CACHE_REDIS = True  # partage et invalidation entre processus via Redis
+VIDEO_CACHE_TTL = 3600  # secondes de vie d'un corps dans Redis
+
+# Événements de progression (stream Redis, voir events.py) diffusés en SSE par l'API
+EVENTS_STREAM = "pipeline:events"
+EVENTS_STREAM_MAXLEN = 10000  # entrées gardées (approximatif), sert aussi au rejeu
+EVENTS_PROGRESS_INTERVAL = 1.0  # secondes minimum entre deux progressions d'une même étape
+EVENTS_CLIENT_BUFFER = 100  # événements en attente par client avant resynchronisation
+EVENTS_MAX_CLIENTS = 200
+EVENTS_KEEPALIVE = 15  # secondes entre deux commentaires SSE sur une connexion inactive
+EVENTS_STATUS_INTERVAL = 5  # secondes entre deux instantanés de l'état des queues
+EVENTS_REPLAY_MAX = 500  # événements rejoués au plus après une reconnexion
 
 # Files d'attente Redis
 TRANSCRIPTION_QUEUE = "transcription_queue"
 TRANSLATION_QUEUE = "translation_queue"
+TRANSLATION_PROCESSING_QUEUE = "translation_queue:processing"
+# Fichiers en cours de traitement (sous bail, voir jobs.py)
+TRANSCRIPTION_PROCESSING_QUEUE = "transcription_queue:processing"
+
+# Baux et reprises des tâches
+JOB_VISIBILITY_TIMEOUT = 120  # secondes sans heartbeat avant reprise de la tâche
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_MAX_ATTEMPTS = 3  # au-delà, la tâche part dans <queue>:dead
+JOB_RETRY_BACKOFF = 30  # secondes, doublé à chaque essai
+JOB_RETRY_BACKOFF_MAX = 900
+# Écriture groupée des statuts dans MySQL
+STATUS_FLUSH_INTERVAL = 1.0
+STATUS_FLUSH_SIZE = 100
+
+# Journaux JSON asynchrones (voir logger.py)
+LOG_DIR = "logs"
+LOG_MAX_BYTES = 10000000  # 10MB par fichier avant rotation
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # enregistrements en attente d'écriture; au-delà les DEBUG/INFO sont abandonnés
+LOG_SAMPLING = {"DEBUG": 100}  # niveau -> un enregistrement gardé sur N
 
 # Extensions
 AUDIO_EXTENSIONS = (".opus", ".mp3", ".wav", ".m4a", ".ogg", ".flac", ".aac", ".aiff", ".wma")
@@ -21,3 +75,63 @@ EXTENSION_TRANSCRIPTION = ".json"
 # Paramètres Whisper
 WHISPER_MODEL = "base"
 WHISPER_LANGUAGE = "de"
+
+# Présence des workers (sorted set Redis, voir workers.py)
+WORKERS_KEY = "workers:alive"
+WORKER_HEARTBEAT_INTERVAL = 10
+WORKER_TTL = 30  # secondes sans signal avant qu'un worker soit considéré mort
+
+# Métriques Prometheus (voir metrics.py): exposées par l'API sur /metrics
+METRICS_PREFIX = "heysprech_"
+# Instantanés des workers, envoyés avec leur signal de présence et agrégés par l'API
+METRICS_KEY = "metrics:workers"
+
+# Superviseur (start_pipeline.py): nombre de processus par type, ajusté selon la queue
+SUPERVISOR_TRANSCRIPTION_PROCESSES = (1, 2)  # (minimum, maximum)
+SUPERVISOR_TRANSLATION_PROCESSES = (1, 2)
+SUPERVISOR_JOBS_PER_PROCESS = 10  # profondeur de queue justifiant un processus de plus
+SUPERVISOR_SCALE_INTERVAL = 15  # secondes entre deux ajustements
+SUPERVISOR_RESTART_BACKOFF = 1  # secondes, doublé à chaque plantage rapproché
+SUPERVISOR_RESTART_BACKOFF_MAX = 60
+SUPERVISOR_DRAIN_TIMEOUT = 600  # secondes laissées aux workers pour finir leur tâche
+# Coeurs répartis entre les processus (0 = tous les coeurs de la machine), part de chaque type;
+# chaque processus reçoit sa part divisée par le nombre maximum de processus de son type
+SUPERVISOR_CPU_CORES = 0
+SUPERVISOR_CPU_SHARE = {"transcription": 0.75, "traduction": 0.25}
+
+# Worker de transcription (0 = selon le nombre de coeurs)
+TRANSCRIPTION_WORKERS = 0
+TRANSCRIPTION_THREADS_PER_WORKER = 4
+
+# Service de traduction (micro-batching)
+TRANSLATION_BATCH_SIZE = 32
+TRANSLATION_BATCH_WAIT_MS = 5
+TRANSLATION_CACHE_SIZE = 10000
+
+# Téléchargements YouTube (threads dédiés, hors de la boucle de l'API)
+DOWNLOAD_WORKERS = 2
+# Format de l'audio téléchargé:
+#   "mp3"    : conversion en MP3 192 kbps (comportement historique)
+#   "native" : flux audio natif (opus/m4a) sans réencodage
+#   "pcm"    : flux natif + artefact PCM 16 kHz décodé une fois pour la transcription
+AUDIO_INGEST_MODE = "mp3"
+
+# Modèles de traduction par paire de langues: identifiant Hugging Face et copie locale
+TRANSLATION_MODELS = {
+    ("de", "fr"): {"name": "Helsinki-NLP/opus-mt-de-fr", "local": MODEL_PATH},
+    ("de", "en"): {"name": "Helsinki-NLP/opus-mt-de-en", "local": "./opus-mt-de-en"},
+    ("en", "fr"): {"name": "Helsinki-NLP/opus-mt-en-fr", "local": "./opus-mt-en-fr"},
+}
+# Langue intermédiaire quand aucun modèle direct n'est disponible
+TRANSLATION_PIVOT_LANG = "en"
+# Autoriser le téléchargement depuis le Hub si la copie locale est absente
+TRANSLATION_ALLOW_DOWNLOAD = True
+# Backend d'inférence des modèles Marian: "torch", "int8" (quantification dynamique) ou "onnx"
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "torch")
+# Exports ONNX réutilisés d'un démarrage à l'autre
+TRANSLATION_ONNX_DIR = "./onnx"
+
+# Serveur de modèles local (model_server.py) partagé par les workers
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/heysprech-models.sock")
+# "auto": passer par le serveur si son socket existe, "off": modèles locaux, "required": serveur obligatoire
+MODEL_SERVER_MODE = os.getenv("MODEL_SERVER_MODE", "auto")
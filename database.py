@@ -1,147 +1,534 @@
 #!/usr/bin/env python3
 import mysql.connector
-from mysql.connector import Error
-from config import DB_CONFIG
+from mysql.connector import Error, InterfaceError, OperationalError, PoolError, pooling
+from config import DB_CONFIG, DB_POOL_NAME, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_PING_IDLE
+from contextlib import contextmanager
 import json
+import threading
+import time
+from transcript_store import encode_transcript, decode_chunk, filter_segments, word_segments
+from video_cache import invalidate_video, invalidate_videos
+from metrics import counter, histogram
+
+QUERY_SECONDS = histogram("db_query_seconds", "Durée des blocs de requêtes MySQL (curseur emprunté au pool)")
+POOL_WAIT_SECONDS = histogram("db_pool_wait_seconds", "Attente d'une connexion libre dans le pool MySQL")
+QUERY_ERRORS = counter("db_query_errors_total", "Blocs de requêtes MySQL terminés par une erreur")
+POOL_TIMEOUTS = counter("db_pool_timeouts_total", "Attentes du pool MySQL abandonnées après DB_POOL_TIMEOUT")
+
+# Un seul pool par processus, partagé par toutes les instances de Database
+_pool = None
+_pool_lock = threading.Lock()
+# Une place par connexion du pool: les threads en attente dorment au lieu de réessayer
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+# Dernière utilisation de chaque connexion (connection_id MySQL), pour le ping après inactivité
+_last_used = {}
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=DB_POOL_NAME,
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+                print(f"Pool MySQL créé ({DB_POOL_SIZE} connexions)")
+            except Error as e:
+                print(f"Erreur lors de la connexion à MySQL: {e}")
+                raise
+        return _pool
+
+class DatabaseMetrics:
+    """Compteurs d'attente du pool et de latence des requêtes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool_waits = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+        self.pool_timeouts = 0
+        self.queries = 0
+        self.query_total = 0.0
+        self.query_max = 0.0
+        self.query_errors = 0
+
+    def record_pool_wait(self, duration):
+        POOL_WAIT_SECONDS.observe(duration)
+        with self.lock:
+            self.pool_waits += 1
+            self.pool_wait_total += duration
+            self.pool_wait_max = max(self.pool_wait_max, duration)
+
+    def record_pool_timeout(self):
+        POOL_TIMEOUTS.inc()
+        with self.lock:
+            self.pool_timeouts += 1
+
+    def record_query(self, duration, error=False):
+        QUERY_SECONDS.observe(duration)
+        if error:
+            QUERY_ERRORS.inc()
+        with self.lock:
+            self.queries += 1
+            self.query_total += duration
+            self.query_max = max(self.query_max, duration)
+            if error:
+                self.query_errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "pool_size": DB_POOL_SIZE,
+                "pool_waits": self.pool_waits,
+                "pool_wait_avg_ms": 1000 * self.pool_wait_total / self.pool_waits if self.pool_waits else 0.0,
+                "pool_wait_max_ms": 1000 * self.pool_wait_max,
+                "pool_timeouts": self.pool_timeouts,
+                "queries": self.queries,
+                "query_avg_ms": 1000 * self.query_total / self.queries if self.queries else 0.0,
+                "query_max_ms": 1000 * self.query_max,
+                "query_errors": self.query_errors
+            }
+
+metrics = DatabaseMetrics()
 
 class Database:
+    """Accès à MySQL via un pool de connexions
+
+    Chaque opération emprunte une connexion au pool et la rend à la fin, ce
+    qui rend une même instance utilisable depuis plusieurs threads. Le schéma
+    est créé une fois au démarrage par `setup_database()`.
+    """
+
     def __init__(self):
-        self.connection = None
-        self.connect()
-        self.setup_database()
+        self.pool = get_pool()
 
-    def connect(self):
+    def _checkout(self):
+        """Emprunte une connexion, en attendant qu'une se libère si besoin"""
+        start = time.perf_counter()
+        if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+            metrics.record_pool_timeout()
+            raise PoolError(f"Aucune connexion MySQL libre après {DB_POOL_TIMEOUT}s")
         try:
-            self.connection = mysql.connector.connect(**DB_CONFIG)
-            print("Connexion à MySQL réussie")
-        except Error as e:
-            print(f"Erreur lors de la connexion à MySQL: {e}")
+            connection = self.pool.get_connection()
+        except Exception:
+            _pool_slots.release()
+            raise
+        metrics.record_pool_wait(time.perf_counter() - start)
+
+        # Reconnexion si MySQL a pu fermer la connexion (wait_timeout, erreur précédente):
+        # une connexion utilisée récemment n'est pas vérifiée
+        if time.monotonic() - _last_used.pop(connection.connection_id, 0.0) > DB_PING_IDLE:
+            try:
+                connection.ping(reconnect=True, attempts=3, delay=1)
+            except Error:
+                self._checkin(connection, broken=True)
+                raise
+        return connection
+
+    def _checkin(self, connection, broken=False):
+        """Rend la connexion au pool; une connexion en erreur sera vérifiée au prochain emprunt"""
+        connection_id = connection.connection_id
+        try:
+            connection.close()
+        except Error:
+            broken = True
+        if not broken:
+            _last_used[connection_id] = time.monotonic()
+        _pool_slots.release()
+
+    @contextmanager
+    def _cursor(self, dictionary=False):
+        """Curseur sur une connexion du pool, validé à la sortie du bloc"""
+        connection = self._checkout()
+        cursor = None
+        start = time.perf_counter()
+        error = False
+        broken = False
+        try:
+            cursor = connection.cursor(dictionary=dictionary)
+            yield cursor
+            connection.commit()
+        except Exception as e:
+            error = True
+            broken = isinstance(e, (InterfaceError, OperationalError))
+            try:
+                connection.rollback()
+            except Error:
+                broken = True
             raise
+        finally:
+            metrics.record_query(time.perf_counter() - start, error)
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Error:
+                    broken = True
+            self._checkin(connection, broken)
 
     def setup_database(self):
         try:
-            cursor = self.connection.cursor()
-            
-            # Créer la table videos si elle n'existe pas
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS videos (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    youtube_id VARCHAR(20) NOT NULL,
-                    audio_path VARCHAR(255) NOT NULL,
-                    json_data JSON,
-                    status ENUM('pending', 'processing', 'completed', 'error') DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-                )
-            """)
-            
-            self.connection.commit()
+            with self._cursor() as cursor:
+                # Créer la table videos si elle n'existe pas
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS videos (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        youtube_id VARCHAR(20) NOT NULL,
+                        audio_path VARCHAR(255) NOT NULL,
+                        json_data JSON,
+                        status ENUM('pending', 'processing', 'completed', 'error') DEFAULT 'pending',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                    )
+                """)
+                # Transcriptions compressées par blocs, lisibles par plage horaire
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS transcripts (
+                        video_id INT PRIMARY KEY,
+                        language VARCHAR(8),
+                        segment_count INT NOT NULL,
+                        duration DOUBLE NOT NULL,
+                        FOREIGN KEY (video_id) REFERENCES videos(id) ON DELETE CASCADE
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS transcript_chunks (
+                        video_id INT NOT NULL,
+                        chunk_no INT NOT NULL,
+                        start_time DOUBLE NOT NULL,
+                        end_time DOUBLE NOT NULL,
+                        segment_count INT NOT NULL,
+                        data MEDIUMBLOB NOT NULL,
+                        PRIMARY KEY (video_id, chunk_no),
+                        INDEX idx_chunks_time (video_id, start_time, end_time),
+                        FOREIGN KEY (video_id) REFERENCES videos(id) ON DELETE CASCADE
+                    )
+                """)
+
+                # Index de la pagination par clé (created_at, id)
+                self._ensure_index(cursor, "videos", "idx_videos_created", "(created_at, id)")
+                self._ensure_index(cursor, "videos", "idx_videos_status_created", "(status, created_at, id)")
+                self._ensure_index(cursor, "videos", "idx_videos_audio_path", "(audio_path)")
             print("Base de données initialisée avec succès")
-            
+
         except Error as e:
             print(f"Erreur lors de l'initialisation de la base de données: {e}")
             raise
-        finally:
-            cursor.close()
+
+    def _ensure_index(self, cursor, table, name, columns):
+        """Crée un index s'il n'existe pas (MySQL n'a pas de CREATE INDEX IF NOT EXISTS)"""
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"CREATE INDEX {name} ON {table} {columns}")
 
     def add_video(self, youtube_id, audio_path):
         try:
-            cursor = self.connection.cursor()
-            query = """
-                INSERT INTO videos (youtube_id, audio_path)
-                VALUES (%s, %s)
-            """
-            cursor.execute(query, (youtube_id, audio_path))
-            self.connection.commit()
-            return cursor.lastrowid
+            with self._cursor() as cursor:
+                query = """
+                    INSERT INTO videos (youtube_id, audio_path)
+                    VALUES (%s, %s)
+                """
+                cursor.execute(query, (youtube_id, audio_path))
+                return cursor.lastrowid
         except Error as e:
             print(f"Erreur lors de l'ajout de la vidéo: {e}")
             raise
-        finally:
-            cursor.close()
 
     def update_video_status(self, video_id, status):
         try:
-            cursor = self.connection.cursor()
-            query = """
-                UPDATE videos
-                SET status = %s
-                WHERE id = %s
-            """
-            cursor.execute(query, (status, video_id))
-            self.connection.commit()
+            with self._cursor() as cursor:
+                query = """
+                    UPDATE videos
+                    SET status = %s
+                    WHERE id = %s
+                """
+                cursor.execute(query, (status, video_id))
+            invalidate_video(video_id)
         except Error as e:
             print(f"Erreur lors de la mise à jour du statut: {e}")
             raise
-        finally:
-            cursor.close()
+
+    def update_video_statuses(self, statuses):
+        """Met à jour le statut de plusieurs vidéos en une seule requête
+
+        Une vidéo déjà terminée n'est pas modifiée: un statut intermédiaire
+        écrit en retard ne peut pas écraser `completed`.
+        """
+        statuses = list(statuses)
+        if not statuses:
+            return
+        try:
+            with self._cursor() as cursor:
+                cases = " ".join("WHEN %s THEN %s" for _ in statuses)
+                placeholders = ", ".join("%s" for _ in statuses)
+                query = f"""
+                    UPDATE videos
+                    SET status = CASE id {cases} END
+                    WHERE id IN ({placeholders}) AND status <> 'completed'
+                """
+                params = [value for pair in statuses for value in pair]
+                params += [video_id for video_id, _ in statuses]
+                cursor.execute(query, params)
+            invalidate_videos(video_id for video_id, _ in statuses)
+        except Error as e:
+            print(f"Erreur lors de la mise à jour des statuts: {e}")
+            raise
+
+    def update_video_audio_path(self, video_id, audio_path):
+        try:
+            with self._cursor() as cursor:
+                query = """
+                    UPDATE videos
+                    SET audio_path = %s
+                    WHERE id = %s
+                """
+                cursor.execute(query, (audio_path, video_id))
+            invalidate_video(video_id)
+        except Error as e:
+            print(f"Erreur lors de la mise à jour du chemin audio: {e}")
+            raise
 
     def update_video_json(self, video_id, json_data):
+        """Enregistre la transcription dans le stockage par blocs
+
+        La colonne videos.json_data est vidée: la transcription n'est plus
+        sérialisée en un seul document.
+        """
         try:
-            cursor = self.connection.cursor()
-            query = """
-                UPDATE videos
-                SET json_data = %s, status = 'completed'
-                WHERE id = %s
-            """
-            cursor.execute(query, (json.dumps(json_data), video_id))
-            self.connection.commit()
+            chunks = encode_transcript(json_data)
+            segments = json_data.get("segments", [])
+            with self._cursor() as cursor:
+                cursor.execute("DELETE FROM transcript_chunks WHERE video_id = %s", (video_id,))
+                if chunks:
+                    cursor.executemany("""
+                        INSERT INTO transcript_chunks
+                            (video_id, chunk_no, start_time, end_time, segment_count, data)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, [(video_id, *chunk) for chunk in chunks])
+                cursor.execute("""
+                    REPLACE INTO transcripts (video_id, language, segment_count, duration)
+                    VALUES (%s, %s, %s, %s)
+                """, (
+                    video_id,
+                    json_data.get("language"),
+                    len(segments),
+                    max((chunk[2] for chunk in chunks), default=0.0)
+                ))
+                # updated_at est forcé: une retraduction ne change aucune autre colonne
+                query = """
+                    UPDATE videos
+                    SET json_data = NULL, status = 'completed', updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                """
+                cursor.execute(query, (video_id,))
+            invalidate_video(video_id)
         except Error as e:
             print(f"Erreur lors de la mise à jour des données JSON: {e}")
             raise
-        finally:
-            cursor.close()
 
     def get_video(self, video_id):
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            query = """
-                SELECT *
-                FROM videos
-                WHERE id = %s
-            """
-            cursor.execute(query, (video_id,))
-            return cursor.fetchone()
+            with self._cursor(dictionary=True) as cursor:
+                query = """
+                    SELECT *
+                    FROM videos
+                    WHERE id = %s
+                """
+                cursor.execute(query, (video_id,))
+                video = cursor.fetchone()
+            if video:
+                video["json_data"] = self.get_transcript(video_id, video["json_data"])
+            return video
+        except Error as e:
+            print(f"Erreur lors de la récupération de la vidéo: {e}")
+            raise
+
+    def get_video_updated_at(self, video_id):
+        """Date de dernière modification (validation du cache), None si la vidéo n'existe pas"""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("SELECT updated_at FROM videos WHERE id = %s", (video_id,))
+                row = cursor.fetchone()
+            return row[0] if row else None
+        except Error as e:
+            print(f"Erreur lors de la lecture de la date de modification: {e}")
+            raise
+
+    def get_transcript(self, video_id, legacy_json=None):
+        """Reconstruit la transcription complète au format WhisperX"""
+        if legacy_json is not None:
+            # Lignes enregistrées avant le stockage par blocs
+            return json.loads(legacy_json) if isinstance(legacy_json, (str, bytes)) else legacy_json
+        try:
+            with self._cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT language FROM transcripts WHERE video_id = %s", (video_id,))
+                transcript = cursor.fetchone()
+                if not transcript:
+                    return None
+                cursor.execute("""
+                    SELECT data
+                    FROM transcript_chunks
+                    WHERE video_id = %s
+                    ORDER BY chunk_no
+                """, (video_id,))
+                segments = [segment for row in cursor.fetchall() for segment in decode_chunk(row["data"])]
+            return {
+                "segments": segments,
+                "word_segments": word_segments(segments),
+                "language": transcript["language"]
+            }
+        except Error as e:
+            print(f"Erreur lors de la récupération de la transcription: {e}")
+            raise
+
+    def get_segments(self, video_id, start=None, end=None, include_words=False):
+        """Segments chevauchant [start, end], en ne décodant que les blocs concernés
+
+        Retourne None si la vidéo n'a pas de transcription.
+        """
+        try:
+            with self._cursor(dictionary=True) as cursor:
+                cursor.execute("SELECT segment_count FROM transcripts WHERE video_id = %s", (video_id,))
+                if not cursor.fetchone():
+                    cursor.execute("SELECT json_data FROM videos WHERE id = %s", (video_id,))
+                    row = cursor.fetchone()
+                    if not row or row["json_data"] is None:
+                        return None
+                    legacy = self.get_transcript(video_id, row["json_data"])
+                    return filter_segments(legacy.get("segments", []), start, end)
+
+                conditions = ["video_id = %s"]
+                params = [video_id]
+                if start is not None:
+                    conditions.append("end_time >= %s")
+                    params.append(start)
+                if end is not None:
+                    conditions.append("start_time <= %s")
+                    params.append(end)
+                cursor.execute(f"""
+                    SELECT data
+                    FROM transcript_chunks
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY chunk_no
+                """, params)
+                rows = cursor.fetchall()
+
+            segments = [
+                segment
+                for row in rows
+                for segment in decode_chunk(row["data"], include_words=include_words)
+            ]
+            return filter_segments(segments, start, end)
+        except Error as e:
+            print(f"Erreur lors de la récupération des segments: {e}")
+            raise
+
+    def get_video_by_audio_path(self, audio_path):
+        """Récupère la dernière vidéo associée à un fichier audio"""
+        try:
+            with self._cursor(dictionary=True) as cursor:
+                query = """
+                    SELECT *
+                    FROM videos
+                    WHERE audio_path = %s
+                    ORDER BY id DESC
+                    LIMIT 1
+                """
+                cursor.execute(query, (audio_path,))
+                return cursor.fetchone()
         except Error as e:
             print(f"Erreur lors de la récupération de la vidéo: {e}")
             raise
-        finally:
-            cursor.close()
 
     def get_all_videos(self):
         """Récupère toutes les vidéos"""
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            query = """
-                SELECT *
-                FROM videos
-                ORDER BY created_at DESC
-            """
-            cursor.execute(query)
-            return cursor.fetchall()
+            with self._cursor(dictionary=True) as cursor:
+                query = """
+                    SELECT *
+                    FROM videos
+                    ORDER BY created_at DESC
+                """
+                cursor.execute(query)
+                return cursor.fetchall()
+        except Error as e:
+            print(f"Erreur lors de la récupération des vidéos: {e}")
+            raise
+
+    def get_videos_page(self, limit=50, after=None, status=None):
+        """Récupère une page de vidéos sans les transcriptions
+
+        `after` est la clé (created_at, id) de la dernière vidéo de la page
+        précédente. Retourne les vidéos et la clé de la page suivante (ou None).
+        """
+        try:
+            with self._cursor(dictionary=True) as cursor:
+                conditions = []
+                params = []
+                if status:
+                    conditions.append("status = %s")
+                    params.append(status)
+                if after:
+                    conditions.append("(created_at < %s OR (created_at = %s AND id < %s))")
+                    params.extend([after[0], after[0], after[1]])
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                query = f"""
+                    SELECT id, youtube_id, audio_path, status, created_at, updated_at
+                    FROM videos
+                    {where}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """
+                cursor.execute(query, (*params, limit + 1))
+                videos = cursor.fetchall()
+
+            next_key = None
+            if len(videos) > limit:
+                videos = videos[:limit]
+                next_key = (videos[-1]["created_at"], videos[-1]["id"])
+            return videos, next_key
         except Error as e:
             print(f"Erreur lors de la récupération des vidéos: {e}")
             raise
-        finally:
-            cursor.close()
 
     def delete_video(self, video_id):
         """Supprime une vidéo"""
         try:
-            cursor = self.connection.cursor()
-            query = """
-                DELETE FROM videos
-                WHERE id = %s
-            """
-            cursor.execute(query, (video_id,))
-            self.connection.commit()
+            with self._cursor() as cursor:
+                query = """
+                    DELETE FROM videos
+                    WHERE id = %s
+                """
+                cursor.execute(query, (video_id,))
+            invalidate_video(video_id)
         except Error as e:
             print(f"Erreur lors de la suppression de la vidéo: {e}")
             raise
-        finally:
-            cursor.close()
+
+    def get_metrics(self):
+        """Attente du pool et latence des requêtes pour ce processus"""
+        return metrics.snapshot()
 
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("Connexion à MySQL fermée")
+        """Ferme les connexions inactives du pool (arrêt du processus)
+
+        Les connexions sont retirées du pool puis déconnectées: le pool n'est
+        plus utilisable ensuite.
+        """
+        closed = 0
+        while _pool_slots.acquire(blocking=False):
+            try:
+                connection = self.pool.get_connection()
+            except Error:
+                break
+            try:
+                connection.disconnect()
+            except Error as e:
+                print(f"Erreur lors de la fermeture d'une connexion MySQL: {e}")
+            closed += 1
+        print(f"Connexions MySQL fermées ({closed})")
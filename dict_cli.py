@@ -3,6 +3,7 @@ import click
 import sqlite3
 import textwrap
 from pathlib import Path
+from dictionary_search import ensure_search_index, has_search_index, search as search_dictionary
 
 DB_PATH = "dictionary.sqlite"
 
@@ -41,29 +42,31 @@ def cli():
 @click.option('--lang', default='de', type=click.Choice(['de', 'fr', 'en']),
               help='Langue de recherche (de/fr/en)')
 @click.option('--all', is_flag=True, help='Afficher toutes les informations disponibles')
-def search(word, lang, all):
-    """Recherche un mot dans le dictionnaire"""
+@click.option('--fuzzy', is_flag=True, help='Tolérer les fautes de frappe et les umlauts (ä=ae, ß=ss)')
+@click.option('--limit', default=10, show_default=True, help='Nombre maximum de résultats')
+def search(word, lang, all, fuzzy, limit):
+    """Recherche un mot dans le dictionnaire (début de mot, sinon sous-chaîne)"""
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+
+    if not has_search_index(conn):
+        click.echo("Création de l'index de recherche (une seule fois)...")
+        ensure_search_index(conn)
+
     if all:
-        cursor.execute(f"""
-            SELECT de, en, fr, wordType, wiktionary_def, dictcc_def, example_de, example_fr
-            FROM dictionary 
-            WHERE {lang} LIKE ?
-            LIMIT 10
-        """, (f"%{word}%",))
+        columns = "de, en, fr, wordType, wiktionary_def, dictcc_def, example_de, example_fr"
     else:
-        cursor.execute(f"""
-            SELECT de, en, fr, wordType
-            FROM dictionary 
-            WHERE {lang} LIKE ?
-            LIMIT 10
-        """, (f"%{word}%",))
-    
-    results = cursor.fetchall()
+        columns = "de, en, fr, wordType"
+
+    try:
+        results = search_dictionary(conn, word, lang, limit=limit, fuzzy=fuzzy, columns=columns)
+    except ValueError as e:
+        click.echo(str(e))
+        conn.close()
+        return
+
     if not results:
         click.echo("Mot non trouvé")
+        conn.close()
         return
     
     for row in results:
@@ -71,6 +74,14 @@ def search(word, lang, all):
     
     conn.close()
 
+@cli.command()
+def reindex():
+    """Reconstruit l'index de recherche du dictionnaire"""
+    conn = sqlite3.connect(DB_PATH)
+    ensure_search_index(conn, rebuild=True)
+    conn.close()
+    click.echo("Index de recherche reconstruit")
+
 @cli.command()
 @click.option('--all', is_flag=True, help='Afficher toutes les informations disponibles')
 def random(all):
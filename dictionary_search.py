@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Recherche indexée dans la table `dictionary`
+
+Trois niveaux, du plus rapide au plus tolérant:
+  1. préfixe servi par les index B-tree idx_de/idx_en/idx_fr;
+  2. recherche plein texte FTS5 classée par bm25 (mots à l'intérieur d'une entrée);
+  3. mode approximatif optionnel: index trigramme sur le texte plié
+     (ä→ae, ö→oe, ü→ue, ß→ss, minuscules), tolérant aux fautes de frappe.
+Si aucun niveau ne trouve rien, une sous-chaîne est cherchée par LIKE
+(parcours complet, mais seulement dans ce cas).
+
+Les tables FTS sont maintenues par des triggers sur `dictionary`: les scripts
+qui insèrent des mots n'ont rien à faire de particulier. Le pliage est fait
+en Python (`fold`, minuscules Unicode), jamais en SQL (lower() de SQLite ne
+traite que l'ASCII): les triggers notent seulement les lignes à plier dans
+FOLD_PENDING_TABLE, et la recherche approximative les plie avant de chercher.
+"""
+import difflib
+
+LANGUAGES = ("de", "en", "fr")
+FTS_TABLE = "dictionary_fts"
+FOLD_TABLE = "dictionary_fold"
+FOLD_PENDING_TABLE = "dictionary_fold_pending"
+
+FOLDS = (
+    ("ä", "ae"), ("ö", "oe"), ("ü", "ue"), ("ß", "ss"),
+    ("Ä", "ae"), ("Ö", "oe"), ("Ü", "ue"), ("ẞ", "ss"),
+)
+
+def fold(text):
+    """Plie un texte pour la recherche approximative (requêtes comme contenu indexé)"""
+    if text is None:
+        return None
+    for source, target in FOLDS:
+        text = text.replace(source, target)
+    return text.lower()
+
+def _table_columns(conn):
+    return {row[1] for row in conn.execute("PRAGMA table_info(dictionary)")}
+
+def dictionary_languages(conn):
+    """Colonnes de langue présentes (translate_dictionary-x.py n'a pas de colonne en)"""
+    columns = _table_columns(conn)
+    return [lang for lang in LANGUAGES if lang in columns]
+
+def default_columns(conn):
+    """Colonnes renvoyées par défaut: les langues présentes puis wordType"""
+    columns = _table_columns(conn)
+    return ", ".join([lang for lang in LANGUAGES if lang in columns] + [c for c in ("wordType",) if c in columns])
+
+def has_search_index(conn):
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)",
+        (FTS_TABLE, FOLD_TABLE, FOLD_PENDING_TABLE)
+    ).fetchone()
+    return row[0] == 3
+
+def refresh_fold_index(conn, chunk_size=5000):
+    """Plie en Python les lignes ajoutées ou modifiées depuis le dernier appel"""
+    langs = dictionary_languages(conn)
+    columns = ", ".join(langs)
+    placeholders = ", ".join("?" for _ in range(len(langs) + 1))
+    folded = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT p.id, {", ".join(f"d.{lang}" for lang in langs)}
+            FROM {FOLD_PENDING_TABLE} p LEFT JOIN dictionary d ON d.id = p.id
+            LIMIT ?
+        """, (chunk_size,)).fetchall()
+        if not rows:
+            break
+        conn.executemany(f"DELETE FROM {FOLD_TABLE} WHERE rowid = ?", ((row[0],) for row in rows))
+        conn.executemany(
+            f"INSERT INTO {FOLD_TABLE}(rowid, {columns}) VALUES ({placeholders})",
+            ((row[0], *(fold(value) for value in row[1:])) for row in rows if row[1] is not None)
+        )
+        conn.executemany(f"DELETE FROM {FOLD_PENDING_TABLE} WHERE id = ?", ((row[0],) for row in rows))
+        conn.commit()
+        folded += len(rows)
+    return folded
+
+def ensure_search_index(conn, rebuild=False):
+    """Crée les index de recherche et leurs triggers, puis les remplit si besoin"""
+    if has_search_index(conn) and not rebuild:
+        return False
+
+    langs = dictionary_languages(conn)
+    columns = ", ".join(langs)
+    new_values = ", ".join(f"new.{lang}" for lang in langs)
+    old_values = ", ".join(f"old.{lang}" for lang in langs)
+
+    cursor = conn.cursor()
+    for name in ("dictionary_search_ai", "dictionary_search_ad", "dictionary_search_au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FOLD_TABLE}")
+    cursor.execute(f"DROP TABLE IF EXISTS {FOLD_PENDING_TABLE}")
+
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            {columns},
+            content='dictionary',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    """)
+    cursor.execute(f"""
+        CREATE VIRTUAL TABLE {FOLD_TABLE} USING fts5(
+            {columns},
+            tokenize='trigram'
+        )
+    """)
+    cursor.execute(f"CREATE TABLE {FOLD_PENDING_TABLE} (id INTEGER PRIMARY KEY)")
+
+    cursor.execute(f"""
+        CREATE TRIGGER dictionary_search_ai AFTER INSERT ON dictionary BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});
+            INSERT OR IGNORE INTO {FOLD_PENDING_TABLE}(id) VALUES (new.id);
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER dictionary_search_ad AFTER DELETE ON dictionary BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            DELETE FROM {FOLD_TABLE} WHERE rowid = old.id;
+            DELETE FROM {FOLD_PENDING_TABLE} WHERE id = old.id;
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER dictionary_search_au AFTER UPDATE ON dictionary BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});
+            DELETE FROM {FOLD_TABLE} WHERE rowid = old.id;
+            INSERT OR IGNORE INTO {FOLD_PENDING_TABLE}(id) VALUES (new.id);
+        END
+    """)
+
+    # Remplissage initial à partir des mots existants
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    cursor.execute(f"INSERT INTO {FOLD_PENDING_TABLE}(id) SELECT id FROM dictionary")
+    conn.commit()
+    refresh_fold_index(conn)
+    return True
+
+def _fts_string(text):
+    return '"' + text.replace('"', '""') + '"'
+
+def search_prefix(conn, word, lang, limit):
+    """Préfixe sur l'index B-tree de la colonne (quelques variantes de casse)
+
+    Les lignes sont lues dans l'ordre de l'index: la correspondance exacte,
+    plus courte, arrive avant les mots qui la prolongent.
+    """
+    ids = []
+    for variant in dict.fromkeys((word, word[:1].upper() + word[1:], word.lower())):
+        rows = conn.execute(f"""
+            SELECT id FROM dictionary
+            WHERE {lang} >= ? AND {lang} < ?
+            ORDER BY {lang}
+            LIMIT ?
+        """, (variant, variant + "\U0010ffff", limit)).fetchall()
+        ids.extend(row[0] for row in rows)
+    return ids
+
+def search_fulltext(conn, word, lang, limit):
+    """Mots (ou débuts de mots) contenus dans une entrée, classés par bm25"""
+    terms = " ".join(f"{_fts_string(term)}*" for term in word.split())
+    if not terms:
+        return []
+    rows = conn.execute(f"""
+        SELECT rowid FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (f"{lang} : ({terms})", limit)).fetchall()
+    return [row[0] for row in rows]
+
+def search_substring(conn, word, lang, limit):
+    """Sous-chaîne quelconque (LIKE '%mot%'), par parcours complet de la table
+
+    Dernier recours quand ni le préfixe ni le plein texte ne trouvent rien:
+    retrouve les correspondances au milieu d'un mot (« haus » dans
+    « Krankenhaus ») comme l'ancienne recherche.
+    """
+    pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    rows = conn.execute(f"""
+        SELECT id FROM dictionary
+        WHERE {lang} LIKE ? ESCAPE '\\'
+        LIMIT ?
+    """, (pattern, limit)).fetchall()
+    return [row[0] for row in rows]
+
+def search_fuzzy(conn, word, lang, limit, candidates=200, min_ratio=0.6):
+    """Recherche tolérante aux umlauts et aux fautes sur le texte plié
+
+    Les sous-chaînes du mot plié sont cherchées d'abord (index trigramme).
+    S'il en manque, les entrées partageant des trigrammes avec le mot sont
+    reclassées par similarité pour rattraper les fautes de frappe.
+    """
+    folded = fold(word)
+    if len(folded) < 3:
+        return []
+    refresh_fold_index(conn)
+
+    rows = conn.execute(f"""
+        SELECT rowid, {lang} FROM {FOLD_TABLE}
+        WHERE {FOLD_TABLE} MATCH ?
+        LIMIT ?
+    """, (f"{lang} : {_fts_string(folded)}", candidates)).fetchall()
+
+    if len(rows) < limit:
+        trigrams = dict.fromkeys(folded[i:i + 3] for i in range(len(folded) - 2))
+        query = f"{lang} : ({' OR '.join(_fts_string(t) for t in trigrams)})"
+        rows += conn.execute(f"""
+            SELECT rowid, {lang} FROM {FOLD_TABLE}
+            WHERE {FOLD_TABLE} MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (query, candidates)).fetchall()
+
+    scored = {}
+    for rowid, text in rows:
+        ratio = difflib.SequenceMatcher(None, folded, text).ratio()
+        if folded in text:
+            # Les sous-chaînes exactes passent avant les mots approchants
+            ratio = 1.0 + len(folded) / len(text)
+        if ratio >= min_ratio:
+            scored[rowid] = ratio
+    ranked = sorted(scored, key=lambda rowid: -scored[rowid])
+    return ranked[:limit]
+
+def search(conn, word, lang="de", limit=10, fuzzy=False, columns=None):
+    """Recherche classée: préfixe, puis plein texte, puis approximatif si demandé
+
+    Sans résultat, la recherche retombe sur une sous-chaîne (LIKE). Par
+    défaut, `columns` correspond aux colonnes de la table (default_columns).
+    """
+    if columns is None:
+        columns = default_columns(conn)
+    if lang not in dictionary_languages(conn):
+        raise ValueError(f"Langue non disponible dans le dictionnaire: {lang}")
+
+    ids = list(dict.fromkeys(search_prefix(conn, word, lang, limit)))
+    if len(ids) < limit and has_search_index(conn):
+        ids = list(dict.fromkeys(ids + search_fulltext(conn, word, lang, limit)))
+        if fuzzy and len(ids) < limit:
+            ids = list(dict.fromkeys(ids + search_fuzzy(conn, word, lang, limit)))
+    if not ids:
+        ids = search_substring(conn, word, lang, limit)
+    ids = ids[:limit]
+    if not ids:
+        return []
+
+    placeholders = ", ".join("?" for _ in ids)
+    rows = conn.execute(
+        f"SELECT id, {columns} FROM dictionary WHERE id IN ({placeholders})", ids
+    ).fetchall()
+    by_id = {row[0]: row[1:] for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""Événements de progression du pipeline
+
+Les workers (téléchargement, transcription, traduction) publient leurs
+événements dans le stream Redis EVENTS_STREAM (XADD, longueur bornée à
+EVENTS_STREAM_MAXLEN). L'API lit ce stream avec une seule connexion
+(EventHub) et le redistribue en Server-Sent Events sur GET /api/events.
+
+Chaque client a un tampon de EVENTS_CLIENT_BUFFER événements: un navigateur
+trop lent voit son tampon vidé et remplacé par un unique événement `resync`
+(il relit alors la liste des vidéos), la mémoire du serveur reste bornée.
+Les identifiants du stream servent d'id SSE: un client qui se reconnecte avec
+Last-Event-ID reçoit les événements manqués encore présents dans le stream.
+"""
+import asyncio
+import json
+import time
+from config import (
+    EVENTS_STREAM, EVENTS_STREAM_MAXLEN, EVENTS_PROGRESS_INTERVAL,
+    EVENTS_CLIENT_BUFFER, EVENTS_STATUS_INTERVAL, EVENTS_REPLAY_MAX
+)
+
+# Statut de la vidéo (colonne `status`) annoncé par défaut avec chaque événement
+STATUS_BY_EVENT = {
+    "created": "pending",
+    "downloading": "pending",
+    "downloaded": "pending",
+    "transcribing": "processing",
+    "translating": "completed",
+    "completed": "completed",
+    "error": "error",
+}
+
+class EventPublisher:
+    """Publication synchrone des événements, côté workers
+
+    Les événements de progression d'une même étape sont limités à un par
+    EVENTS_PROGRESS_INTERVAL secondes et par vidéo (sauf à 100 %). Une erreur
+    Redis n'interrompt jamais la tâche: l'événement est simplement perdu.
+    """
+
+    def __init__(self, redis_client, stream=EVENTS_STREAM, min_interval=EVENTS_PROGRESS_INTERVAL):
+        self.redis = redis_client
+        self.stream = stream
+        self.min_interval = min_interval
+        self.last_progress = {}
+
+    def publish(self, video_id, event, progress=None, status=None, **fields):
+        if progress is not None:
+            key = (video_id, event)
+            now = time.monotonic()
+            if progress < 100 and now - self.last_progress.get(key, 0.0) < self.min_interval:
+                return False
+            self.last_progress[key] = now
+            if progress >= 100:
+                self.last_progress.pop(key, None)
+
+        entry = {
+            "video_id": video_id,
+            "event": event,
+            "status": status or STATUS_BY_EVENT.get(event, ""),
+            "ts": round(time.time(), 3),
+        }
+        if progress is not None:
+            entry["progress"] = round(progress, 1)
+        entry.update({name: value for name, value in fields.items() if value is not None})
+        try:
+            self.redis.xadd(self.stream, entry, maxlen=EVENTS_STREAM_MAXLEN, approximate=True)
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la publication de l'événement {event} (vidéo {video_id}): {e}")
+            return False
+
+def decode_event(entry_id, fields):
+    """Entrée du stream -> dict prêt à être envoyé au client"""
+    def text(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    event = {text(name): text(value) for name, value in fields.items()}
+    event["id"] = text(entry_id)
+    event["video_id"] = int(event["video_id"])
+    if "progress" in event:
+        event["progress"] = float(event["progress"])
+    if "ts" in event:
+        event["ts"] = float(event["ts"])
+    return event
+
+def stream_id_key(entry_id):
+    """Identifiant de stream `ms-seq` -> tuple comparable"""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def format_sse(event):
+    """Message SSE; le type d'événement reste dans les données (`message` côté navigateur)"""
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+class Subscription:
+    """Tampon borné d'un client SSE"""
+
+    def __init__(self, video_id=None, buffer_size=EVENTS_CLIENT_BUFFER):
+        self.video_id = video_id
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def wants(self, event):
+        if self.video_id is None:
+            return True
+        return event.get("video_id") == self.video_id
+
+    def push(self, event):
+        if not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent: on abandonne son retard plutôt que de l'accumuler
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.dropped += 1
+            self.queue.put_nowait({"event": "resync", "dropped": self.dropped})
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+class EventHub:
+    """Lecteur unique du stream, redistribuant les événements aux abonnés
+
+    `status_source` (coroutine optionnelle) fournit un instantané de l'état
+    des queues envoyé toutes les `status_interval` secondes tant qu'au moins
+    un client est abonné.
+    """
+
+    def __init__(self, redis_client, stream=EVENTS_STREAM, status_source=None, status_interval=EVENTS_STATUS_INTERVAL):
+        self.redis = redis_client
+        self.stream = stream
+        self.status_source = status_source
+        self.status_interval = status_interval
+        self.subscribers = set()
+        self.tasks = []
+
+    def start(self):
+        self.tasks = [asyncio.ensure_future(self._read_stream())]
+        if self.status_source is not None:
+            self.tasks.append(asyncio.ensure_future(self._send_status()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+
+    def subscribe(self, video_id=None):
+        subscription = Subscription(video_id)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    def broadcast(self, event):
+        for subscription in list(self.subscribers):
+            subscription.push(event)
+
+    async def replay(self, after_id, count=EVENTS_REPLAY_MAX):
+        """Événements postérieurs à `after_id` encore présents dans le stream"""
+        # Borne inclusive (XRANGE exclusif demande Redis 6.2): l'événement déjà reçu est retiré
+        entries = await self.redis.xrange(self.stream, min=after_id, count=count + 1)
+        events = [decode_event(entry_id, fields) for entry_id, fields in entries]
+        return [event for event in events if event["id"] != after_id][:count]
+
+    async def _read_stream(self):
+        last_id = "$"
+        while True:
+            try:
+                response = await self.redis.xread({self.stream: last_id}, count=100, block=5000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erreur de lecture du stream d'événements: {e}")
+                await asyncio.sleep(1)
+                continue
+            for _, entries in response or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    try:
+                        event = decode_event(entry_id, fields)
+                    except (KeyError, ValueError) as e:
+                        print(f"Événement ignoré ({entry_id}): {e}")
+                        continue
+                    self.broadcast(event)
+
+    async def _send_status(self):
+        while True:
+            await asyncio.sleep(self.status_interval)
+            if not self.subscribers:
+                continue
+            try:
+                status = await self.status_source()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erreur lors de la lecture de l'état des queues: {e}")
+                continue
+            # Pas d'id: un instantané n'a pas à être rejoué
+            self.broadcast(dict(status, event="status"))
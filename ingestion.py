@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import redis
+import yt_dlp
+from audio_pcm import decode_to_pcm
+from config import (
+    AUDIO_DIR, REDIS_HOST, REDIS_PORT, REDIS_DB, TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE,
+    DOWNLOAD_WORKERS, AUDIO_INGEST_MODE
+)
+from events import EventPublisher
+from jobs import JobQueue
+from metrics import histogram
+
+DOWNLOAD_SECONDS = histogram(
+    "download_seconds", "Durée des téléchargements yt-dlp (décodage PCM compris)", ["mode", "outcome"]
+)
+
+# Configuration de yt-dlp
+ydl_opts = {
+    'format': 'bestaudio/best',
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3',
+        'preferredquality': '192',
+    }],
+    'outtmpl': os.path.join(AUDIO_DIR, '%(id)s.%(ext)s'),
+    'quiet': True,
+    'noprogress': True,
+}
+
+# Flux audio natif, sans post-traitement FFmpeg
+ydl_opts_native = {
+    'format': 'bestaudio[ext=webm]/bestaudio[ext=m4a]/bestaudio/best',
+    'outtmpl': os.path.join(AUDIO_DIR, '%(id)s.%(ext)s'),
+    'quiet': True,
+    'noprogress': True,
+}
+
+class DownloadJob:
+    """Téléchargement d'une vidéo YouTube et sa progression"""
+
+    def __init__(self, youtube_id, video_id, audio_path):
+        self.id = uuid.uuid4().hex
+        self.youtube_id = youtube_id
+        self.video_id = video_id
+        self.audio_path = audio_path
+        self.status = "pending"
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.percent = 0.0
+        self.error = None
+
+    def progress_hook(self, d):
+        """Hook de progression appelé par yt-dlp"""
+        if d['status'] == 'downloading':
+            self.status = "downloading"
+            self.downloaded_bytes = d.get('downloaded_bytes') or 0
+            self.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+            if self.total_bytes:
+                self.percent = round(100.0 * self.downloaded_bytes / self.total_bytes, 1)
+        elif d['status'] == 'finished':
+            # Le téléchargement est fini, un éventuel post-traitement commence
+            self.status = "converting"
+            self.percent = 100.0
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "percent": self.percent,
+            "error": self.error
+        }
+
+class DownloadManager:
+    """Exécute les téléchargements yt-dlp dans un pool de threads borné
+
+    Une vidéo déjà en cours de téléchargement n'est pas relancée: la demande
+    est rattachée au job existant.
+    """
+
+    def __init__(self, db, max_workers=DOWNLOAD_WORKERS, history_size=1000, mode=AUDIO_INGEST_MODE):
+        self.db = db
+        self.mode = mode
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self.redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+        self.transcription_jobs = JobQueue(self.redis_client, TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE)
+        self.events = EventPublisher(self.redis_client)
+        self.lock = threading.Lock()
+        # Sérialise les créations (insertion MySQL) sans bloquer get_job, appelé depuis la boucle de l'API
+        self.create_lock = threading.Lock()
+        self.in_flight = {}
+        self.jobs_by_video = OrderedDict()
+        self.history_size = history_size
+
+    def submit(self, youtube_id):
+        """Crée la vidéo en base et planifie son téléchargement
+
+        Retourne le job et un booléen indiquant s'il vient d'être créé.
+        Bloquant (MySQL, Redis): l'API l'appelle hors de la boucle d'événements.
+        """
+        with self.create_lock:
+            with self.lock:
+                job = self.in_flight.get(youtube_id)
+            if job:
+                return job, False
+
+            audio_path = os.path.join(AUDIO_DIR, f"{youtube_id}.mp3")
+            video_id = self.db.add_video(youtube_id, audio_path)
+            job = DownloadJob(youtube_id, video_id, audio_path)
+            with self.lock:
+                self.in_flight[youtube_id] = job
+                self.jobs_by_video[video_id] = job
+                while len(self.jobs_by_video) > self.history_size:
+                    self.jobs_by_video.popitem(last=False)
+
+        self.events.publish(video_id, "created", youtube_id=youtube_id)
+        self.executor.submit(self._download, job)
+        return job, True
+
+    def get_job(self, video_id):
+        with self.lock:
+            return self.jobs_by_video.get(video_id)
+
+    def _progress_hooks(self, job):
+        def publish_progress(d):
+            if job.status == "downloading":
+                self.events.publish(job.video_id, "downloading", progress=job.percent)
+        return [job.progress_hook, publish_progress]
+
+    def _download(self, job):
+        start = time.perf_counter()
+        try:
+            os.makedirs(AUDIO_DIR, exist_ok=True)
+            video_url = f"https://www.youtube.com/watch?v={job.youtube_id}"
+            if self.mode == "mp3":
+                options = dict(ydl_opts, progress_hooks=self._progress_hooks(job))
+                with yt_dlp.YoutubeDL(options) as ydl:
+                    ydl.download([video_url])
+            else:
+                options = dict(ydl_opts_native, progress_hooks=self._progress_hooks(job))
+                with yt_dlp.YoutubeDL(options) as ydl:
+                    info = ydl.extract_info(video_url, download=True)
+                    audio_path = ydl.prepare_filename(info)
+                if audio_path != job.audio_path:
+                    job.audio_path = audio_path
+                    self.db.update_video_audio_path(job.video_id, audio_path)
+
+                if self.mode == "pcm":
+                    # Décodage unique en PCM 16 kHz, relu directement par le worker
+                    job.status = "decoding"
+                    decode_to_pcm(audio_path)
+
+            # Ajouter le fichier à la queue de traitement (nouvelle tâche, essais remis à zéro)
+            self.transcription_jobs.enqueue([job.audio_path])
+            DOWNLOAD_SECONDS.labels(self.mode, "ok").observe(time.perf_counter() - start)
+            job.status = "completed"
+            self.events.publish(job.video_id, "downloaded")
+        except Exception as e:
+            DOWNLOAD_SECONDS.labels(self.mode, "error").observe(time.perf_counter() - start)
+            print(f"Erreur lors du téléchargement de {job.youtube_id}: {e}")
+            job.status = "error"
+            job.error = str(e)
+            self.events.publish(job.video_id, "error", stage="download", message=str(e))
+            try:
+                self.db.update_video_status(job.video_id, "error")
+            except Exception:
+                pass
+        finally:
+            with self.lock:
+                self.in_flight.pop(job.youtube_id, None)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Files de travail Redis avec baux, reprises et lettres mortes
+
+Une tâche est la chaîne poussée dans la queue (le chemin audio pour la
+transcription). Cycle de vie:
+
+    queue --claim--> processing + bail --complete--> (terminée)
+                                       --fail------> retardée (backoff) --> queue
+                                                 \\--> lettres mortes (trop d'essais)
+
+Le bail (`<queue>:leases`, score = échéance) est prolongé par un thread de
+heartbeat tant que le worker travaille. Un bail expiré (worker mort ou bloqué)
+est repris par `reap_expired`, appelé périodiquement par chaque worker: la
+tâche compte alors comme un échec et repart avec backoff.
+
+Les changements de statut des vidéos sont répercutés dans MySQL par lots
+(StatusMirror) plutôt qu'un UPDATE par événement.
+
+Usage:
+    python jobs.py stats
+    python jobs.py dead
+    python jobs.py requeue-dead [--count N]
+"""
+import json
+import threading
+import time
+from metrics import counter, histogram
+from config import (
+    JOB_VISIBILITY_TIMEOUT, JOB_HEARTBEAT_INTERVAL, JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF, JOB_RETRY_BACKOFF_MAX,
+    STATUS_FLUSH_INTERVAL, STATUS_FLUSH_SIZE
+)
+
+# Échéances dépassées: retirées des baux et de la liste processing.
+# Les tâches présentes dans processing sans bail (worker mort entre BLMOVE et
+# la prise du bail, ou worker d'avant les baux) reçoivent un bail de grâce.
+REAP_SCRIPT = """
+local now = tonumber(ARGV[1])
+local grace = tonumber(ARGV[2])
+for _, item in ipairs(redis.call('LRANGE', KEYS[2], 0, -1)) do
+    if not redis.call('ZSCORE', KEYS[1], item) then
+        redis.call('ZADD', KEYS[1], now + grace, item)
+    end
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, 100)
+for _, item in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], item)
+    redis.call('LREM', KEYS[2], 1, item)
+end
+return expired
+"""
+
+# Tâches retardées arrivées à échéance: remises dans la queue
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, item in ipairs(due) do
+    redis.call('ZREM', KEYS[1], item)
+    redis.call('LPUSH', KEYS[2], item)
+    redis.call('HSET', KEYS[3], item, ARGV[1])
+end
+return due
+"""
+
+# Lettres mortes remises dans la queue, retirées de la liste dans la même
+# opération: une tâche enterrée pendant la reprise reste dans la liste
+REQUEUE_DEAD_SCRIPT = """
+local entries = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]))
+redis.call('LTRIM', KEYS[1], #entries, -1)
+local payloads = {}
+for _, entry in ipairs(entries) do
+    local payload = cjson.decode(entry)['payload']
+    table.insert(payloads, payload)
+    redis.call('HDEL', KEYS[3], payload)
+    redis.call('HSET', KEYS[4], payload, ARGV[2])
+    redis.call('LPUSH', KEYS[2], payload)
+end
+return payloads
+"""
+
+QUEUE_WAIT_SECONDS = histogram(
+    "queue_wait_seconds", "Attente d'une tâche entre sa mise en queue et sa prise par un worker", ["queue"]
+)
+JOBS_FINISHED = counter("jobs_finished_total", "Tâches terminées par issue (completed, retry, dead, lost)", ["queue", "outcome"])
+
+def queue_keys(queue):
+    """Clés Redis associées à une queue (baux, essais, mises en queue, tâches retardées, lettres mortes)"""
+    return {
+        "leases": f"{queue}:leases",
+        "enqueued": f"{queue}:enqueued",
+        "attempts": f"{queue}:attempts",
+        "delayed": f"{queue}:delayed",
+        "dead": f"{queue}:dead",
+    }
+
+class JobQueue:
+    """Queue Redis à baux; les méthodes retournent l'issue de chaque tâche"""
+
+    ENQUEUE_CHUNK = 1000  # arguments par LPUSH
+
+    def __init__(self, redis_client, queue, processing_queue,
+                 visibility_timeout=JOB_VISIBILITY_TIMEOUT, max_attempts=JOB_MAX_ATTEMPTS):
+        self.redis = redis_client
+        self.queue = queue
+        self.processing = processing_queue
+        keys = queue_keys(queue)
+        self.leases = keys["leases"]
+        self.attempts = keys["attempts"]
+        self.enqueued = keys["enqueued"]
+        self.delayed = keys["delayed"]
+        self.dead = keys["dead"]
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.reap_script = redis_client.register_script(REAP_SCRIPT)
+        self.promote_script = redis_client.register_script(PROMOTE_SCRIPT)
+        self.requeue_dead_script = redis_client.register_script(REQUEUE_DEAD_SCRIPT)
+        self.active = set()
+        self.lock = threading.Lock()
+
+    def enqueue(self, payloads):
+        """Ajoute des tâches neuves (leur compteur d'essais est remis à zéro)
+
+        Toutes les tâches partent en un seul aller-retour pipeliné, par
+        commandes de ENQUEUE_CHUNK éléments.
+        """
+        payloads = list(payloads)
+        if not payloads:
+            return 0
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for start in range(0, len(payloads), self.ENQUEUE_CHUNK):
+            chunk = payloads[start:start + self.ENQUEUE_CHUNK]
+            pipe.hdel(self.attempts, *chunk)
+            pipe.hset(self.enqueued, mapping={payload: now for payload in chunk})
+            pipe.lpush(self.queue, *chunk)
+        pipe.execute()
+        return len(payloads)
+
+    def claim(self, timeout=5):
+        """Attend une tâche, la passe en processing et prend son bail"""
+        payload = self.redis.blmove(self.queue, self.processing, timeout, "RIGHT", "LEFT")
+        if payload is None:
+            return None
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(self.leases, {payload: now + self.visibility_timeout})
+        pipe.hget(self.enqueued, payload)
+        pipe.hdel(self.enqueued, payload)
+        _, enqueued_at, _ = pipe.execute()
+        with self.lock:
+            self.active.add(payload)
+        if enqueued_at is not None:
+            QUEUE_WAIT_SECONDS.labels(self.queue).observe(max(0.0, now - float(enqueued_at)))
+        return payload
+
+    def heartbeat(self):
+        """Prolonge les baux des tâches en cours; retourne celles dont le bail a été perdu"""
+        with self.lock:
+            payloads = list(self.active)
+        if not payloads:
+            return []
+        deadline = time.time() + self.visibility_timeout
+        pipe = self.redis.pipeline()
+        for payload in payloads:
+            # XX: un bail déjà repris par reap_expired n'est pas recréé
+            pipe.zadd(self.leases, {payload: deadline}, xx=True, ch=True)
+            pipe.zscore(self.leases, payload)
+        results = pipe.execute()
+        lost = [payload for payload, score in zip(payloads, results[1::2]) if score is None]
+        with self.lock:
+            self.active.difference_update(lost)
+        return lost
+
+    def _release(self, payload):
+        """Rend le bail; faux s'il avait déjà été repris par reap_expired"""
+        with self.lock:
+            self.active.discard(payload)
+        # Le ZREM sert de jeton: seul celui qui retire le bail décide de l'issue
+        owned = self.redis.zrem(self.leases, payload) == 1
+        self.redis.lrem(self.processing, 1, payload)
+        return owned
+
+    def complete(self, payload):
+        self._release(payload)
+        self.redis.hdel(self.attempts, payload)
+        JOBS_FINISHED.labels(self.queue, "completed").inc()
+
+    def backoff(self, attempt):
+        return min(JOB_RETRY_BACKOFF * 2 ** (attempt - 1), JOB_RETRY_BACKOFF_MAX)
+
+    def fail(self, payload, error):
+        """Échec d'une tâche: nouvel essai retardé, ou lettres mortes
+
+        Retourne "retry", "dead", ou "lost" si le bail avait expiré entre-temps
+        (la tâche a alors déjà été reprise).
+        """
+        if not self._release(payload):
+            JOBS_FINISHED.labels(self.queue, "lost").inc()
+            return "lost"
+        return self._retry_or_bury(payload, error)
+
+    def _retry_or_bury(self, payload, error):
+        attempt = self.redis.hincrby(self.attempts, payload, 1)
+        pipe = self.redis.pipeline()
+        if attempt < self.max_attempts:
+            pipe.zadd(self.delayed, {payload: time.time() + self.backoff(attempt)})
+            outcome = "retry"
+        else:
+            self._bury(pipe, payload, error, attempt)
+            outcome = "dead"
+        pipe.execute()
+        JOBS_FINISHED.labels(self.queue, outcome).inc()
+        return outcome
+
+    def bury(self, payload, error):
+        """Envoie directement une tâche aux lettres mortes (erreur définitive)"""
+        self._release(payload)
+        pipe = self.redis.pipeline()
+        self._bury(pipe, payload, error, self.redis.hget(self.attempts, payload) or 0)
+        pipe.execute()
+        JOBS_FINISHED.labels(self.queue, "dead").inc()
+
+    def _bury(self, pipe, payload, error, attempts):
+        pipe.lpush(self.dead, json.dumps({
+            "payload": payload,
+            "error": str(error),
+            "attempts": int(attempts),
+            "failed_at": time.time()
+        }))
+        pipe.hdel(self.attempts, payload)
+
+    def reap_expired(self):
+        """Reprend les tâches dont le bail a expiré; retourne [(tâche, issue)]"""
+        expired = self.reap_script(
+            keys=[self.leases, self.processing],
+            args=[time.time(), self.visibility_timeout]
+        )
+        return [(payload, self._retry_or_bury(payload, "bail expiré")) for payload in expired]
+
+    def promote_due(self):
+        """Remet dans la queue les tâches retardées arrivées à échéance"""
+        return self.promote_script(keys=[self.delayed, self.queue, self.enqueued], args=[time.time()])
+
+    def requeue_dead(self, count=None):
+        """Remet des lettres mortes dans la queue (reprise manuelle)
+
+        Comme `enqueue`, le compteur d'essais des tâches est remis à zéro.
+        """
+        return self.requeue_dead_script(
+            keys=[self.dead, self.queue, self.attempts, self.enqueued],
+            args=[-1 if count is None else count - 1, time.time()]
+        )
+
+    def stats(self):
+        pipe = self.redis.pipeline()
+        pipe.llen(self.queue)
+        pipe.llen(self.processing)
+        pipe.zcard(self.delayed)
+        pipe.llen(self.dead)
+        queued, processing, delayed, dead = pipe.execute()
+        return {"queued": queued, "processing": processing, "delayed": delayed, "dead": dead}
+
+    def start_maintenance(self, stop, on_outcome=None, interval=None):
+        """Thread de heartbeat, de reprise des baux expirés et des tâches retardées
+
+        `on_outcome(tâche, issue)` est appelé pour chaque tâche reprise.
+        """
+        interval = interval or min(JOB_HEARTBEAT_INTERVAL, self.visibility_timeout / 3)
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    for payload in self.heartbeat():
+                        print(f"Avertissement: bail perdu pour '{payload}' (repris par un autre worker)")
+                    for payload, outcome in self.reap_expired():
+                        print(f"Bail expiré pour '{payload}': {outcome}")
+                        if on_outcome:
+                            on_outcome(payload, outcome)
+                    self.promote_due()
+                except Exception as e:
+                    print(f"Erreur de maintenance de la queue {self.queue}: {e}")
+
+        thread = threading.Thread(target=run, name=f"jobs-{self.queue}", daemon=True)
+        thread.start()
+        return thread
+
+class StatusMirror:
+    """Répercute les statuts des vidéos dans MySQL par lots
+
+    Seul le dernier statut de chaque vidéo est écrit; le lot part toutes les
+    `interval` secondes ou dès `max_pending` vidéos en attente.
+    """
+
+    def __init__(self, db, interval=STATUS_FLUSH_INTERVAL, max_pending=STATUS_FLUSH_SIZE):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.flushes = 0
+        self.updates = 0
+        self.thread = threading.Thread(target=self._run, name="status-mirror", daemon=True)
+        self.thread.start()
+
+    def set(self, video_id, status):
+        with self.lock:
+            self.pending[video_id] = status
+            full = len(self.pending) >= self.max_pending
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            self.db.update_video_statuses(pending.items())
+        except Exception:
+            # Remis en attente sans écraser un statut plus récent
+            with self.lock:
+                for video_id, status in pending.items():
+                    self.pending.setdefault(video_id, status)
+            raise
+        self.flushes += 1
+        self.updates += len(pending)
+        return len(pending)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des statuts: {e}")
+
+    def close(self):
+        self.stopped.set()
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+
+def main():
+    import argparse
+    import redis
+    from config import REDIS_HOST, REDIS_PORT, REDIS_DB, TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE
+
+    parser = argparse.ArgumentParser(description="État de la queue de transcription")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Tâches en attente, en cours, retardées et mortes")
+    subparsers.add_parser("dead", help="Liste les lettres mortes")
+    requeue = subparsers.add_parser("requeue-dead", help="Remet les lettres mortes dans la queue")
+    requeue.add_argument("--count", type=int)
+    args = parser.parse_args()
+
+    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    jobs = JobQueue(redis_client, TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE)
+    if args.command == "stats":
+        for key, value in jobs.stats().items():
+            print(f"{key:<12}{value:>8}")
+    elif args.command == "dead":
+        for entry in redis_client.lrange(jobs.dead, 0, -1):
+            entry = json.loads(entry)
+            print(f"{entry['payload']}  ({entry['attempts']} essai(s)): {entry['error']}")
+    else:
+        payloads = jobs.requeue_dead(args.count)
+        print(f"{len(payloads)} tâche(s) remise(s) dans la queue")
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,205 @@
 #!/usr/bin/env python3
+"""Journalisation asynchrone au format JSON
+
+Les loggers ne font plus d'écriture disque dans le thread appelant (ni dans
+la boucle d'événements de l'API): chaque enregistrement est préparé puis
+déposé dans une file bornée, et un unique thread (QueueListener) l'écrit en
+JSON, une ligne par enregistrement, dans le fichier à rotation du logger.
+
+    from logger import log_context, setup_logger
+    log = setup_logger('translation', 'translation.log')
+    with log_context(video_id=12, job_id="abc"):
+        log.info("Traduction terminée")   # {"video_id": 12, "job_id": "abc", ...}
+    log.debug("Segment traduit", extra={"segment": 3})
+
+Les niveaux listés dans LOG_SAMPLING ne sont gardés qu'un sur N (lignes de
+debug par segment). Au-delà de LOG_QUEUE_SIZE enregistrements en attente, les
+DEBUG/INFO sont abandonnés plutôt que de bloquer l'appelant; les WARNING et
+au-delà sont toujours gardés (la file n'est pas bornée pour eux).
+`setup_logger` peut être appelé plusieurs fois pour un même nom sans
+dupliquer les handlers.
+"""
+import atexit
+import contextvars
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-
-def setup_logger(name, log_file='app.log', level=logging.INFO):
-    """Configure un logger avec rotation des fichiers"""
-    
-    # Créer le dossier logs s'il n'existe pas
-    os.makedirs('logs', exist_ok=True)
-    
-    # Configurer le logger
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_DIR, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_SAMPLING
+
+# Attributs standard d'un LogRecord: tout le reste vient de `extra` ou du contexte
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "log_file"}
+
+_context = contextvars.ContextVar("log_context", default={})
+
+@contextmanager
+def log_context(**fields):
+    """Ajoute des champs (job_id, video_id...) à tous les logs émis dans le bloc
+
+    Le contexte suit le thread ou la tâche asyncio courante.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, avec les champs du contexte et de `extra`"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Ne garde qu'un enregistrement sur N pour les niveaux configurés
+
+    Les enregistrements gardés portent `sample_rate` pour pouvoir être
+    repondérés à l'analyse.
+    """
+
+    def __init__(self, sampling):
+        super().__init__()
+        self.rates = {logging.getLevelName(level) if isinstance(level, str) else level: rate
+                      for level, rate in sampling.items()}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if not rate or rate <= 1:
+            return True
+        with self.lock:
+            count = self.counters.get(record.levelno, 0)
+            self.counters[record.levelno] = count + 1
+        if count % rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+class _AsyncHandler(QueueHandler):
+    """Côté appelant: prépare l'enregistrement et le dépose dans la file sans attendre"""
+
+    def __init__(self, log_queue, log_file):
+        super().__init__(log_queue)
+        self.log_file = log_file
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Message et exception rendus ici: les arguments ne sont pas partagés avec l'autre thread
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        for name, value in _context.get().items():
+            record.__dict__.setdefault(name, value)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        record.log_file = self.log_file
+        return record
+
+    def enqueue(self, record):
+        # La limite ne s'applique qu'aux DEBUG/INFO: un avertissement n'est jamais perdu
+        if record.levelno < logging.WARNING and self.queue.qsize() >= LOG_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class _FileRouter(logging.Handler):
+    """Côté writer: envoie chaque enregistrement au fichier à rotation de son logger"""
+
+    def __init__(self):
+        super().__init__()
+        self.files = {}
+        self.formatter = JsonFormatter()
+
+    def add_file(self, path):
+        if path not in self.files:
+            handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+            handler.setFormatter(self.formatter)
+            self.files[path] = handler
+
+    def emit(self, record):
+        handler = self.files.get(record.log_file)
+        if handler is not None:
+            handler.handle(record)
+
+    def close(self):
+        for handler in self.files.values():
+            handler.close()
+        super().close()
+
+_lock = threading.Lock()
+_queue = None
+_router = None
+_listener = None
+
+def _start_listener():
+    global _queue, _router, _listener
+    if _queue is None:
+        _queue = queue.Queue()
+        _router = _FileRouter()
+        atexit.register(shutdown_logging)
+    if _listener is None:
+        # Aussi après shutdown_logging: les handlers existants gardent la même file
+        _listener = QueueListener(_queue, _router)
+        _listener.start()
+
+def shutdown_logging():
+    """Écrit les enregistrements en attente puis arrête le thread d'écriture"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _router.close()
+            _listener = None
+
+def setup_logger(name, log_file='app.log', level=logging.INFO, log_dir=LOG_DIR, sampling=LOG_SAMPLING):
+    """Configure un logger JSON asynchrone avec rotation des fichiers (idempotent)"""
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, log_file)
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
-    # Gestionnaire de fichier avec rotation
-    handler = RotatingFileHandler(
-        os.path.join('logs', log_file),
-        maxBytes=10000000,  # 10MB
-        backupCount=5
-    )
-    
-    # Format du log
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    handler.setFormatter(formatter)
-    
-    # Ajouter le gestionnaire au logger
-    logger.addHandler(handler)
-    
+    with _lock:
+        _start_listener()
+        _router.add_file(path)
+        for handler in logger.handlers:
+            if isinstance(handler, _AsyncHandler):
+                # Nouvel appel: on redirige l'existant au lieu d'empiler un handler
+                handler.log_file = path
+                return logger
+
+        handler = _AsyncHandler(_queue, path)
+        if sampling:
+            handler.addFilter(SamplingFilter(sampling))
+        logger.addHandler(handler)
     return logger
 
+def dropped_records():
+    """Enregistrements DEBUG/INFO abandonnés faute de place dans la file, par logger"""
+    return {
+        name: handler.dropped
+        for name, logger in logging.Logger.manager.loggerDict.items()
+        if isinstance(logger, logging.Logger)
+        for handler in logger.handlers
+        if isinstance(handler, _AsyncHandler)
+    }
+
 # Loggers spécifiques
 api_logger = setup_logger('api', 'api.log')
 transcription_logger = setup_logger('transcription', 'transcription.log')
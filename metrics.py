@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Métriques au format Prometheus (compteurs, jauges, histogrammes)
+
+Chaque processus enregistre ses mesures dans le registre `registry` de ce
+module. L'API les expose sur GET /metrics; les workers, qui n'ont pas de port
+HTTP, envoient un instantané de leur registre à chaque signal de présence
+(WorkerHeartbeat, voir workers.py) dans le hash Redis METRICS_KEY, que l'API
+agrège au moment de la lecture avec le label `worker`.
+
+Coût sur les chemins chauds: une observation est une recherche dichotomique
+dans les bornes et une incrémentation sous verrou (de l'ordre de la
+microseconde, voir bench_metrics.py); le rendu texte n'a lieu qu'à la lecture.
+
+    DOWNLOAD_SECONDS = histogram("download_seconds", "Durée des téléchargements", ["mode"])
+    with timed(DOWNLOAD_SECONDS.labels("mp3")):
+        ...
+
+    @timed(QUERY_SECONDS)
+    def requete(): ...
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+from config import METRICS_PREFIX, METRICS_KEY
+
+# Bornes par défaut (secondes), de la requête SQL à la transcription d'une heure d'audio
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+# Bornes des tailles (textes par batch, tokens par batch)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+class _Child:
+    """Série d'une métrique pour une combinaison de valeurs de labels"""
+
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def dump(self):
+        return self.value
+
+class _HistogramChild:
+    __slots__ = ("lock", "buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def dump(self):
+        with self.lock:
+            return [list(self.counts), self.sum, self.count]
+
+class Metric:
+    """Métrique nommée, éventuellement déclinée par labels"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return _Child()
+
+    def labels(self, *values):
+        """Série pour ces valeurs de labels (créée au premier appel, puis en cache)"""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: labels attendus {self.labelnames}, reçu {values}")
+            with self.lock:
+                child = self.children.setdefault(tuple(str(v) for v in values) if values else (), self._new_child())
+                self.children[values] = child
+        return child
+
+    def dump(self):
+        with self.lock:
+            children = {tuple(str(v) for v in values): child for values, child in self.children.items()}
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labels": list(self.labelnames),
+            "samples": [[list(values), child.dump()] for values, child in children.items()],
+        }
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def dump(self):
+        dumped = super().dump()
+        dumped["buckets"] = list(self.buckets)
+        return dumped
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        """Enregistre une métrique; une métrique déjà déclarée sous ce nom est réutilisée"""
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrique {metric.name} déjà déclarée autrement")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def dump(self):
+        """Instantané sérialisable de toutes les métriques du processus"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.dump() for metric in metrics}
+
+    def dumps(self):
+        return json.dumps(self.dump(), separators=(",", ":"))
+
+registry = Registry()
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(METRICS_PREFIX + name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(METRICS_PREFIX + name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(METRICS_PREFIX + name, documentation, labelnames, buckets))
+
+class timed:
+    """Chronomètre une portion de code dans un histogramme (ou une série d'histogramme)
+
+    S'utilise comme gestionnaire de contexte ou comme décorateur, y compris
+    sur des coroutines.
+    """
+
+    __slots__ = ("target", "start")
+
+    def __init__(self, target):
+        self.target = target
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.target.observe(time.perf_counter() - self.start)
+        return False
+
+    def __call__(self, function):
+        target = self.target
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    target.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                target.observe(time.perf_counter() - start)
+        return wrapper
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def render(sources):
+    """Format texte Prometheus à partir d'instantanés `Registry.dump()`
+
+    `sources` est une liste de (instantané, labels supplémentaires), par
+    exemple [(registry.dump(), []), (instantané_worker, [("worker", id)])].
+    """
+    merged = {}
+    for snapshot, extra in sources:
+        for name, metric in snapshot.items():
+            entry = merged.setdefault(name, {"metric": metric, "series": []})
+            entry["series"].append((metric, extra))
+
+    lines = []
+    for name in sorted(merged):
+        first = merged[name]["metric"]
+        lines.append(f"# HELP {name} {first['help']}")
+        lines.append(f"# TYPE {name} {first['kind']}")
+        for metric, extra in merged[name]["series"]:
+            labelnames = metric["labels"]
+            for values, data in metric["samples"]:
+                if metric["kind"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labelnames, values, extra)} {_format_number(data)}")
+                    continue
+                counts, total, count = data
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(labelnames, values, list(extra) + [("le", _format_number(bound))])
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, values, extra)} {_format_number(total)}")
+                lines.append(f"{name}_count{_format_labels(labelnames, values, extra)} {count}")
+    return "\n".join(lines) + "\n"
+
+def queue_push(pipe, member):
+    """Ajoute à un pipeline Redis l'envoi de l'instantané de ce processus (workers)"""
+    pipe.hset(METRICS_KEY, member, registry.dumps())
+    return pipe
+
+def worker_sources(raw, active_members):
+    """Instantanés des workers encore actifs, prêts pour `render`
+
+    `raw` est le contenu du hash METRICS_KEY; retourne aussi les membres
+    disparus, à retirer du hash.
+    """
+    active = {m.decode() if isinstance(m, bytes) else m for m in active_members}
+    sources, stale = [], []
+    for member, payload in raw.items():
+        member = member.decode() if isinstance(member, bytes) else member
+        if member not in active:
+            stale.append(member)
+            continue
+        try:
+            sources.append((json.loads(payload), [("worker", member)]))
+        except ValueError:
+            stale.append(member)
+    return sources, stale
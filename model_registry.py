@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Registre partagé des modèles chargés à la demande
+
+Les points d'entrée déclarent leurs modèles avec `register` (sans les charger)
+puis les obtiennent avec `get`: seul le premier appel paie le chargement.
+`preload` lance le chargement en arrière-plan pendant que le processus fait
+ses entrées/sorties; un `get` concurrent attend simplement la fin du
+chargement en cours. Le temps de chargement et la mémoire de chaque modèle
+sont relevés et affichables avec `report`.
+"""
+import importlib.util
+import resource
+import threading
+import time
+
+def current_rss_mb():
+    """Mémoire résidente actuelle du processus (Linux), sinon pic de mémoire"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def pretrained_kwargs():
+    """Options de from_pretrained limitant les copies des poids en mémoire
+
+    Les poids safetensors sont lus par mmap; `low_cpu_mem_usage` évite en plus
+    d'allouer un modèle aléatoire avant d'y copier les poids (nécessite accelerate).
+    """
+    if importlib.util.find_spec("accelerate") is not None:
+        return {"low_cpu_mem_usage": True}
+    return {}
+
+def parameters_mb(model):
+    """Taille des paramètres d'un modèle PyTorch (None pour les autres backends)"""
+    if not hasattr(model, "parameters"):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters()) / 1e6
+    except Exception:
+        return None
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Déclare un modèle; `loader` n'est appelé qu'au premier `get`"""
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = loader
+                self._locks[name] = threading.Lock()
+        return name
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get(self, name):
+        """Modèle déclaré sous `name`, chargé au premier appel"""
+        if name in self._models:
+            return self._models[name]
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Modèle non déclaré: {name}")
+            model_lock = self._locks[name]
+        # Un verrou par modèle: deux modèles différents peuvent se charger en parallèle
+        with model_lock:
+            if name not in self._models:
+                rss_before = current_rss_mb()
+                start = time.perf_counter()
+                model = self._loaders[name]()
+                loaded = model[-1] if isinstance(model, tuple) else model
+                self._stats[name] = {
+                    "load_seconds": time.perf_counter() - start,
+                    # Approximatif si d'autres modèles se chargent en même temps
+                    "rss_mb": current_rss_mb() - rss_before,
+                    "parameters_mb": parameters_mb(loaded),
+                }
+                self._models[name] = model
+                print(f"Modèle {name} chargé en {self._stats[name]['load_seconds']:.1f}s")
+        return self._models[name]
+
+    def preload(self, names):
+        """Charge des modèles dans un thread d'arrière-plan et retourne ce thread"""
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    # L'erreur sera relevée au premier `get` bloquant
+                    print(f"Erreur lors du préchargement de {name}: {str(e)}")
+
+        thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, name):
+        with self._lock:
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def stats(self):
+        return {
+            name: {"loaded": name in self._models, **self._stats.get(name, {})}
+            for name in self._loaders
+        }
+
+    def report(self):
+        print(f"{'modèle':<40}{'chargement':>12}{'RSS':>10}{'paramètres':>12}")
+        for name, stats in self.stats().items():
+            if not stats["loaded"]:
+                print(f"{name:<40}{'non chargé':>12}")
+                continue
+            parameters = f"{stats['parameters_mb']:.0f} Mo" if stats["parameters_mb"] is not None else "-"
+            print(f"{name:<40}{stats['load_seconds']:>11.1f}s{stats['rss_mb']:>7.0f} Mo{parameters:>12}")
+
+registry = ModelRegistry()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""Serveur de modèles local partagé par les workers
+
+Le serveur charge chaque modèle une seule fois et sert traduction et
+génération aux autres processus de la machine via un socket Unix
+(MODEL_SERVER_SOCKET). Les demandes de traduction de tous les clients passent
+par un TranslationBatcher par paire de langues: les textes envoyés au même
+moment par plusieurs workers partagent un seul appel à generate.
+
+Protocole: une requête JSON par ligne, une réponse JSON par ligne.
+    {"op": "translate", "source": "de", "target": "fr", "texts": [...]}
+    {"op": "generate", "prompts": [...], "batch_size": 32}
+    {"op": "stats"}
+
+Usage:
+    python model_server.py serve [--preload de-fr,en-fr] [--generator]
+    python model_server.py translate "Guten Tag" [--source de] [--target fr]
+    python model_server.py stats
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from config import (
+    MODEL_SERVER_SOCKET, MODEL_SERVER_MODE, REDIS_HOST, REDIS_PORT, REDIS_DB,
+    TRANSLATION_BACKEND, TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_WAIT_MS, TRANSLATION_CACHE_SIZE
+)
+from translation_service import TranslationBatcher
+
+_serving = False
+# Mode "auto": résultat du dernier test de connexion au socket, (vrai/faux, instant)
+_probe = (False, 0.0)
+_PROBE_TTL = 5.0
+
+def _server_reachable(socket_path):
+    """Vrai si un serveur accepte les connexions sur le socket
+
+    Un fichier de socket laissé par un serveur planté existe toujours mais
+    refuse les connexions: le client retombe alors sur ses modèles locaux.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(1.0)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def use_model_server():
+    """Vrai si ce processus doit passer par le serveur plutôt que charger ses modèles"""
+    global _probe
+    if _serving or MODEL_SERVER_MODE == "off":
+        return False
+    if MODEL_SERVER_MODE == "required":
+        return True
+    reachable, checked_at = _probe
+    now = time.monotonic()
+    if now - checked_at > _PROBE_TTL:
+        reachable = os.path.exists(MODEL_SERVER_SOCKET) and _server_reachable(MODEL_SERVER_SOCKET)
+        _probe = (reachable, now)
+    return reachable
+
+class ModelClient:
+    """Client du serveur de modèles (une connexion par thread)"""
+
+    def __init__(self, socket_path=MODEL_SERVER_SOCKET, timeout=300):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self):
+        if getattr(self.local, "file", None) is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self.local.sock = sock
+            self.local.file = sock.makefile("rwb")
+        return self.local.file
+
+    def _reset(self):
+        try:
+            self.local.sock.close()
+        except Exception:
+            pass
+        self.local.file = None
+        # Le serveur a pu redémarrer avec un autre backend
+        self.local.backend = None
+
+    def call(self, op, **params):
+        try:
+            stream = self._connection()
+            stream.write(json.dumps({"op": op, **params}).encode("utf-8") + b"\n")
+            stream.flush()
+            line = stream.readline()
+        except OSError:
+            self._reset()
+            raise
+        if not line:
+            self._reset()
+            raise ConnectionError("Connexion fermée par le serveur de modèles")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"Serveur de modèles: {response['error']}")
+        return response["result"]
+
+    def translate(self, texts, source, target):
+        """Traduction par le modèle d'une seule paire de langues"""
+        if not texts:
+            return []
+        return self.call("translate", source=source, target=target, texts=list(texts))
+
+    def generate(self, prompts, batch_size=32):
+        return self.call("generate", prompts=list(prompts), batch_size=batch_size)
+
+    def stats(self):
+        return self.call("stats")
+
+    def backend(self):
+        """Backend d'inférence des modèles du serveur (lu une fois par connexion)"""
+        if getattr(self.local, "backend", None) is None:
+            self.local.backend = self.call("stats")["backend"]
+        return self.local.backend
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelClient()
+        return _client
+
+class RemoteBatcher(TranslationBatcher):
+    """Équivalent client de TranslationBatcher pour une paire de langues
+
+    Même interface (submit, translate_batch, cache, stats): translate_api.py
+    l'utilise sans changement quand le serveur de modèles tourne. Les textes
+    soumis sont regroupés ici, dans la même fenêtre que TranslationBatcher
+    (jusqu'à `max_batch_size` textes ou `max_wait_ms`), et chaque groupe part
+    en un seul appel `translate`: une transcription de mille segments fait
+    quelques dizaines d'allers-retours, pas mille.
+    """
+
+    def __init__(self, source, target, max_batch_size=32, cache_size=10000, max_wait_ms=TRANSLATION_BATCH_WAIT_MS):
+        self.source = source
+        self.target = target
+        self.client = get_client()
+        super().__init__(None, None, max_batch_size, max_wait_ms, cache_size, pair=f"{source}-{target}")
+
+    def translate_batch(self, texts):
+        # Les métriques de generate sont enregistrées par le serveur
+        return self.client.translate(texts, self.source, self.target)
+
+    def stats(self):
+        return {"remote": self.client.socket_path, **super().stats()}
+
+class ModelServer:
+    """État partagé du serveur: un batcher par paire, un verrou pour la génération"""
+
+    def __init__(self):
+        self.batchers = {}
+        self.lock = threading.Lock()
+        self.generation_lock = threading.Lock()
+
+    def batcher(self, source, target):
+        from translation_routes import get_model
+
+        if (source, target) in self.batchers:
+            return self.batchers[(source, target)]
+        # Chargement hors du verrou: les autres paires restent servies pendant ce temps
+        tokenizer, model = get_model(source, target)
+        with self.lock:
+            if (source, target) not in self.batchers:
+                self.batchers[(source, target)] = TranslationBatcher(
+                    tokenizer,
+                    model,
+                    max_batch_size=TRANSLATION_BATCH_SIZE,
+                    max_wait_ms=TRANSLATION_BATCH_WAIT_MS,
+                    cache_size=TRANSLATION_CACHE_SIZE,
+                    pair=f"{source}-{target}"
+                )
+            return self.batchers[(source, target)]
+
+    def translate(self, source, target, texts):
+        batcher = self.batcher(source, target)
+        # Chaque texte rejoint la file commune: les textes des autres clients
+        # arrivés dans la même fenêtre partagent l'appel à generate
+        futures = [batcher.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def generate(self, prompts, batch_size):
+        # Chemin local explicite: la fonction publique renverrait vers ce même socket
+        from translate import generate_german_sentences_local, load_text_generator
+
+        text_generator = load_text_generator()
+        # Les demandes de génération sont déjà des batchs de prompts: on les sérialise
+        with self.generation_lock:
+            return generate_german_sentences_local(prompts, text_generator, batch_size)
+
+    def stats(self):
+        from model_registry import registry
+
+        return {
+            "pid": os.getpid(),
+            "backend": TRANSLATION_BACKEND,
+            "models": registry.stats(),
+            "batchers": {f"{s}-{t}": b.stats() for (s, t), b in self.batchers.items()}
+        }
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "translate":
+            return self.translate(request["source"], request["target"], request["texts"])
+        if op == "generate":
+            return self.generate(request["prompts"], request.get("batch_size", 32))
+        if op == "stats":
+            return self.stats()
+        raise ValueError(f"Opération inconnue: {op}")
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {"result": self.server.models.handle(json.loads(line))}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(socket_path=MODEL_SERVER_SOCKET, preload_pairs=(), generator=False):
+    """Lance le serveur jusqu'à SIGTERM/SIGINT"""
+    global _serving
+    _serving = True
+    from model_registry import registry
+    from translation_routes import model_key
+
+    names = [model_key(source, target) for source, target in preload_pairs]
+    if generator:
+        from translate import TEXT_GENERATOR
+        names.append(TEXT_GENERATOR)
+    registry.preload(names)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = _UnixServer(socket_path, _Handler)
+    # Socket créé avec l'umask du processus: accès limité au propriétaire et à son groupe
+    os.chmod(socket_path, 0o660)
+    server.models = ModelServer()
+
+    def stop(signum, frame):
+        print("Arrêt du serveur de modèles...")
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Présence et métriques (temps de generate, tailles de batch) remontées à l'API
+    presence = None
+    try:
+        import redis
+        from workers import WorkerHeartbeat
+        presence = WorkerHeartbeat(redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB), "model-server").start()
+    except Exception as e:
+        print(f"Avertissement: métriques du serveur de modèles non publiées ({e})")
+
+    print(f"Serveur de modèles à l'écoute sur {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        if presence is not None:
+            presence.stop()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de modèles local")
+    parser.add_argument("--socket", default=MODEL_SERVER_SOCKET)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Lance le serveur")
+    serve_parser.add_argument("--preload", default="de-fr,en-fr", help="Paires à charger au démarrage (ex. de-fr,en-fr)")
+    serve_parser.add_argument("--generator", action="store_true", help="Charger aussi GPT-2 au démarrage")
+    translate_parser = subparsers.add_parser("translate", help="Traduit un texte via le serveur")
+    translate_parser.add_argument("text")
+    translate_parser.add_argument("--source", default="de")
+    translate_parser.add_argument("--target", default="fr")
+    subparsers.add_parser("stats", help="Modèles chargés et batchs du serveur")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        pairs = [tuple(pair.split("-")) for pair in args.preload.split(",") if pair]
+        serve(args.socket, pairs, args.generator)
+        return
+
+    client = ModelClient(args.socket)
+    if args.command == "translate":
+        print(client.translate([args.text], args.source, args.target)[0])
+    else:
+        print(json.dumps(client.stats(), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    # Lancé en script: translate.py et translation_routes.py importent `model_server`,
+    # qui doit être ce module (et voir `_serving`), pas une seconde copie
+    sys.modules["model_server"] = sys.modules[__name__]
+    main()
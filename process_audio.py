@@ -3,11 +3,20 @@ import os
 import sys
 import redis
 from config import *
+from jobs import JobQueue
+
+def est_fichier_audio(audio_path):
+    return os.path.isfile(audio_path) and audio_path.lower().endswith(AUDIO_EXTENSIONS)
+
+def ajouter_fichiers_queue(redis_client, audio_paths):
+    """Ajoute des fichiers audio à la queue de transcription en un seul aller-retour"""
+    jobs = JobQueue(redis_client, TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE)
+    return jobs.enqueue(audio_paths)
 
 def ajouter_fichier_queue(redis_client, audio_path):
     """Ajoute un fichier audio à la queue de transcription"""
-    if os.path.isfile(audio_path) and audio_path.lower().endswith(AUDIO_EXTENSIONS):
-        redis_client.lpush(TRANSCRIPTION_QUEUE, audio_path)
+    if est_fichier_audio(audio_path):
+        ajouter_fichiers_queue(redis_client, [audio_path])
         return True
     return False
 
@@ -26,12 +35,14 @@ def main():
             print(f"Format non supporté: {path}")
     
     elif os.path.isdir(path):
-        count = 0
-        for filename in os.listdir(path):
-            filepath = os.path.join(path, filename)
-            if ajouter_fichier_queue(redis_client, filepath):
-                count += 1
-                print(f"Fichier ajouté à la queue: {filepath}")
+        fichiers = [
+            os.path.join(path, filename)
+            for filename in sorted(os.listdir(path))
+            if est_fichier_audio(os.path.join(path, filename))
+        ]
+        count = ajouter_fichiers_queue(redis_client, fichiers)
+        for filepath in fichiers:
+            print(f"Fichier ajouté à la queue: {filepath}")
         print(f"\nTotal: {count} fichiers ajoutés à la queue")
     
     else:
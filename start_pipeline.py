@@ -1,77 +1,224 @@
 #!/usr/bin/env python3
+"""Superviseur des workers du pipeline
+
+Lance les workers de transcription (transcribe_api.py) et de traduction
+(traduction_lignes.py), les redémarre avec backoff s'ils s'arrêtent, ajuste
+leur nombre selon la profondeur des queues Redis et, sur SIGTERM/SIGINT,
+laisse chaque worker terminer sa tâche en cours avant de sortir.
+
+Les coeurs sont répartis à l'avance: chaque processus reçoit un budget fixe
+(SUPERVISOR_CPU_SHARE de la machine divisé par le nombre maximum de processus
+de son type), transmis par --workers/--threads au worker de transcription et
+par OMP_NUM_THREADS/MKL_NUM_THREADS à torch. Monter jusqu'au maximum ne
+surcharge donc pas la machine.
+
+Usage: python start_pipeline.py [fichier_audio_ou_repertoire]
+"""
+import math
 import os
-import sys
-import subprocess
 import signal
+import subprocess
+import sys
 import time
 from config import *
 
-def start_process(script_name, args=None):
-    """Démarre un script Python comme un processus"""
-    cmd = [sys.executable, script_name]
-    if args:
-        cmd.extend(args)
-    return subprocess.Popen(cmd)
+class Worker:
+    """Un processus enfant et son historique de redémarrages"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.process = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.next_start = 0.0
+        self.retiring = False
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable] + self.pool.command, env=self.pool.env)
+        self.started_at = time.monotonic()
+        print(f"[{self.pool.name}] processus {self.process.pid} démarré")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """SIGTERM: le worker finit sa tâche en cours puis s'arrête"""
+        if self.alive():
+            self.process.terminate()
+
+class WorkerPool:
+    """Groupe de processus identiques consommant une même queue"""
+
+    def __init__(self, name, command, queue, limits, env=None):
+        self.name = name
+        self.command = command
+        self.queue = queue
+        self.env = env
+        self.min_workers, self.max_workers = limits
+        self.desired = self.min_workers
+        self.workers = []
+
+    def scale(self, queue_depth):
+        """Nombre de processus voulu selon la queue, borné par (minimum, maximum)"""
+        wanted = math.ceil(queue_depth / SUPERVISOR_JOBS_PER_PROCESS)
+        desired = max(self.min_workers, min(self.max_workers, wanted))
+        if desired != self.desired:
+            print(f"[{self.name}] {queue_depth} tâche(s) en attente: {self.desired} -> {desired} processus")
+        self.desired = desired
+
+    def supervise(self, draining):
+        now = time.monotonic()
+        for worker in list(self.workers):
+            if worker.process is None or worker.alive():
+                continue
+            code = worker.process.returncode
+            if worker.retiring or draining:
+                print(f"[{self.name}] processus {worker.process.pid} arrêté")
+                self.workers.remove(worker)
+                continue
+            # Plantage: backoff exponentiel, remis à zéro après une minute de fonctionnement
+            if now - worker.started_at > 60:
+                worker.failures = 0
+            worker.failures += 1
+            delay = min(SUPERVISOR_RESTART_BACKOFF * 2 ** (worker.failures - 1), SUPERVISOR_RESTART_BACKOFF_MAX)
+            print(f"[{self.name}] processus {worker.process.pid} terminé (code {code}), redémarrage dans {delay}s")
+            worker.process = None
+            worker.next_start = now + delay
+
+        if draining:
+            return
+
+        for worker in self.workers:
+            if worker.process is None and not worker.retiring and now >= worker.next_start:
+                worker.start()
+
+        active = [worker for worker in self.workers if not worker.retiring]
+        while len(active) < self.desired:
+            worker = Worker(self)
+            worker.start()
+            self.workers.append(worker)
+            active.append(worker)
+        # Réduction: les processus en trop finissent leur tâche avant de sortir
+        for worker in active[self.desired:]:
+            worker.retiring = True
+            if worker.alive():
+                worker.stop()
+            else:
+                self.workers.remove(worker)
+
+    def stop_all(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def running(self):
+        return [worker for worker in self.workers if worker.alive()]
+
+def cores_per_process(name, max_processes):
+    """Coeurs réservés à chaque processus d'un type, au nombre maximum de processus"""
+    cores = SUPERVISOR_CPU_CORES or os.cpu_count() or 1
+    return max(1, int(cores * SUPERVISOR_CPU_SHARE[name]) // max_processes)
+
+def thread_env(threads):
+    """Environnement d'un enfant dont les bibliothèques de calcul sont limitées à `threads` coeurs"""
+    env = dict(os.environ)
+    env["OMP_NUM_THREADS"] = str(threads)
+    env["MKL_NUM_THREADS"] = str(threads)
+    return env
+
+def create_pools():
+    """Pools de workers avec leur budget de coeurs par processus"""
+    budget = cores_per_process("transcription", SUPERVISOR_TRANSCRIPTION_PROCESSES[1])
+    threads = min(TRANSCRIPTION_THREADS_PER_WORKER, budget)
+    workers = max(1, budget // threads)
+    print(f"[transcription] {workers} transcription(s) x {threads} coeurs par processus")
+    transcription = WorkerPool(
+        "transcription",
+        ["transcribe_api.py", "--workers", str(workers), "--threads", str(threads)],
+        TRANSCRIPTION_QUEUE,
+        SUPERVISOR_TRANSCRIPTION_PROCESSES,
+        env=thread_env(threads)
+    )
+
+    budget = cores_per_process("traduction", SUPERVISOR_TRANSLATION_PROCESSES[1])
+    print(f"[traduction] {budget} coeur(s) par processus")
+    translation = WorkerPool(
+        "traduction", ["traduction_lignes.py"], TRANSLATION_QUEUE, SUPERVISOR_TRANSLATION_PROCESSES,
+        env=thread_env(budget)
+    )
+    return [transcription, translation]
+
+def queue_depths(redis_client, pools):
+    pipe = redis_client.pipeline()
+    for pool in pools:
+        pipe.llen(pool.queue)
+    return pipe.execute()
+
+def enqueue_path(input_path):
+    """Ajoute les fichiers audio à la queue de transcription (process_audio.py)"""
+    print("Ajout des fichiers à la queue...")
+    subprocess.run([sys.executable, "process_audio.py", input_path], check=False)
 
 def main():
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <audio_file_or_directory>")
-        sys.exit(1)
+    import redis
 
-    input_path = sys.argv[1]
-    if not os.path.exists(input_path):
+    input_path = sys.argv[1] if len(sys.argv) > 1 else None
+    if input_path and not os.path.exists(input_path):
         print(f"Le chemin {input_path} n'existe pas.")
         sys.exit(1)
 
     # Créer les répertoires nécessaires
     os.makedirs("output", exist_ok=True)
 
-    # Démarrer les workers
-    processes = []
-    
-    # Démarrer le worker de transcription
-    print("Démarrage du worker de transcription...")
-    transcription_worker = start_process("transcribe_api.py")
-    processes.append(transcription_worker)
-
-    # Démarrer le worker de traduction
-    print("Démarrage du worker de traduction...")
-    translation_worker = start_process("traduction_lignes.py")
-    processes.append(translation_worker)
+    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+    pools = create_pools()
 
-    # Attendre que les workers soient prêts
-    time.sleep(2)
-
-    # Ajouter les fichiers à la queue
-    print("Ajout des fichiers à la queue...")
-    process_audio = start_process("process_audio.py", [input_path])
-    processes.append(process_audio)
+    draining = False
 
     def signal_handler(signum, frame):
-        print("\nArrêt des processus...")
-        for p in processes:
-            p.terminate()
-        sys.exit(0)
+        nonlocal draining
+        if draining:
+            return
+        print("\nArrêt demandé: les workers terminent leur tâche en cours...")
+        draining = True
+        for pool in pools:
+            pool.stop_all()
 
-    # Capturer Ctrl+C pour arrêter proprement
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    for pool in pools:
+        pool.supervise(draining)
+    if input_path:
+        enqueue_path(input_path)
+    print("Pipeline démarré (Ctrl+C pour arrêter)")
+
+    last_scale = 0.0
+    drain_deadline = None
+    while True:
+        if not draining and time.monotonic() - last_scale >= SUPERVISOR_SCALE_INTERVAL:
+            try:
+                for pool, depth in zip(pools, queue_depths(redis_client, pools)):
+                    pool.scale(depth)
+            except Exception as e:
+                print(f"Erreur de lecture des queues: {e}")
+            last_scale = time.monotonic()
+
+        for pool in pools:
+            pool.supervise(draining)
+
+        if draining:
+            drain_deadline = drain_deadline or time.monotonic() + SUPERVISOR_DRAIN_TIMEOUT
+            remaining = [worker for pool in pools for worker in pool.running()]
+            if not remaining:
+                break
+            if time.monotonic() > drain_deadline:
+                print(f"{len(remaining)} worker(s) toujours actifs après {SUPERVISOR_DRAIN_TIMEOUT}s, arrêt forcé")
+                for worker in remaining:
+                    worker.process.kill()
+                break
+        time.sleep(1)
 
-    try:
-        # Attendre que le processus d'ajout de fichiers se termine
-        process_audio.wait()
-        
-        print("\nTous les fichiers ont été ajoutés à la queue.")
-        print("Les workers continuent de traiter les fichiers...")
-        print("Appuyez sur Ctrl+C pour arrêter le pipeline")
-        
-        # Maintenir les workers en vie
-        while True:
-            time.sleep(1)
-            
-    except KeyboardInterrupt:
-        print("\nArrêt des processus...")
-        for p in processes:
-            p.terminate()
+    print("Pipeline arrêté")
 
 if __name__ == "__main__":
     main()
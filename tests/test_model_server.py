@@ -0,0 +1,102 @@
+"""Serveur de modèles lancé comme `python model_server.py serve` (model-server.service)"""
+import os
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Lance model_server.py en __main__, avec une génération factice à la place de GPT-2
+BOOTSTRAP = textwrap.dedent("""
+    import runpy, sys, types
+    try:
+        import tqdm
+    except ImportError:
+        sys.modules["tqdm"] = types.SimpleNamespace(tqdm=lambda iterable, **kwargs: iterable)
+    import translate
+    translate.load_text_generator = lambda: None
+    translate.generate_german_sentences_local = (
+        lambda prompts, text_generator, batch_size=32: [f"{prompt} (ok)" for prompt in prompts]
+    )
+    sys.argv = ["model_server.py", "--socket", sys.argv[1], "serve", "--preload", ""]
+    runpy.run_path("model_server.py", run_name="__main__")
+""")
+
+def wait_for_socket(path, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            return
+        time.sleep(0.05)
+    raise TimeoutError(f"socket {path} absent")
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "models.sock")
+    # Backend différent de celui des clients par défaut (torch)
+    env = dict(os.environ, MODEL_SERVER_SOCKET=path, MODEL_SERVER_MODE="auto", TRANSLATION_BACKEND="int8")
+    process = subprocess.Popen([sys.executable, "-c", BOOTSTRAP, path], cwd=ROOT, env=env)
+    try:
+        wait_for_socket(path)
+        yield path
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+def test_generate_round_trip(server):
+    from model_server import ModelClient
+
+    client = ModelClient(server, timeout=10)
+    assert client.generate(["Das Haus", "Ein Buch"], batch_size=2) == ["Das Haus (ok)", "Ein Buch (ok)"]
+
+def test_client_reads_server_backend(server):
+    from model_server import ModelClient
+
+    # Clé de la mémoire de traduction quand le serveur traduit (translation_routes.memo_key)
+    assert ModelClient(server, timeout=10).backend() == "int8"
+
+def test_stale_socket_falls_back_to_local_models(tmp_path, monkeypatch):
+    import model_server
+
+    path = str(tmp_path / "stale.sock")
+    # Socket lié mais sans serveur à l'écoute, comme après un plantage
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    monkeypatch.setattr(model_server, "MODEL_SERVER_SOCKET", path)
+    monkeypatch.setattr(model_server, "MODEL_SERVER_MODE", "auto")
+    monkeypatch.setattr(model_server, "_probe", (False, 0.0))
+    assert os.path.exists(path)
+    assert model_server.use_model_server() is False
+
+def test_socket_restricted_to_group(server):
+    assert os.stat(server).st_mode & 0o777 == 0o660
+
+def test_remote_batcher_groups_texts(monkeypatch):
+    import threading
+    import model_server
+
+    calls = []
+    ready = threading.Event()
+
+    class FakeClient:
+        socket_path = "fake.sock"
+
+        def translate(self, texts, source, target):
+            # Premier lot retenu le temps que les autres textes s'accumulent
+            ready.wait(5)
+            calls.append(list(texts))
+            return [text.upper() for text in texts]
+
+    monkeypatch.setattr(model_server, "get_client", FakeClient)
+    batcher = model_server.RemoteBatcher("de", "fr", max_batch_size=8, max_wait_ms=5)
+    futures = [batcher.submit(f"satz {i}") for i in range(10)]
+    ready.set()
+    assert [future.result(timeout=5) for future in futures] == [f"SATZ {i}" for i in range(10)]
+    assert len(calls) < 10
+    assert all(len(texts) <= 8 for texts in calls)
@@ -1,77 +1,100 @@
 #!/usr/bin/env python3
-import os
-import sys
-import subprocess
-import signal
-import time
-from config import *
+"""Worker de traduction des transcriptions
 
-def start_process(script_name, args=None):
-    """Démarre un script Python comme un processus"""
-    cmd = [sys.executable, script_name]
-    if args:
-        cmd.extend(args)
-    return subprocess.Popen(cmd)
+Consomme TRANSLATION_QUEUE (identifiants de vidéos poussés par le worker de
+transcription), traduit chaque segment en français et réenregistre la
+transcription avec ses champs `translation_fr`. Les tâches sont sous bail
+comme pour la transcription (voir jobs.py).
+"""
+import signal
+import sys
+import threading
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB,
+    TRANSLATION_QUEUE, TRANSLATION_PROCESSING_QUEUE,
+    TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_WAIT_MS, TRANSLATION_CACHE_SIZE
+)
 
-def main():
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <audio_file_or_directory>")
-        sys.exit(1)
+def creer_batcher():
+    """Batcher allemand -> français, local ou via le serveur de modèles"""
+    from model_server import RemoteBatcher, use_model_server
+    from translation_routes import get_model
+    from translation_service import TranslationBatcher
 
-    input_path = sys.argv[1]
-    if not os.path.exists(input_path):
-        print(f"Le chemin {input_path} n'existe pas.")
-        sys.exit(1)
+    if use_model_server():
+        return RemoteBatcher('de', 'fr', TRANSLATION_BATCH_SIZE, TRANSLATION_CACHE_SIZE)
+    tokenizer, model = get_model('de', 'fr')
+    return TranslationBatcher(
+        tokenizer,
+        model,
+        max_batch_size=TRANSLATION_BATCH_SIZE,
+        max_wait_ms=TRANSLATION_BATCH_WAIT_MS,
+        cache_size=TRANSLATION_CACHE_SIZE
+    )
 
-    # Créer les répertoires nécessaires
-    os.makedirs("output", exist_ok=True)
+def traduire_video(db, batcher, video_id, evenements=None):
+    from translation_service import iter_translate_transcript
 
-    # Démarrer les workers
-    processes = []
-    
-    # Démarrer le worker de transcription
-    print("Démarrage du worker de transcription...")
-    transcription_worker = start_process("transcribe_api.py")
-    processes.append(transcription_worker)
+    transcription = db.get_transcript(video_id)
+    if transcription is None:
+        return False
+    for traduits, total in iter_translate_transcript(transcription, batcher):
+        if evenements is not None:
+            evenements.publish(video_id, "translating", progress=100.0 * traduits / total if total else 100.0)
+    db.update_video_json(video_id, transcription)
+    if evenements is not None:
+        evenements.publish(video_id, "completed")
+    return True
 
-    # Démarrer le worker de traduction
-    print("Démarrage du worker de traduction...")
-    translation_worker = start_process("traduction_lignes.py")
-    processes.append(translation_worker)
+def main():
+    import redis
+    from database import Database
+    from events import EventPublisher
+    from jobs import JobQueue
+    from workers import WorkerHeartbeat
 
-    # Attendre que les workers soient prêts
-    time.sleep(2)
+    db = Database()
+    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    jobs = JobQueue(redis_client, TRANSLATION_QUEUE, TRANSLATION_PROCESSING_QUEUE)
+    batcher = creer_batcher()
+    evenements = EventPublisher(redis_client)
 
-    # Ajouter les fichiers à la queue
-    print("Ajout des fichiers à la queue...")
-    process_audio = start_process("process_audio.py", [input_path])
-    processes.append(process_audio)
+    arret = threading.Event()
 
     def signal_handler(signum, frame):
-        print("\nArrêt des processus...")
-        for p in processes:
-            p.terminate()
-        sys.exit(0)
+        print("\nArrêt demandé, fin de la traduction en cours...")
+        arret.set()
 
-    # Capturer Ctrl+C pour arrêter proprement
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    jobs.start_maintenance(arret)
+    presence = WorkerHeartbeat(redis_client, "translation").start()
+    print(f"Worker de traduction à l'écoute sur '{TRANSLATION_QUEUE}'")
+
+    while not arret.is_set():
+        video_id = jobs.claim(timeout=5)
+        if video_id is None:
+            continue
+        try:
+            if traduire_video(db, batcher, int(video_id), evenements):
+                print(f"Vidéo {video_id} traduite")
+            else:
+                print(f"Avertissement: pas de transcription pour la vidéo {video_id}", file=sys.stderr)
+        except Exception as e:
+            issue = jobs.fail(video_id, e)
+            print(f"ERREUR lors de la traduction de la vidéo {video_id} ({issue}): {e}", file=sys.stderr)
+            if issue != "lost":
+                # La transcription reste disponible: le statut de la vidéo ne change pas
+                evenements.publish(
+                    int(video_id), "error", status="completed", stage="translation",
+                    retry=int(issue == "retry"), message=str(e)
+                )
+        else:
+            jobs.complete(video_id)
 
-    try:
-        # Attendre que le processus d'ajout de fichiers se termine
-        process_audio.wait()
-        
-        print("\nTous les fichiers ont été ajoutés à la queue.")
-        print("Les workers continuent de traiter les fichiers...")
-        print("Appuyez sur Ctrl+C pour arrêter le pipeline")
-        
-        # Maintenir les workers en vie
-        while True:
-            time.sleep(1)
-            
-    except KeyboardInterrupt:
-        print("\nArrêt des processus...")
-        for p in processes:
-            p.terminate()
+    presence.stop()
+    db.close()
 
 if __name__ == "__main__":
     main()
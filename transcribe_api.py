@@ -3,10 +3,28 @@ import os
 import sys
 import subprocess
 import argparse
+import time
+import signal
+import threading
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB,
+    TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE,
+    TRANSLATION_QUEUE, TRANSLATION_PROCESSING_QUEUE,
+    TRANSCRIPTION_WORKERS, TRANSCRIPTION_THREADS_PER_WORKER
+)
+from metrics import counter, histogram
 
 MODELE = "base"
 LANGUE = "de"
 FORMAT_SORTIE = "json"
+MODELE_ALIGNEMENT = "WAV2VEC2_ASR_LARGE_LV60K_960H"
+TYPE_CALCUL = "float32"
+TAILLE_BATCH = 16
+
+TRANSCRIPTION_SECONDS = histogram(
+    "whisperx_seconds", "Durée des étapes WhisperX par fichier (load, transcribe, align)", ["stage"]
+)
+AUDIO_SECONDS = counter("whisperx_audio_seconds_total", "Secondes d'audio transcrites")
 
 EXTENSIONS_AUDIO = (
     ".opus", ".mp3", ".wav", ".m4a", ".ogg",
@@ -50,8 +68,8 @@ def transcrire_fichier(chemin_audio, repertoire_sortie):
         "--output_dir", repertoire_sortie,
         "--segment_resolution", "chunk",
         "--max_line_count", "1",
-        "--align_model", "WAV2VEC2_ASR_LARGE_LV60K_960H",
-        "--compute_type", "float32",
+        "--align_model", MODELE_ALIGNEMENT,
+        "--compute_type", TYPE_CALCUL,
         "--max_line_width", "-50"
     ]
 
@@ -79,18 +97,315 @@ def transcrire_fichier(chemin_audio, repertoire_sortie):
         print(f"Erreur inattendue lors de l'exécution de Whisper pour '{chemin_audio}': {e}", file=sys.stderr)
         return False
 
+class TranscripteurPersistant:
+    """Garde les modèles WhisperX (ASR + alignement) en mémoire entre les fichiers
+
+    Évite de relancer `python -m whisperx` (import de torch et chargement des
+    deux modèles) pour chaque fichier audio.
+
+    `workers` est le nombre de transcriptions pouvant s'exécuter en même
+    temps depuis des threads différents: le modèle CTranslate2 est chargé
+    avec autant de réplicas (`num_workers`), chacun sur `threads` coeurs.
+    Avec un seul réplica, les appels concurrents seraient sérialisés.
+    """
+
+    def __init__(self, modele=MODELE, langue=LANGUE, device="cpu", threads=TRANSCRIPTION_THREADS_PER_WORKER, workers=1):
+        import torch
+        import whisperx
+        from faster_whisper import WhisperModel
+
+        self.whisperx = whisperx
+        self.langue = langue
+        self.device = device
+        self.workers = workers
+
+        # Alignement (torch): chaque thread appelant garde le même budget de coeurs
+        torch.set_num_threads(threads)
+        debut = time.perf_counter()
+        # whisperx.load_model ne transmet pas num_workers: on construit le modèle nous-mêmes
+        modele_ctranslate2 = WhisperModel(
+            modele,
+            device=device,
+            compute_type=TYPE_CALCUL,
+            cpu_threads=threads,
+            num_workers=workers
+        )
+        self.modele_asr = whisperx.load_model(
+            modele, device, compute_type=TYPE_CALCUL, language=langue, model=modele_ctranslate2
+        )
+        self.modele_alignement, self.metadonnees_alignement = whisperx.load_align_model(
+            language_code=langue,
+            device=device,
+            model_name=MODELE_ALIGNEMENT
+        )
+        self.temps_chargement_modeles = time.perf_counter() - debut
+        print(f"Modèles WhisperX chargés en {self.temps_chargement_modeles:.2f}s ({workers} réplica(s) x {threads} coeurs)")
+
+    def charger_audio(self, chemin_audio):
+        """Décode le fichier audio en PCM 16 kHz mono
+
+        Si un artefact PCM a été produit à l'ingestion, il est mappé en
+        mémoire au lieu de relancer FFmpeg.
+        """
+        from audio_pcm import find_pcm, load_pcm
+
+        chemin_pcm = find_pcm(chemin_audio)
+        if chemin_pcm:
+            return load_pcm(chemin_pcm)
+        return self.whisperx.load_audio(chemin_audio)
+
+    def transcrire(self, chemin_audio, progression=None):
+        """Transcrit et aligne un fichier audio
+
+        Retourne le résultat au format de `python -m whisperx` (segments,
+        word_segments, language) et les temps mesurés pour ce fichier.
+        `progression(pourcentage)` est appelée à la fin de chaque étape
+        (WhisperX ne rend pas compte de son avancement à l'intérieur d'une étape).
+        """
+        progression = progression or (lambda pourcentage: None)
+        debut = time.perf_counter()
+        audio = self.charger_audio(chemin_audio)
+        temps_chargement = time.perf_counter() - debut
+        progression(10)
+
+        debut = time.perf_counter()
+        resultat = self.modele_asr.transcribe(audio, batch_size=TAILLE_BATCH, language=self.langue)
+        temps_transcription = time.perf_counter() - debut
+        progression(70)
+
+        debut = time.perf_counter()
+        resultat = self.whisperx.align(
+            resultat["segments"],
+            self.modele_alignement,
+            self.metadonnees_alignement,
+            audio,
+            self.device,
+            return_char_alignments=False
+        )
+        temps_alignement = time.perf_counter() - debut
+        resultat["language"] = self.langue
+        progression(100)
+
+        temps = {
+            "chargement": temps_chargement,
+            "transcription": temps_transcription,
+            "alignement": temps_alignement,
+        }
+        TRANSCRIPTION_SECONDS.labels("load").observe(temps_chargement)
+        TRANSCRIPTION_SECONDS.labels("transcribe").observe(temps_transcription)
+        TRANSCRIPTION_SECONDS.labels("align").observe(temps_alignement)
+        AUDIO_SECONDS.inc(len(audio) / 16000)  # WhisperX travaille en 16 kHz mono
+        return resultat, temps
+
+    def ecrire_resultat(self, resultat, chemin_audio, repertoire_sortie):
+        """Écrit le JSON avec le writer de WhisperX, comme la ligne de commande"""
+        from whisperx.utils import get_writer
+
+        writer = get_writer(FORMAT_SORTIE, repertoire_sortie)
+        writer(resultat, chemin_audio, {
+            "highlight_words": False,
+            "max_line_count": 1,
+            "max_line_width": -50
+        })
+
+def transcrire_fichier_persistant(transcripteur, chemin_audio, repertoire_sortie):
+    print(f"Traitement: {chemin_audio}")
+
+    nom_base = os.path.splitext(os.path.basename(chemin_audio))[0]
+    nom_fichier_sortie = f"{nom_base}.{FORMAT_SORTIE}"
+    chemin_fichier_sortie = os.path.join(repertoire_sortie, nom_fichier_sortie)
+
+    if os.path.exists(chemin_fichier_sortie) and os.path.getsize(chemin_fichier_sortie) > 0:
+        print(f"Le fichier '{nom_fichier_sortie}' existe déjà et n'est pas vide. Passage au suivant.")
+        return True
+
+    try:
+        resultat, temps = transcripteur.transcrire(chemin_audio)
+        transcripteur.ecrire_resultat(resultat, chemin_audio, repertoire_sortie)
+    except Exception as e:
+        print(f"ERREUR lors de la transcription de '{os.path.basename(chemin_audio)}': {e}", file=sys.stderr)
+        if os.path.exists(chemin_fichier_sortie):
+            try:
+                os.remove(chemin_fichier_sortie)
+                print(f"Fichier de sortie incomplet '{nom_fichier_sortie}' supprimé.")
+            except OSError as e:
+                print(f"Avertissement: Impossible de supprimer le fichier de sortie incomplet '{nom_fichier_sortie}': {e}", file=sys.stderr)
+        return False
+
+    print(f"Transcription de '{os.path.basename(chemin_audio)}' terminée.")
+    print(
+        f"Temps: chargement audio {temps['chargement']:.2f}s, "
+        f"transcription {temps['transcription']:.2f}s, "
+        f"alignement {temps['alignement']:.2f}s"
+    )
+    return True
+
+def nombre_workers_par_defaut():
+    """Nombre de transcriptions simultanées selon les coeurs disponibles"""
+    if TRANSCRIPTION_WORKERS > 0:
+        return TRANSCRIPTION_WORKERS
+    coeurs = os.cpu_count() or 1
+    return max(1, coeurs // TRANSCRIPTION_THREADS_PER_WORKER)
+
+class TranscriptionImpossible(Exception):
+    """Erreur définitive: la tâche part directement dans les lettres mortes"""
+
+def traiter_fichier_queue(transcripteur, db, statuts, chemin_audio, traductions=None, evenements=None):
+    """Transcrit un fichier de la queue et enregistre le résultat en base
+
+    Les erreurs de transcription sont propagées: la queue décide d'un nouvel
+    essai ou des lettres mortes.
+    """
+    video = db.get_video_by_audio_path(chemin_audio)
+    if not video:
+        raise TranscriptionImpossible(f"aucune vidéo en base pour '{chemin_audio}'")
+
+    statuts.set(video["id"], "processing")
+    progression = None
+    if evenements is not None:
+        evenements.publish(video["id"], "transcribing", progress=0)
+        progression = lambda pourcentage: evenements.publish(video["id"], "transcribing", progress=pourcentage)
+    resultat, temps = transcripteur.transcrire(chemin_audio, progression)
+    # Écrit directement `completed` avec la transcription
+    db.update_video_json(video["id"], resultat)
+    if traductions is not None:
+        # Traduction des segments par traduction_lignes.py
+        traductions.enqueue([str(video["id"])])
+    elif evenements is not None:
+        evenements.publish(video["id"], "completed")
+
+    print(
+        f"Vidéo {video['id']} transcrite: chargement audio {temps['chargement']:.2f}s, "
+        f"transcription {temps['transcription']:.2f}s, "
+        f"alignement {temps['alignement']:.2f}s"
+    )
+
+def statut_apres_echec(db, statuts, chemin_audio, issue, evenements=None, erreur=None):
+    """Statut de la vidéo selon l'issue de l'échec (nouvel essai ou abandon)"""
+    if issue == "lost":
+        return
+    video = db.get_video_by_audio_path(chemin_audio)
+    if video:
+        statut = "pending" if issue == "retry" else "error"
+        statuts.set(video["id"], statut)
+        if evenements is not None:
+            evenements.publish(
+                video["id"], "error", status=statut, stage="transcription",
+                retry=int(issue == "retry"), message=str(erreur) if erreur else None
+            )
+
+def boucle_worker(numero, transcripteur, db, statuts, jobs, traductions, arret, evenements=None):
+    """Consomme la queue de transcription jusqu'à la demande d'arrêt"""
+    while not arret.is_set():
+        # Le fichier reste dans la liste "processing", sous bail, tant qu'il n'est pas terminé
+        chemin_audio = jobs.claim(timeout=5)
+        if chemin_audio is None:
+            continue
+
+        print(f"[worker {numero}] Traitement: {chemin_audio}")
+        try:
+            traiter_fichier_queue(transcripteur, db, statuts, chemin_audio, traductions, evenements)
+        except TranscriptionImpossible as e:
+            print(f"[worker {numero}] Abandon: {e}", file=sys.stderr)
+            jobs.bury(chemin_audio, e)
+        except Exception as e:
+            issue = jobs.fail(chemin_audio, e)
+            print(f"ERREUR lors de la transcription de '{os.path.basename(chemin_audio)}' ({issue}): {e}", file=sys.stderr)
+            try:
+                statut_apres_echec(db, statuts, chemin_audio, issue, evenements, e)
+            except Exception as e:
+                print(f"[worker {numero}] Statut non mis à jour pour '{chemin_audio}': {e}", file=sys.stderr)
+        else:
+            jobs.complete(chemin_audio)
+
+def consommer_queue(nombre_workers, threads_par_worker=TRANSCRIPTION_THREADS_PER_WORKER):
+    """Lance le worker de transcription branché sur la queue Redis
+
+    Le processus occupe au plus `nombre_workers * threads_par_worker` coeurs.
+    """
+    import redis
+    from database import Database
+    from events import EventPublisher
+    from jobs import JobQueue, StatusMirror
+    from workers import WorkerHeartbeat
+
+    # Une seule instance: le pool de connexions est partagé entre les threads
+    db = Database()
+    db.setup_database()
+    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    jobs = JobQueue(redis_client, TRANSCRIPTION_QUEUE, TRANSCRIPTION_PROCESSING_QUEUE)
+    traductions = JobQueue(redis_client, TRANSLATION_QUEUE, TRANSLATION_PROCESSING_QUEUE)
+    statuts = StatusMirror(db)
+    evenements = EventPublisher(redis_client)
+
+    # Un réplica du modèle par thread worker, sinon les transcriptions s'attendent
+    transcripteur = TranscripteurPersistant(threads=threads_par_worker, workers=nombre_workers)
+
+    arret = threading.Event()
+
+    def signal_handler(signum, frame):
+        print("\nArrêt demandé, fin des transcriptions en cours...")
+        arret.set()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    # Heartbeat des baux, reprise des tâches de workers morts, nouveaux essais
+    jobs.start_maintenance(
+        arret,
+        on_outcome=lambda chemin, issue: statut_apres_echec(db, statuts, chemin, issue, evenements)
+    )
+
+    presence = WorkerHeartbeat(redis_client, "transcription").start()
+    print(f"Worker de transcription: {nombre_workers} transcription(s) simultanée(s) sur '{TRANSCRIPTION_QUEUE}'")
+    workers = [
+        threading.Thread(target=boucle_worker, args=(i, transcripteur, db, statuts, jobs, traductions, arret, evenements), daemon=True)
+        for i in range(nombre_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(timeout=1)
+    presence.stop()
+    statuts.close()
+    db.close()
+
 def main():
     parser = argparse.ArgumentParser(
         description=f"Transcrit les fichiers audio dans un répertoire en utilisant Whisper (Modèle: {MODELE}).",
-        usage="%(prog)s <repertoire_contenant_fichiers_audio>"
+        usage="%(prog)s [repertoire_contenant_fichiers_audio] [--persistant] [--workers N] [--threads N]"
     )
     parser.add_argument(
         "repertoire_cible",
         metavar="repertoire_contenant_fichiers_audio",
-        help="Chemin vers le répertoire contenant les fichiers audio à transcrire."
+        nargs="?",
+        help="Chemin vers le répertoire contenant les fichiers audio à transcrire. "
+             "Sans répertoire, le script consomme la queue Redis de transcription."
+    )
+    parser.add_argument(
+        "--persistant",
+        action="store_true",
+        help="Charger les modèles une seule fois et transcrire tous les fichiers dans ce processus."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=nombre_workers_par_defaut(),
+        help="Nombre de transcriptions simultanées en mode queue (défaut: selon les coeurs)."
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=TRANSCRIPTION_THREADS_PER_WORKER,
+        help=f"Coeurs utilisés par chaque transcription (défaut: {TRANSCRIPTION_THREADS_PER_WORKER})."
     )
 
     args = parser.parse_args()
+    if args.repertoire_cible is None:
+        consommer_queue(max(1, args.workers), max(1, args.threads))
+        sys.exit(0)
+
     repertoire_cible = args.repertoire_cible
     repertoire_sortie = repertoire_cible
 
@@ -118,8 +433,17 @@ def main():
     nombre_succes = 0
     nombre_erreurs = 0
 
+    transcripteur = None
+    if args.persistant:
+        transcripteur = TranscripteurPersistant(threads=max(1, args.threads))
+        print("-" * 40)
+
     for fichier_audio in fichiers_audio:
-        if transcrire_fichier(fichier_audio, repertoire_sortie):
+        if transcripteur:
+            succes = transcrire_fichier_persistant(transcripteur, fichier_audio, repertoire_sortie)
+        else:
+            succes = transcrire_fichier(fichier_audio, repertoire_sortie)
+        if succes:
             nombre_succes += 1
         else:
             nombre_erreurs += 1
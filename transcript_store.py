@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Stockage compact des transcriptions WhisperX
+
+Les segments sont découpés en blocs de `CHUNK_SEGMENTS` segments consécutifs.
+Chaque bloc est encodé en colonnes (tableaux de flottants pour start/end, table
+de chaînes pour les textes, timings des mots optionnels) puis compressé avec
+zlib. Les bornes temporelles de chaque bloc sont stockées à côté du blob, ce
+qui permet de ne décoder que les blocs d'une plage horaire.
+"""
+import math
+import struct
+import zlib
+from array import array
+
+CHUNK_SEGMENTS = 64
+
+MAGIC = b"HST1"
+HEADER = struct.Struct("<4sBII")
+FLAG_WORDS = 1
+FLAG_TRANSLATIONS = 2
+
+def _encode_strings(strings):
+    """Table de chaînes: décalages uint32 puis octets UTF-8 concaténés"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array("I", [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    blob = b"".join(encoded)
+    return struct.pack("<I", len(blob)) + offsets.tobytes() + blob
+
+def _decode_strings(buffer, position, count):
+    (size,) = struct.unpack_from("<I", buffer, position)
+    position += 4
+    offsets = array("I")
+    offsets.frombytes(buffer[position:position + 4 * (count + 1)])
+    position += 4 * (count + 1)
+    blob = buffer[position:position + size]
+    strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+    return strings, position + size
+
+def _floats(values):
+    """Tableau float64; les valeurs absentes sont stockées en NaN"""
+    return array("d", [math.nan if v is None else v for v in values]).tobytes()
+
+def _read_floats(buffer, position, count):
+    values = array("d")
+    values.frombytes(buffer[position:position + 8 * count])
+    return values, position + 8 * count
+
+def _optional(value):
+    return None if math.isnan(value) else value
+
+def encode_chunk(segments):
+    """Encode une liste de segments WhisperX en un blob compressé"""
+    has_words = any(segment.get("words") for segment in segments)
+    has_translations = any("translation_fr" in segment for segment in segments)
+    flags = (FLAG_WORDS if has_words else 0) | (FLAG_TRANSLATIONS if has_translations else 0)
+
+    words = [word for segment in segments for word in segment.get("words", [])] if has_words else []
+
+    parts = [
+        HEADER.pack(MAGIC, flags, len(segments), len(words)),
+        _floats(segment.get("start") for segment in segments),
+        _floats(segment.get("end") for segment in segments),
+        _encode_strings(segment.get("text", "") for segment in segments),
+    ]
+    if has_translations:
+        parts.append(_encode_strings(segment.get("translation_fr", "") for segment in segments))
+    if has_words:
+        word_offsets = array("I", [0])
+        for segment in segments:
+            word_offsets.append(word_offsets[-1] + len(segment.get("words", [])))
+        parts.append(word_offsets.tobytes())
+        parts.append(_floats(word.get("start") for word in words))
+        parts.append(_floats(word.get("end") for word in words))
+        parts.append(_floats(word.get("score") for word in words))
+        parts.append(_encode_strings(word.get("word", "") for word in words))
+
+    return zlib.compress(b"".join(parts), 6)
+
+def decode_chunk(blob, include_words=True):
+    """Décode un blob en liste de segments au format WhisperX"""
+    buffer = zlib.decompress(blob)
+    magic, flags, count, word_count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Bloc de transcription invalide")
+    position = HEADER.size
+
+    starts, position = _read_floats(buffer, position, count)
+    ends, position = _read_floats(buffer, position, count)
+    texts, position = _decode_strings(buffer, position, count)
+
+    segments = [
+        {"start": _optional(starts[i]), "end": _optional(ends[i]), "text": texts[i]}
+        for i in range(count)
+    ]
+
+    if flags & FLAG_TRANSLATIONS:
+        translations, position = _decode_strings(buffer, position, count)
+        for segment, translation in zip(segments, translations):
+            segment["translation_fr"] = translation
+
+    if flags & FLAG_WORDS and include_words:
+        word_offsets = array("I")
+        word_offsets.frombytes(buffer[position:position + 4 * (count + 1)])
+        position += 4 * (count + 1)
+        word_starts, position = _read_floats(buffer, position, word_count)
+        word_ends, position = _read_floats(buffer, position, word_count)
+        word_scores, position = _read_floats(buffer, position, word_count)
+        word_texts, position = _decode_strings(buffer, position, word_count)
+
+        for i, segment in enumerate(segments):
+            segment_words = []
+            for j in range(word_offsets[i], word_offsets[i + 1]):
+                word = {"word": word_texts[j]}
+                # WhisperX omet les timings des mots non alignés (nombres, symboles)
+                for key, values in (("start", word_starts), ("end", word_ends), ("score", word_scores)):
+                    value = _optional(values[j])
+                    if value is not None:
+                        word[key] = value
+                segment_words.append(word)
+            segment["words"] = segment_words
+
+    return segments
+
+def encode_transcript(transcript, chunk_size=CHUNK_SEGMENTS):
+    """Découpe une transcription en blocs
+
+    Retourne une liste de tuples (numéro, début, fin, nombre de segments, blob).
+    """
+    segments = transcript.get("segments", [])
+    chunks = []
+    for chunk_no, first in enumerate(range(0, len(segments), chunk_size)):
+        chunk = segments[first:first + chunk_size]
+        starts = [s["start"] for s in chunk if s.get("start") is not None]
+        ends = [s["end"] for s in chunk if s.get("end") is not None]
+        chunks.append((
+            chunk_no,
+            min(starts) if starts else 0.0,
+            max(ends) if ends else 0.0,
+            len(chunk),
+            encode_chunk(chunk)
+        ))
+    return chunks
+
+def filter_segments(segments, start=None, end=None):
+    """Garde les segments qui chevauchent la plage [start, end]"""
+    return [
+        segment for segment in segments
+        if (start is None or (segment.get("end") or 0.0) >= start)
+        and (end is None or (segment.get("start") or 0.0) <= end)
+    ]
+
+def word_segments(segments):
+    """Reconstruit la liste `word_segments` produite par WhisperX"""
+    return [word for segment in segments for word in segment.get("words", [])]
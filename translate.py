@@ -1,140 +1,191 @@
 #!/usr/bin/env python3
-import json
-from transformers import MarianMTModel, MarianTokenizer, GPT2LMHeadModel, AutoTokenizer
+import argparse
+import sqlite3
+import time
 from tqdm import tqdm
+from model_registry import pretrained_kwargs, registry
+from model_server import get_client, use_model_server
+from translation_memo import get_memo
+from translation_routes import preload, translate as translate_route
 
-def load_translation_models():
-    """Chargement des modèles de traduction"""
-    print("Chargement du modèle de traduction DE-EN...")
-    tokenizer_de_en = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-de-en")
-    model_de_en = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-de-en")
-    
-    print("Chargement du modèle de traduction EN-FR...")
-    tokenizer_en_fr = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-en-fr")
-    model_en_fr = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-en-fr")
-    
-    return {
-        'de_en': (tokenizer_de_en, model_de_en),
-        'en_fr': (tokenizer_en_fr, model_en_fr)
-    }
+EXAMPLES_DB_PATH = "examples.sqlite"
+GENERATION_BATCH_SIZE = 32  # Prompts par appel à generate (4 prompts par mot)
 
-def load_text_generator():
+def _load_text_generator():
     """Chargement du modèle de génération de texte allemand"""
+    from transformers import GPT2LMHeadModel, AutoTokenizer
+
     print("Chargement du modèle de génération de texte allemand...")
     model_name = "benjamin/gpt2-wechsel-german"
     print(f"Chargement du modèle {model_name}...")
     tokenizer_gpt2 = AutoTokenizer.from_pretrained(model_name, padding_side='left')
-    model_gpt2 = GPT2LMHeadModel.from_pretrained(model_name)
+    model_gpt2 = GPT2LMHeadModel.from_pretrained(model_name, **pretrained_kwargs())
     tokenizer_gpt2.pad_token = tokenizer_gpt2.eos_token
     tokenizer_gpt2.padding_side = 'left'
     return tokenizer_gpt2, model_gpt2
 
-def translate_text(text, models, source_lang='en'):
+TEXT_GENERATOR = registry.register("gpt2-german", _load_text_generator)
+
+def load_text_generator():
+    """Modèle de génération de texte allemand, chargé au premier appel"""
+    return registry.get(TEXT_GENERATOR)
+
+def translate_text(text, models=None, source_lang='en', memo=None):
     """Traduction d'un texte vers le français
     
     Args:
         text: Texte à traduire
-        models: Dictionnaire contenant les modèles de traduction
+        models: Conservé pour compatibilité, les modèles viennent de translation_routes
         source_lang: Langue source ('de' pour allemand, 'en' pour anglais)
+        memo: Mémoire de traduction consultée avant le modèle (par défaut celle du processus)
     """
-    if source_lang == 'de':
-        # Traduction allemand -> anglais -> français
-        tokenizer_de_en, model_de_en = models['de_en']
-        tokenizer_en_fr, model_en_fr = models['en_fr']
-        
-        # Première traduction : DE -> EN
-        inputs_de = tokenizer_de_en(text, return_tensors="pt", padding=True)
-        outputs_de = model_de_en.generate(**inputs_de)
-        english = tokenizer_de_en.decode(outputs_de[0], skip_special_tokens=True)
-        
-        # Deuxième traduction : EN -> FR
-        inputs_en = tokenizer_en_fr(english, return_tensors="pt", padding=True)
-        outputs_en = model_en_fr.generate(**inputs_en)
-        return tokenizer_en_fr.decode(outputs_en[0], skip_special_tokens=True)
-    else:
-        # Traduction directe anglais -> français
-        tokenizer_en_fr, model_en_fr = models['en_fr']
-        inputs = tokenizer_en_fr(text, return_tensors="pt", padding=True)
-        outputs = model_en_fr.generate(**inputs)
-        return tokenizer_en_fr.decode(outputs[0], skip_special_tokens=True)
+    # Modèle direct si disponible (ex. opus-mt-de-fr), sinon pivot par l'anglais
+    return translate_route([text], source_lang, 'fr', memo=memo or get_memo())[0]
+
+def build_prompts(word, word_type):
+    """Prompts selon le type de mot avec des phrases très simples"""
+    if word_type and word_type.lower().startswith('v'):
+        return [
+            f"Ich {word} gern.",
+            f"Er {word} jetzt.",
+            f"Wir {word} hier.",
+            f"Sie {word} morgen."
+        ]
+    elif word_type and word_type.lower().startswith('adj'):
+        return [
+            f"Es ist {word}.",
+            f"Sehr {word}!",
+            f"Das ist {word}.",
+            f"Der Tag ist {word}."
+        ]
+    else:  # Noms par défaut
+        return [
+            f"Das {word}!",
+            f"Ein {word}, bitte.",
+            f"Ich brauche das {word}.",
+            f"Wo ist das {word}?"
+        ]
+
+def generate_german_sentences(prompts, text_generator, batch_size=GENERATION_BATCH_SIZE):
+    """Génère une phrase allemande par prompt, via le serveur de modèles s'il tourne"""
+    if use_model_server():
+        return get_client().generate(prompts, batch_size)
+    return generate_german_sentences_local(prompts, text_generator, batch_size)
+
+def generate_german_sentences_local(prompts, text_generator, batch_size=GENERATION_BATCH_SIZE):
+    """Génère une phrase allemande par prompt avec le modèle de ce processus, par batchs paddés à gauche"""
+    tokenizer_gpt2, model_gpt2 = text_generator
+    sentences = []
+    for start in range(0, len(prompts), batch_size):
+        batch = prompts[start:start + batch_size]
+        inputs = tokenizer_gpt2(batch, return_tensors="pt", padding=True, truncation=True)
+        outputs = model_gpt2.generate(
+            inputs.input_ids,
+            attention_mask=inputs.attention_mask,
+            pad_token_id=tokenizer_gpt2.eos_token_id,
+            # Le padding à gauche allonge les prompts courts: on borne les tokens générés
+            max_new_tokens=45,
+            num_beams=5,
+            no_repeat_ngram_size=2,
+            top_k=50,
+            top_p=0.95,
+            temperature=0.7,
+            do_sample=True
+        )
+        sentences.extend(tokenizer_gpt2.batch_decode(outputs, skip_special_tokens=True))
+    return [sentence.strip() for sentence in sentences]
+
+def generate_examples_batch(words, text_generator, batch_size=GENERATION_BATCH_SIZE, memo=None):
+    """Génère et traduit les phrases d'exemple de plusieurs mots à la fois
+
+    Args:
+        words: Liste de couples (mot, type de mot)
+        text_generator: Tokenizer et modèle GPT-2 (load_text_generator)
+        batch_size: Nombre de prompts par appel à generate
+
+    Retourne un dictionnaire mot -> liste d'exemples {'de', 'en', 'fr'}.
+    """
+    memo = memo or get_memo()
+    prompts = [(word, prompt) for word, word_type in words for prompt in build_prompts(word, word_type)]
+
+    german = generate_german_sentences([prompt for _, prompt in prompts], text_generator, batch_size)
+    # Toutes les phrases sont traduites ensemble, chaque étape en batchs
+    english = translate_route(german, 'de', 'en', batch_size, memo=memo)
+    french = translate_route(english, 'en', 'fr', batch_size, memo=memo)
+
+    examples = {word: [] for word, _ in words}
+    for (word, _), de, en, fr in zip(prompts, german, english, french):
+        examples[word].append({'de': de, 'en': en, 'fr': fr})
+    return examples
 
 def generate_example_sentences(word, word_type, translation_models, text_generator):
-    """Génère et traduit trois phrases d'exemple très simples pour l'apprentissage de la langue"""
-    examples = []
-    
+    """Génère et traduit les phrases d'exemple d'un seul mot"""
     try:
-        tokenizer_gpt2, model_gpt2 = text_generator
-        
-        # Prompts selon le type de mot avec des phrases très simples
-        if word_type and word_type.lower().startswith('v'):
-            prompts = [
-                f"Ich {word} gern.",
-                f"Er {word} jetzt.",
-                f"Wir {word} hier.",
-                f"Sie {word} morgen."
-            ]
-        elif word_type and word_type.lower().startswith('adj'):
-            prompts = [
-                f"Es ist {word}.",
-                f"Sehr {word}!",
-                f"Das ist {word}.",
-                f"Der Tag ist {word}."
-            ]
-        else:  # Noms par défaut
-            prompts = [
-                f"Das {word}!",
-                f"Ein {word}, bitte.",
-                f"Ich brauche das {word}.",
-                f"Wo ist das {word}?"
-            ]
-    
-        # Configuration des modèles de traduction
-        tokenizer_de_en, model_de_en = translation_models['de_en']
-        tokenizer_en_fr, model_en_fr = translation_models['en_fr']
-        
-        # Génération et traduction des phrases
-        for prompt in prompts:
-            # Génération de la phrase en allemand
-            inputs = tokenizer_gpt2(prompt, return_tensors="pt", padding=True, truncation=True)
-            outputs = model_gpt2.generate(
-                inputs.input_ids,
-                max_length=50,
-                num_beams=5,
-                no_repeat_ngram_size=2,
-                top_k=50,
-                top_p=0.95,
-                temperature=0.7,
-                do_sample=True
-            )
-            german_sentence = tokenizer_gpt2.decode(outputs[0], skip_special_tokens=True)
-            
-            # Traduction en anglais
-            inputs_de = tokenizer_de_en(german_sentence, return_tensors="pt", padding=True)
-            outputs_de = model_de_en.generate(**inputs_de)
-            english = tokenizer_de_en.decode(outputs_de[0], skip_special_tokens=True)
-            
-            # Traduction en français
-            inputs_en = tokenizer_en_fr(english, return_tensors="pt", padding=True)
-            outputs_en = model_en_fr.generate(**inputs_en)
-            french = tokenizer_en_fr.decode(outputs_en[0], skip_special_tokens=True)
-            
-            examples.append({
-                'de': german_sentence,
-                'en': english,
-                'fr': french
-            })
-        
-        return examples
-        
+        return generate_examples_batch([(word, word_type)], text_generator)[word]
     except Exception as e:
         print(f"Erreur lors de la génération de phrases: {str(e)}")
         return []  # Retourner une liste vide en cas d'erreur
 
+def setup_examples_store(db_path=EXAMPLES_DB_PATH):
+    """Base SQLite des phrases d'exemple (remplace les fichiers examples_{mot}.json)"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS examples (
+            word TEXT NOT NULL,
+            word_type TEXT,
+            position INTEGER NOT NULL,
+            de TEXT NOT NULL,
+            en TEXT,
+            fr TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (word, position)
+        )
+    """)
+    conn.commit()
+    return conn
+
+def known_example_words(conn):
+    return {row[0] for row in conn.execute("SELECT DISTINCT word FROM examples")}
+
+def save_examples(conn, words, examples):
+    """Enregistre les exemples d'un lot de mots en une transaction"""
+    rows = [
+        (word, word_type, position, example['de'], example['en'], example['fr'])
+        for word, word_type in words
+        for position, example in enumerate(examples.get(word, []))
+    ]
+    with conn:
+        conn.executemany("DELETE FROM examples WHERE word = ?", [(word,) for word, _ in words])
+        conn.executemany("""
+            INSERT INTO examples (word, word_type, position, de, en, fr)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+def get_examples(conn, word):
+    rows = conn.execute(
+        "SELECT de, en, fr FROM examples WHERE word = ? ORDER BY position", (word,)
+    ).fetchall()
+    return [{'de': de, 'en': en, 'fr': fr} for de, en, fr in rows]
+
+def read_words(input_file):
+    """Liste de mots: une ligne `mot<TAB>type` par mot (le type est optionnel)"""
+    words = []
+    with open(input_file, encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if parts[0].strip():
+                words.append((parts[0].strip(), parts[1].strip() if len(parts) > 1 else None))
+    return words
+
 def main():
-    # Chargement des modèles
-    translation_models = load_translation_models()
-    text_generator = load_text_generator()
-    
+    parser = argparse.ArgumentParser(description="Génération de phrases d'exemple")
+    parser.add_argument("--input", help="Fichier de mots (mot<TAB>type par ligne)")
+    parser.add_argument("--db", default=EXAMPLES_DB_PATH)
+    parser.add_argument("--words-per-batch", type=int, default=16, help="Mots traités ensemble")
+    parser.add_argument("--batch-size", type=int, default=GENERATION_BATCH_SIZE, help="Prompts par appel à generate")
+    parser.add_argument("--force", action="store_true", help="Régénérer les mots déjà présents")
+    args = parser.parse_args()
+
     # Exemple d'utilisation
     words_to_test = [
         ("Haus", "n"),        # nom
@@ -143,30 +194,55 @@ def main():
         ("Auto", "n"),        # nom
         ("schnell", "adj")    # adjectif
     ]
-    
+    words = read_words(args.input) if args.input else words_to_test
+
+    conn = setup_examples_store(args.db)
+    if not args.force:
+        known = known_example_words(conn)
+        words = [(word, word_type) for word, word_type in words if word not in known]
+    if not words:
+        print("Tous les mots ont déjà des exemples")
+        return
+
+    # Les modèles de traduction se chargent en arrière-plan pendant celui de GPT-2
+    preload('de', 'en')
+    preload('en', 'fr')
+    # Avec le serveur de modèles, GPT-2 n'est pas chargé dans ce processus
+    text_generator = None if use_model_server() else load_text_generator()
+    memo = get_memo()
+
     print("Génération d'exemples de phrases...")
-    
-    for word, word_type in tqdm(words_to_test, desc="Traitement des mots"):
+    start = time.perf_counter()
+    done = 0
+    with tqdm(total=len(words), desc="Traitement des mots") as progress:
+        for first in range(0, len(words), args.words_per_batch):
+            batch = words[first:first + args.words_per_batch]
+            try:
+                examples = generate_examples_batch(batch, text_generator, args.batch_size, memo)
+            except Exception as e:
+                print(f"Erreur lors de la génération de phrases: {str(e)}")
+                progress.update(len(batch))
+                continue
+            save_examples(conn, batch, examples)
+            done += len(batch)
+            progress.update(len(batch))
+
+    elapsed = time.perf_counter() - start
+    print(f"{done} mots traités en {elapsed:.1f}s ({done / elapsed * 3600:.0f} mots/heure)")
+    registry.report()
+
+    # Aperçu des premiers mots
+    for word, word_type in words[:5]:
         print(f"\n{'='*50}")
-        print(f"Génération d'exemples pour le mot : {word}")
-        print(f"Type de mot : {word_type}")
+        print(f"Exemples pour le mot : {word} ({word_type})")
         print(f"{'='*50}")
-        
-        # Génération des phrases d'exemple
-        examples = generate_example_sentences(word, word_type, translation_models, text_generator)
-        
-        print("Phrases d'exemple générées :")
-        for i, example in enumerate(examples, 1):
+        for i, example in enumerate(get_examples(conn, word), 1):
             print(f"\nExemple {i}:")
             print(f"DE: {example['de']}")
             print(f"EN: {example['en']}")
             print(f"FR: {example['fr']}")
-        
-        # Sauvegarde au format JSON (optionnel)
-        output_file = f"examples_{word}.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(examples, f, ensure_ascii=False, indent=2)
-        print(f"\nExemples sauvegardés dans {output_file}")
+    print(f"\nExemples sauvegardés dans {args.db}")
+    conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
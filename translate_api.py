@@ -1,20 +1,121 @@
-from fastapi import FastAPI, Request
+import asyncio
+import json
+import threading
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from transformers import MarianMTModel, MarianTokenizer
+from config import TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_WAIT_MS, TRANSLATION_CACHE_SIZE
+from model_registry import registry
+from model_server import RemoteBatcher, use_model_server
+from translation_routes import get_model, preload
+from translation_service import TranscriptJob, TranslationBatcher
 
 app = FastAPI()
 
-# Charger le modèle localement
-model_path = "./opus-mt-de-fr"
-tokenizer = MarianTokenizer.from_pretrained(model_path)
-model = MarianMTModel.from_pretrained(model_path)
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Batcher du modèle direct allemand -> français, créé au premier usage"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None and use_model_server():
+            # Les workers uvicorn partagent le modèle chargé par model_server.py
+            _batcher = RemoteBatcher('de', 'fr', TRANSLATION_BATCH_SIZE, TRANSLATION_CACHE_SIZE)
+        elif _batcher is None:
+            tokenizer, model = get_model('de', 'fr')
+            # Les requêtes concurrentes sont regroupées en un seul appel à generate
+            _batcher = TranslationBatcher(
+                tokenizer,
+                model,
+                max_batch_size=TRANSLATION_BATCH_SIZE,
+                max_wait_ms=TRANSLATION_BATCH_WAIT_MS,
+                cache_size=TRANSLATION_CACHE_SIZE
+            )
+        return _batcher
+
+async def batcher_ready():
+    """Batcher sans bloquer la boucle d'événements pendant un chargement"""
+    if _batcher is not None:
+        return _batcher
+    return await asyncio.get_running_loop().run_in_executor(None, get_batcher)
+
+@app.on_event("startup")
+async def startup_event():
+    # Le serveur répond tout de suite; le modèle se charge en arrière-plan
+    preload('de', 'fr')
 
 class TranslationRequest(BaseModel):
     text: str
 
 @app.post("/translate")
-def translate(req: TranslationRequest):
-    inputs = tokenizer(req.text, return_tensors="pt", padding=True)
-    outputs = model.generate(**inputs)
-    translated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
+async def translate(req: TranslationRequest):
+    batcher = await batcher_ready()
+    translated_text = await asyncio.wrap_future(batcher.submit(req.text))
     return {"translation": translated_text}
+
+@app.get("/translate/stats")
+async def translate_stats():
+    """Paramètres du batching, compteurs du cache et modèles chargés"""
+    stats = _batcher.stats() if _batcher is not None else {}
+    return {**stats, "models": registry.stats()}
+
+async def translated_segments(job):
+    """Indices des segments traduits, par groupe de futures terminées
+
+    Les futures du batcher sont attendues dans la boucle d'événements: aucun
+    thread n'est bloqué pendant la traduction.
+    """
+    if job.ready:
+        yield job.ready
+    wrapped = {}
+    while not job.finished():
+        for future in job.submit():
+            if future not in wrapped:
+                wrapped[future] = asyncio.wrap_future(future)
+        done, _ = await asyncio.wait(list(wrapped.values()), return_when=asyncio.FIRST_COMPLETED)
+        finished = [future for future, waiter in wrapped.items() if waiter in done]
+        for future in finished:
+            # Exception lue ici (sinon signalée par asyncio), traitée par job.collect
+            wrapped.pop(future).exception()
+        yield job.collect(finished)
+
+@app.post("/translate/transcript")
+async def translate_whole_transcript(request: Request, stream: bool = False):
+    """Traduit tous les segments d'une transcription WhisperX (format tex.json)
+
+    Le corps de la requête est lu et parsé en entier avant de commencer. Avec
+    `stream=true`, la réponse est en NDJSON: une ligne par groupe de segments
+    traduits (indice et `translation_fr`), dès qu'il est prêt, puis une ligne
+    `done`; la transcription complète n'est pas renvoyée. Les segments dont
+    la traduction a échoué gardent leur texte d'origine et sont listés dans
+    `failed` (ligne `done`, ou champ `failed` de la transcription).
+    """
+    try:
+        transcript = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corps JSON invalide")
+    segments = transcript.get("segments", []) if isinstance(transcript, dict) else None
+    if not isinstance(segments, list) or not all(isinstance(segment, dict) for segment in segments):
+        raise HTTPException(status_code=400, detail="Transcription attendue: objet avec une liste `segments`")
+    batcher = await batcher_ready()
+    job = TranscriptJob(transcript, batcher)
+
+    if not stream:
+        async for _ in translated_segments(job):
+            pass
+        if job.failed:
+            transcript["failed"] = sorted(job.failed)
+        return transcript
+
+    async def events():
+        async for indices in translated_segments(job):
+            yield json.dumps({
+                "event": "segments",
+                "done": job.done,
+                "total": job.total,
+                "segments": [{"index": index, "translation_fr": segments[index]["translation_fr"]} for index in indices]
+            }, ensure_ascii=False) + "\n"
+        yield json.dumps({"event": "done", "done": job.done, "total": job.total, "failed": sorted(job.failed)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -2,9 +2,10 @@
 import sqlite3
 import csv
 import re
-from transformers import MarianMTModel, MarianTokenizer
 import os
 from tqdm import tqdm
+from translation_memo import get_memo
+from translation_routes import preload, translate as translate_route
 import time
 
 # Configuration
@@ -36,49 +37,17 @@ def setup_database():
     conn.commit()
     return conn
 
-def load_translation_models():
-    """Chargement des modèles de traduction"""
-    print("Chargement du modèle de traduction DE-EN...")
-    tokenizer_de_en = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-de-en")
-    model_de_en = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-de-en")
-    
-    print("Chargement du modèle de traduction EN-FR...")
-    tokenizer_en_fr = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-en-fr")
-    model_en_fr = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-en-fr")
-    
-    return {
-        'de_en': (tokenizer_de_en, model_de_en),
-        'en_fr': (tokenizer_en_fr, model_en_fr)
-    }
-
-def translate_text(text, models, source_lang='en'):
+def translate_text(text, models=None, source_lang='en', memo=None):
     """Traduction d'un texte vers le français
     
     Args:
         text: Texte à traduire
-        models: Dictionnaire contenant les modèles de traduction
+        models: Conservé pour compatibilité, les modèles viennent de translation_routes
         source_lang: Langue source ('de' pour allemand, 'en' pour anglais)
+        memo: Mémoire de traduction consultée avant le modèle (par défaut celle du processus)
     """
-    if source_lang == 'de':
-        # Traduction allemand -> anglais -> français
-        tokenizer_de_en, model_de_en = models['de_en']
-        tokenizer_en_fr, model_en_fr = models['en_fr']
-        
-        # Première traduction : DE -> EN
-        inputs_de = tokenizer_de_en(text, return_tensors="pt", padding=True)
-        outputs_de = model_de_en.generate(**inputs_de)
-        english = tokenizer_de_en.decode(outputs_de[0], skip_special_tokens=True)
-        
-        # Deuxième traduction : EN -> FR
-        inputs_en = tokenizer_en_fr(english, return_tensors="pt", padding=True)
-        outputs_en = model_en_fr.generate(**inputs_en)
-        return tokenizer_en_fr.decode(outputs_en[0], skip_special_tokens=True)
-    else:
-        # Traduction directe anglais -> français
-        tokenizer_en_fr, model_en_fr = models['en_fr']
-        inputs = tokenizer_en_fr(text, return_tensors="pt", padding=True)
-        outputs = model_en_fr.generate(**inputs)
-        return tokenizer_en_fr.decode(outputs[0], skip_special_tokens=True)
+    # Modèle direct si disponible (ex. opus-mt-de-fr), sinon pivot par l'anglais
+    return translate_route([text], source_lang, 'fr', memo=memo or get_memo())[0]
 
 def parse_dictionary_line(line):
     """Parse une ligne du dictionnaire"""
@@ -202,8 +171,8 @@ def main():
     conn = setup_database()
     cursor = conn.cursor()
     
-    # Chargement des modèles de traduction
-    models = load_translation_models()
+    # Chargement du modèle allemand -> français pendant le comptage des lignes
+    preload('de', 'fr')
     
     print(f"Traitement du fichier {INPUT_FILE}...")
     total_lines = count_lines(INPUT_FILE)
@@ -228,7 +197,7 @@ def main():
             
             try:
                 # Traduction en français
-                fr_translation = translate_text(result['de'], models, source_lang='de')
+                fr_translation = translate_text(result['de'], source_lang='de')
                 
                 # Affichage des informations
                 print(f"\n{'='*50}")
@@ -3,9 +3,14 @@ import sqlite3
 import csv
 import re
 import json
-from transformers import MarianMTModel, MarianTokenizer
+import argparse
+import multiprocessing
 import os
+import queue
+import threading
 from tqdm import tqdm
+from translation_memo import get_memo
+from translation_routes import ensure_loaded, generate_batch, memo_key, preload, translate as translate_route
 import requests
 from bs4 import BeautifulSoup
 from wiktionaryparser import WiktionaryParser
@@ -16,6 +21,7 @@ DB_PATH = "dictionary.sqlite"
 INPUT_FILE = "de-en.txt"
 MODEL_PATH_EN_FR = "./opus-mt-en-fr"  # Modèle pour traduire de l'anglais vers le français
 MODEL_PATH_DE_EN = "./opus-mt-de-en"  # Modèle pour traduire de l'allemand vers l'anglais
+PIPELINE_DEPTH = 2  # blocs en attente entre lecture, traduction et écriture (mode --bulk)
 
 def setup_database():
     """Création de la base de données et de la table"""
@@ -42,49 +48,25 @@ def setup_database():
     conn.commit()
     return conn
 
-def load_translation_models():
-    """Chargement des modèles de traduction"""
-    print("Chargement du modèle de traduction DE-EN...")
-    tokenizer_de_en = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-de-en")
-    model_de_en = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-de-en")
-    
-    print("Chargement du modèle de traduction EN-FR...")
-    tokenizer_en_fr = MarianTokenizer.from_pretrained("Helsinki-NLP/opus-mt-en-fr")
-    model_en_fr = MarianMTModel.from_pretrained("Helsinki-NLP/opus-mt-en-fr")
-    
-    return {
-        'de_en': (tokenizer_de_en, model_de_en),
-        'en_fr': (tokenizer_en_fr, model_en_fr)
-    }
-
-def translate_text(text, models, source_lang='en'):
+def translate_text(text, models=None, source_lang='en', memo=None):
     """Traduction d'un texte vers le français
     
     Args:
         text: Texte à traduire
-        models: Dictionnaire contenant les modèles de traduction
+        models: Conservé pour compatibilité, les modèles viennent de translation_routes
         source_lang: Langue source ('de' pour allemand, 'en' pour anglais)
+        memo: Mémoire de traduction consultée avant le modèle (par défaut celle du processus)
     """
-    if source_lang == 'de':
-        # Traduction allemand -> anglais -> français
-        tokenizer_de_en, model_de_en = models['de_en']
-        tokenizer_en_fr, model_en_fr = models['en_fr']
-        
-        # Première traduction : DE -> EN
-        inputs_de = tokenizer_de_en(text, return_tensors="pt", padding=True)
-        outputs_de = model_de_en.generate(**inputs_de)
-        english = tokenizer_de_en.decode(outputs_de[0], skip_special_tokens=True)
-        
-        # Deuxième traduction : EN -> FR
-        inputs_en = tokenizer_en_fr(english, return_tensors="pt", padding=True)
-        outputs_en = model_en_fr.generate(**inputs_en)
-        return tokenizer_en_fr.decode(outputs_en[0], skip_special_tokens=True)
-    else:
-        # Traduction directe anglais -> français
-        tokenizer_en_fr, model_en_fr = models['en_fr']
-        inputs = tokenizer_en_fr(text, return_tensors="pt", padding=True)
-        outputs = model_en_fr.generate(**inputs)
-        return tokenizer_en_fr.decode(outputs[0], skip_special_tokens=True)
+    # Modèle direct si disponible (ex. opus-mt-de-fr), sinon pivot par l'anglais
+    return translate_route([text], source_lang, 'fr', memo=memo or get_memo())[0]
+
+def translate_batch(texts, models=None, batch_size=32):
+    """Traduction anglais -> français d'une liste de textes par batchs paddés
+
+    Les textes sont triés par longueur pour limiter le padding; les
+    traductions sont renvoyées dans l'ordre d'origine.
+    """
+    return generate_batch(texts, 'en', 'fr', batch_size)
 
 def parse_dictionary_line(line):
     """Parse une ligne du dictionnaire"""
@@ -124,13 +106,331 @@ def count_lines(filename):
     """Compte le nombre de lignes dans le fichier"""
     with open(filename, 'r', encoding='utf-8') as f:
         return sum(1 for _ in f)
-def main():
-    # Initialisation de la base de données
-    conn = setup_database()
+
+def setup_checkpoint(conn):
+    """Table de reprise: position (en octets) atteinte dans le fichier source"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS build_checkpoint (
+            input_file TEXT PRIMARY KEY,
+            byte_offset INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+def load_checkpoint(conn, input_file):
+    row = conn.execute(
+        "SELECT byte_offset FROM build_checkpoint WHERE input_file = ?", (input_file,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def save_checkpoint(conn, input_file, byte_offset):
+    conn.execute("""
+        INSERT INTO build_checkpoint (input_file, byte_offset, updated_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(input_file) DO UPDATE SET byte_offset = excluded.byte_offset, updated_at = CURRENT_TIMESTAMP
+    """, (input_file, byte_offset))
+
+def iter_entries(input_file, start_offset=0, max_lines=None):
+    """Lit le fichier en flux à partir d'une position
+
+    Produit (position après la ligne, entrée analysée ou None).
+    """
+    with open(input_file, 'rb') as file:
+        file.seek(start_offset)
+        offset = start_offset
+        for line_no, raw_line in enumerate(file):
+            if max_lines is not None and line_no >= max_lines:
+                return
+            offset += len(raw_line)
+            line = raw_line.decode('utf-8', errors='replace')
+            row = next(csv.reader([line]), None)
+            if not row:
+                yield offset, None
+                continue
+            result = parse_dictionary_line(row[0])
+            if not result or not result['wordType']:
+                yield offset, None
+                continue
+            yield offset, result
+
+def iter_chunks(entries, known, chunk_lines):
+    """Regroupe les nouvelles entrées par blocs de `chunk_lines` lignes lues
+
+    Les mots déjà en base ou déjà vus dans le fichier sont ignorés. Produit
+    (position de fin du bloc, entrées à insérer).
+    """
+    pending = []
+    lines = 0
+    offset = None
+    for offset, result in entries:
+        lines += 1
+        if result and result['de'] not in known:
+            known.add(result['de'])
+            pending.append(result)
+        if lines >= chunk_lines:
+            yield offset, pending
+            pending = []
+            lines = 0
+    if offset is not None and lines:
+        yield offset, pending
+
+_END = object()
+
+def _pipeline_get(source, stop):
+    """Éléments d'une file d'étape jusqu'à sa fin; relance l'erreur de l'étape précédente"""
+    while not stop.is_set():
+        try:
+            item = source.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+def _pipeline_put(output, item, stop):
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+def _pipeline_stage(items, function, output, stop):
+    """Thread d'une étape: applique `function` à chaque élément et le passe à l'étape suivante"""
+    try:
+        for item in items:
+            _pipeline_put(output, function(item), stop)
+            if stop.is_set():
+                return
+    except BaseException as e:
+        _pipeline_put(output, e, stop)
+    else:
+        _pipeline_put(output, _END, stop)
+
+def _shard_worker(worker_id, num_threads, batch_size, tasks, results):
+    """Processus de traduction: reçoit des shards de gloses et renvoie leurs traductions"""
+    import torch
+    torch.set_num_threads(num_threads)
+    # Seule la paire anglais -> français sert ici
+    ensure_loaded('en', 'fr')
+    results.put((worker_id, None, None, 0.0))  # Modèles chargés
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        shard_id, glosses = task
+        start = time.perf_counter()
+        translations = translate_batch(glosses, batch_size=batch_size)
+        results.put((worker_id, shard_id, translations, time.perf_counter() - start))
+
+class ShardedTranslator:
+    """Répartit la traduction des gloses sur plusieurs processus
+
+    Chaque processus charge ses propres modèles et utilise
+    `cpu_count // workers` threads torch. Seul le processus principal écrit
+    dans SQLite.
+    """
+
+    def __init__(self, workers, batch_size=32):
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        self.processes = [
+            context.Process(
+                target=_shard_worker,
+                args=(worker_id, num_threads, batch_size, self.tasks, self.results),
+                daemon=True
+            )
+            for worker_id in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.translated = [0] * workers
+        self.busy = [0.0] * workers
+        print(f"Chargement des modèles dans {workers} processus ({num_threads} threads chacun)...")
+        for _ in range(workers):
+            self._get_result()
+
+    def _get_result(self):
+        while True:
+            try:
+                return self.results.get(timeout=5)
+            except Exception:
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError("Un processus de traduction s'est arrêté")
+
+    def __call__(self, glosses):
+        # Tri par longueur puis distribution alternée: des shards de coût équivalent
+        ordered = sorted(glosses, key=len)
+        shards = [ordered[i::self.workers] for i in range(self.workers)]
+        pending = 0
+        for shard_id, shard in enumerate(shards):
+            if shard:
+                self.tasks.put((shard_id, shard))
+                pending += 1
+
+        translations = {}
+        for _ in range(pending):
+            worker_id, shard_id, shard_translations, duration = self._get_result()
+            translations.update(zip(shards[shard_id], shard_translations))
+            self.translated[worker_id] += len(shard_translations)
+            self.busy[worker_id] += duration
+        return [translations[gloss] for gloss in glosses]
+
+    def rates(self):
+        """Gloses traduites par seconde de calcul, pour chaque processus"""
+        return [
+            self.translated[i] / self.busy[i] if self.busy[i] else 0.0
+            for i in range(self.workers)
+        ]
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+
+def bulk_build(conn, input_file, batch_size=32, chunk_lines=5000, workers=1, max_lines=None):
+    """Construction en masse, reprenable après un redémarrage
+
+    Les mots déjà présents sont chargés une seule fois en mémoire, les gloses
+    anglaises uniques de chaque bloc sont traduites par batchs, et chaque bloc
+    est inséré dans une transaction qui enregistre aussi la position atteinte
+    dans le fichier. Avec `workers > 1`, les gloses de chaque bloc sont
+    réparties entre plusieurs processus de traduction.
+
+    Lecture, traduction et écriture tournent en parallèle (un thread chacune,
+    l'écriture dans le thread appelant qui possède la connexion SQLite),
+    reliées par des files de PIPELINE_DEPTH blocs: le bloc suivant est lu
+    et le précédent écrit pendant que le modèle traduit.
+
+    Retourne le nombre de mots insérés par seconde.
+    """
+    setup_checkpoint(conn)
+    start_offset = load_checkpoint(conn, input_file)
+    file_size = os.path.getsize(input_file)
+    if start_offset >= file_size:
+        print(f"{input_file} déjà entièrement traité (reprise à l'octet {start_offset}).")
+        return 0.0
+
+    if workers <= 1:
+        # Le modèle se charge pendant la lecture des mots déjà en base
+        preload('en', 'fr')
+    known = {row[0] for row in conn.execute("SELECT de FROM dictionary")}
+    print(f"{len(known)} mots déjà en base, reprise à l'octet {start_offset}/{file_size}")
+
+    if workers > 1:
+        # Les lectures (dict_cli) ne bloquent pas l'écrivain unique
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        translate = ShardedTranslator(workers, batch_size)
+    else:
+        translate = lambda glosses: translate_batch(glosses, batch_size=batch_size)
+
+    # Les gloses déjà traduites (ici ou lors d'un build précédent) ne passent pas par le modèle
+    memo = get_memo()
+    translate_models = translate
+    translate = lambda glosses: memo.translate(memo_key('en', 'fr'), 'en', glosses, translate_models)
+
+    def translate_chunk(chunk):
+        offset, entries = chunk
+        glosses = list(dict.fromkeys(entry['en'] for entry in entries))
+        try:
+            return offset, entries, dict(zip(glosses, translate(glosses)))
+        except Exception as e:
+            print(f"\nErreur lors de la traduction du bloc (octet {offset}): {e}, reprise ligne par ligne")
+
+        # Une glose problématique ne doit pas arrêter le build (relancé en boucle
+        # par systemd avec Restart=on-failure): seules les lignes en échec sont ignorées
+        translations = {}
+        error = None
+        for gloss in glosses:
+            try:
+                translations[gloss] = translate([gloss])[0]
+            except Exception as e:
+                error = e
+                print(f"Glose ignorée ({gloss[:60]!r}): {e}")
+        if not translations and len(glosses) > 1:
+            # Aucune ligne traduite: le modèle lui-même est en cause, pas une glose
+            raise error
+        return offset, entries, translations
+
+    chunks = queue.Queue(maxsize=PIPELINE_DEPTH)
+    translated = queue.Queue(maxsize=PIPELINE_DEPTH)
+    stop = threading.Event()
+    stages = [
+        threading.Thread(
+            target=_pipeline_stage,
+            args=(iter_chunks(iter_entries(input_file, start_offset, max_lines), known, chunk_lines),
+                  lambda chunk: chunk, chunks, stop),
+            name="lecture", daemon=True
+        ),
+        threading.Thread(
+            target=_pipeline_stage,
+            args=(_pipeline_get(chunks, stop), translate_chunk, translated, stop),
+            name="traduction", daemon=True
+        ),
+    ]
+
+    inserted = 0
+    skipped = 0
+    started = time.perf_counter()
+    pbar = tqdm(total=file_size, initial=start_offset, unit='B', unit_scale=True, desc="Traitement des mots")
+    previous_offset = start_offset
+    for stage in stages:
+        stage.start()
+    try:
+        for offset, entries, translations in _pipeline_get(translated, stop):
+            rows = [
+                (entry['de'], entry['en'], translations[entry['en']], entry['wordType'])
+                for entry in entries
+                if entry['en'] in translations
+            ]
+            with conn:
+                conn.executemany("""
+                    INSERT INTO dictionary (de, en, fr, wordType)
+                    VALUES (?, ?, ?, ?)
+                """, rows)
+                save_checkpoint(conn, input_file, offset)
+
+            inserted += len(rows)
+            skipped += len(entries) - len(rows)
+            pbar.update(offset - previous_offset)
+            previous_offset = offset
+            pbar.set_postfix({
+                "Insérés": inserted,
+                "Entrées/s": f"{inserted / (time.perf_counter() - started):.1f}"
+            })
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+        pbar.close()
+        if workers > 1:
+            translate_models.close()
+
+    elapsed = time.perf_counter() - started
+    rate = inserted / elapsed if elapsed else 0.0
+    print(f"{inserted} nouveaux mots insérés en {elapsed:.1f}s ({rate:.1f} entrées/s)")
+    if skipped:
+        print(f"{skipped} mots ignorés (traduction en échec)")
+    print(f"Mémoire de traduction: {memo.stats()['session_hit_rate']:.1%} de gloses déjà connues")
+    if workers > 1:
+        for worker_id, worker_rate in enumerate(translate_models.rates()):
+            print(f"  Processus {worker_id}: {worker_rate:.1f} gloses/s")
+    return rate
+
+def build_row_by_row(conn):
+    """Construction historique: une traduction et une vérification par ligne"""
     cursor = conn.cursor()
     
-    # Chargement des modèles de traduction
-    models = load_translation_models()
+    # Chargement du modèle anglais -> français pendant le comptage des lignes
+    preload('en', 'fr')
     
     print(f"Traitement du fichier {INPUT_FILE}...")
     total_lines = count_lines(INPUT_FILE)
@@ -155,7 +455,7 @@ def main():
             
             try:
                 # Traduction en français
-                fr_translation = translate_text(result['en'], models)
+                fr_translation = translate_text(result['en'])
                 
                 # Récupération des définitions et génération des exemples
                 print(f"\n{'='*50}")
@@ -190,6 +490,28 @@ def main():
     
     # Commit final
     conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit le dictionnaire allemand-anglais-français")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Construction par batchs, reprenable à partir du dernier point de contrôle")
+    parser.add_argument("--batch-size", type=int, default=32, help="Taille des batchs de traduction")
+    parser.add_argument("--chunk-lines", type=int, default=5000,
+                        help="Lignes lues entre deux transactions (mode --bulk)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processus de traduction en parallèle (mode --bulk)")
+    parser.add_argument("--max-lines", type=int, default=None,
+                        help="Nombre maximum de lignes lues (mesures de débit)")
+    args = parser.parse_args()
+
+    # Initialisation de la base de données
+    conn = setup_database()
+    cursor = conn.cursor()
+
+    if args.bulk:
+        bulk_build(conn, INPUT_FILE, args.batch_size, args.chunk_lines, args.workers, args.max_lines)
+    else:
+        build_row_by_row(conn)
     
     # Afficher les statistiques
     cursor.execute("SELECT COUNT(*) FROM dictionary")
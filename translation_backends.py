@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Backends d'inférence des modèles Marian
+
+  - "torch" : PyTorch float32 (comportement historique);
+  - "int8"  : quantification dynamique int8 des couches Linear (PyTorch seul);
+  - "onnx"  : export ONNX exécuté par ONNX Runtime (paquet optionnel
+              `optimum[onnxruntime]`). L'export est fait une fois puis réutilisé
+              depuis TRANSLATION_ONNX_DIR.
+
+Tous les backends exposent la même méthode `generate`, ce qui permet de les
+utiliser sans changement dans TranslationBatcher et translation_routes.
+"""
+import os
+from config import TRANSLATION_ONNX_DIR
+from model_registry import pretrained_kwargs
+
+BACKENDS = ("torch", "int8", "onnx")
+
+def onnx_path(name):
+    """Répertoire de l'export ONNX d'un modèle (nom du Hub aplati)"""
+    return os.path.join(TRANSLATION_ONNX_DIR, name.replace("/", "--"))
+
+def _load_torch(location):
+    from transformers import MarianMTModel
+    return MarianMTModel.from_pretrained(location, **pretrained_kwargs())
+
+def _load_int8(location):
+    import torch
+    model = _load_torch(location)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _load_onnx(location, name):
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("Le backend onnx nécessite le paquet optimum[onnxruntime]")
+
+    # ONNX Runtime ignore OMP_NUM_THREADS: le budget du superviseur lui est passé explicitement
+    options = {}
+    threads = int(os.getenv("OMP_NUM_THREADS", "0") or 0)
+    if threads > 0:
+        import onnxruntime
+        options["session_options"] = onnxruntime.SessionOptions()
+        options["session_options"].intra_op_num_threads = threads
+
+    path = onnx_path(name)
+    if os.path.isdir(path):
+        return ORTModelForSeq2SeqLM.from_pretrained(path, **options)
+
+    print(f"Export ONNX de {name} vers {path}...")
+    model = ORTModelForSeq2SeqLM.from_pretrained(location, export=True, **options)
+    model.save_pretrained(path)
+    return model
+
+def load_marian(location, name, backend="torch"):
+    """Tokenizer et modèle Marian pour le backend demandé"""
+    from transformers import MarianTokenizer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de traduction inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+    tokenizer = MarianTokenizer.from_pretrained(location)
+    if backend == "onnx":
+        model = _load_onnx(location, name)
+    elif backend == "int8":
+        model = _load_int8(location)
+    else:
+        model = _load_torch(location)
+    return tokenizer, model
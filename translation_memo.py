@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Mémoire de traduction persistante partagée par les scripts de traduction
+
+Chaque traduction est enregistrée sous la clé (modèle et backend, langue
+source, texte normalisé; voir translation_routes.memo_key): une glose ou une
+phrase déjà traduite par le même modèle n'est plus envoyée au modèle.
+
+Usage:
+    python translation_memo.py stats
+    python translation_memo.py compact [--max-entries N] [--older-than-days J]
+"""
+import argparse
+import sqlite3
+import threading
+from translation_service import normalize_text
+
+MEMO_DB_PATH = "translation_memo.sqlite"
+
+class TranslationMemo:
+    def __init__(self, db_path=MEMO_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memo (
+                model TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                source_text TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (model, source_lang, source_text)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model, source_lang, texts):
+        """Traductions connues, indexées par texte normalisé"""
+        keys = list(dict.fromkeys(normalize_text(text) for text in texts))
+        found = {}
+        with self.lock:
+            # Par paquets pour rester sous la limite de paramètres de SQLite
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                rows = self.conn.execute(f"""
+                    SELECT source_text, translation
+                    FROM translation_memo
+                    WHERE model = ? AND source_lang = ? AND source_text IN ({placeholders})
+                """, (model, source_lang, *batch)).fetchall()
+                found.update(rows)
+            if found:
+                self.conn.executemany("""
+                    UPDATE translation_memo
+                    SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP
+                    WHERE model = ? AND source_lang = ? AND source_text = ?
+                """, [(model, source_lang, key) for key in found])
+                self.conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, source_lang, pairs):
+        """Enregistre des couples (texte source, traduction)"""
+        with self.lock:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO translation_memo (model, source_lang, source_text, translation)
+                VALUES (?, ?, ?, ?)
+            """, [(model, source_lang, normalize_text(text), translation) for text, translation in pairs])
+            self.conn.commit()
+
+    def translate(self, model, source_lang, texts, translate_fn):
+        """Traduit une liste de textes en n'envoyant au modèle que les textes inconnus
+
+        `translate_fn` reçoit la liste des textes manquants et retourne leurs
+        traductions dans le même ordre.
+        """
+        known = self.get_many(model, source_lang, texts)
+        missing = [key for key in dict.fromkeys(normalize_text(text) for text in texts) if key not in known]
+        if missing:
+            translations = translate_fn(missing)
+            self.put_many(model, source_lang, zip(missing, translations))
+            known.update(zip(missing, translations))
+        return [known[normalize_text(text)] for text in texts]
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            rows = self.conn.execute("""
+                SELECT model, source_lang, COUNT(*), SUM(hits)
+                FROM translation_memo
+                GROUP BY model, source_lang
+            """).fetchall()
+        return {
+            "session_hits": self.hits,
+            "session_misses": self.misses,
+            "session_hit_rate": self.hits / total if total else 0.0,
+            "models": [
+                {"model": model, "source_lang": lang, "entries": count, "hits": hits or 0}
+                for model, lang, count, hits in rows
+            ]
+        }
+
+    def compact(self, max_entries=None, older_than_days=None):
+        """Supprime les entrées anciennes ou les moins récemment utilisées, puis VACUUM
+
+        Retourne le nombre d'entrées supprimées.
+        """
+        with self.lock:
+            removed = 0
+            if older_than_days is not None:
+                removed += self.conn.execute(
+                    "DELETE FROM translation_memo WHERE last_used_at < datetime('now', ?)",
+                    (f"-{older_than_days} days",)
+                ).rowcount
+            if max_entries is not None:
+                removed += self.conn.execute("""
+                    DELETE FROM translation_memo
+                    WHERE (model, source_lang, source_text) IN (
+                        SELECT model, source_lang, source_text
+                        FROM translation_memo
+                        ORDER BY last_used_at DESC, hits DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                """, (max_entries,)).rowcount
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        self.conn.close()
+
+_memo = None
+_memo_lock = threading.Lock()
+
+def get_memo():
+    """Mémoire de traduction du processus, ouverte au premier usage"""
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = TranslationMemo()
+        return _memo
+
+def main():
+    parser = argparse.ArgumentParser(description="Mémoire de traduction")
+    parser.add_argument("--db", default=MEMO_DB_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Affiche le contenu de la mémoire")
+    compact = subparsers.add_parser("compact", help="Supprime des entrées et compacte le fichier")
+    compact.add_argument("--max-entries", type=int, help="Garder au plus N entrées (les plus récemment utilisées)")
+    compact.add_argument("--older-than-days", type=int, help="Supprimer les entrées inutilisées depuis J jours")
+    args = parser.parse_args()
+
+    memo = TranslationMemo(args.db)
+    if args.command == "stats":
+        stats = memo.stats()
+        print(f"{'modèle':<45}{'langue':>8}{'entrées':>10}{'hits':>10}")
+        for row in stats["models"]:
+            print(f"{row['model']:<45}{row['source_lang']:>8}{row['entries']:>10}{row['hits']:>10}")
+        entries = sum(row["entries"] for row in stats["models"])
+        hits = sum(row["hits"] for row in stats["models"])
+        # Chaque entrée a été manquée une fois avant d'être enregistrée
+        print(f"\nTaux de réutilisation cumulé: {hits / (hits + entries) if entries else 0.0:.1%}")
+    else:
+        removed = memo.compact(args.max_entries, args.older_than_days)
+        print(f"{removed} entrées supprimées")
+    memo.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Registre des routes de traduction
+
+Une route est la suite de modèles Marian utilisée pour aller d'une langue à
+une autre: le modèle direct s'il est disponible, sinon un pivot par
+TRANSLATION_PIVOT_LANG. Chaque modèle est déclaré dans model_registry, chargé
+au premier usage une seule fois par processus et partagé par tous les appelants.
+"""
+import os
+import time
+from config import TRANSLATION_MODELS, TRANSLATION_PIVOT_LANG, TRANSLATION_ALLOW_DOWNLOAD, TRANSLATION_BACKEND
+from model_registry import registry
+from model_server import get_client, use_model_server
+from translation_backends import load_marian
+from translation_service import observe_generate
+
+def register_model(source, target, name, local=None):
+    """Déclare (ou remplace) le modèle d'une paire de langues"""
+    TRANSLATION_MODELS[(source, target)] = {"name": name, "local": local}
+
+def model_name(source, target):
+    """Nom canonique du modèle d'une paire"""
+    return TRANSLATION_MODELS[(source, target)]["name"]
+
+def memo_key(source, target, backend=None):
+    """Clé de la mémoire de traduction: modèle et backend d'inférence
+
+    Les backends ne produisent pas exactement les mêmes traductions (int8,
+    ONNX): une traduction n'est réutilisée que pour le même couple. Quand le
+    serveur de modèles traduit, c'est son backend qui compte.
+    """
+    if backend is None:
+        backend = get_client().backend() if use_model_server() else TRANSLATION_BACKEND
+    return f"{model_name(source, target)}:{backend}"
+
+def model_location(source, target):
+    """Copie locale si elle existe, sinon identifiant du Hub (ou None)"""
+    entry = TRANSLATION_MODELS.get((source, target))
+    if not entry:
+        return None
+    if entry.get("local") and os.path.isdir(entry["local"]):
+        return entry["local"]
+    return entry["name"] if TRANSLATION_ALLOW_DOWNLOAD else None
+
+def is_available(source, target):
+    return model_location(source, target) is not None
+
+def resolve_route(source, target):
+    """Liste des paires à enchaîner pour traduire de `source` vers `target`"""
+    if is_available(source, target):
+        return [(source, target)]
+    pivot = TRANSLATION_PIVOT_LANG
+    if pivot not in (source, target) and is_available(source, pivot) and is_available(pivot, target):
+        return [(source, pivot), (pivot, target)]
+    raise ValueError(f"Aucun modèle de traduction disponible pour {source} -> {target}")
+
+def model_key(source, target, backend=None):
+    """Déclare le modèle d'une paire dans le registre et retourne son nom"""
+    backend = backend or TRANSLATION_BACKEND
+
+    def load():
+        location = model_location(source, target)
+        if location is None:
+            raise ValueError(f"Modèle {source} -> {target} indisponible")
+        print(f"Chargement du modèle de traduction {source.upper()}-{target.upper()} ({location}, {backend})...")
+        return load_marian(location, model_name(source, target), backend)
+
+    return registry.register(f"marian:{source}-{target}:{backend}", load)
+
+def get_model(source, target, backend=None):
+    """Tokenizer et modèle d'une paire, chargés au premier appel
+
+    `backend` vaut par défaut TRANSLATION_BACKEND (voir translation_backends).
+    """
+    return registry.get(model_key(source, target, backend))
+
+def preload(source, target="fr", backend=None):
+    """Précharge en arrière-plan les modèles de la route source -> target
+
+    Ne fait rien quand le serveur de modèles sert les traductions.
+    """
+    if use_model_server():
+        return None
+    return registry.preload([model_key(s, t, backend) for s, t in resolve_route(source, target)])
+
+def ensure_loaded(source, target="fr", backend=None):
+    """Charge les modèles de la route (ou rien si le serveur de modèles les sert)"""
+    if not use_model_server():
+        for s, t in resolve_route(source, target):
+            get_model(s, t, backend)
+
+def generate_batch(texts, source, target, batch_size=32):
+    """Traduit des textes avec le modèle d'une seule paire, par batchs paddés triés par longueur"""
+    if use_model_server():
+        return get_client().translate(texts, source, target)
+    tokenizer, model = get_model(source, target)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    translations = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        inputs = tokenizer([texts[i] for i in indices], return_tensors="pt", padding=True, truncation=True)
+        begin = time.perf_counter()
+        outputs = model.generate(**inputs)
+        observe_generate(f"{source}-{target}", tokenizer, inputs, outputs, time.perf_counter() - begin)
+        for i, translation in zip(indices, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+            translations[i] = translation
+    return translations
+
+def translate_along(texts, route, batch_size=32, memo=None):
+    """Traduit des textes en suivant explicitement une route"""
+    texts = list(texts)
+    for source, target in route:
+        translate_hop = lambda missing, s=source, t=target: generate_batch(missing, s, t, batch_size)
+        if memo is not None:
+            texts = memo.translate(memo_key(source, target), source, texts, translate_hop)
+        else:
+            texts = translate_hop(texts)
+    return texts
+
+def translate(texts, source, target="fr", batch_size=32, memo=None):
+    """Traduit une liste de textes par la meilleure route disponible"""
+    if not texts:
+        return []
+    return translate_along(texts, resolve_route(source, target), batch_size, memo)
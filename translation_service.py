@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from queue import Queue, Empty
+from metrics import SIZE_BUCKETS, counter, histogram
+
+GENERATE_SECONDS = histogram("marian_generate_seconds", "Durée d'un appel à generate des modèles Marian", ["pair"])
+GENERATE_BATCH_SIZE = histogram("marian_batch_size", "Textes par appel à generate", ["pair"], SIZE_BUCKETS)
+GENERATE_TOKENS = counter("marian_tokens_total", "Tokens traités par generate (hors padding)", ["pair", "direction"])
+
+def normalize_text(text):
+    """Normalise un texte source pour servir de clé de cache"""
+    return re.sub(r"\s+", " ", text).strip()
+
+def observe_generate(pair, tokenizer, inputs, outputs, duration):
+    """Enregistre la durée, la taille du batch et les tokens d'un appel à generate"""
+    GENERATE_SECONDS.labels(pair).observe(duration)
+    GENERATE_BATCH_SIZE.labels(pair).observe(len(inputs["input_ids"]))
+    GENERATE_TOKENS.labels(pair, "input").inc(int(inputs["attention_mask"].sum()))
+    GENERATE_TOKENS.labels(pair, "output").inc(int((outputs != tokenizer.pad_token_id).sum()))
+
+class TranslationCache:
+    """Cache LRU borné des traductions, partagé entre threads"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+class TranslationBatcher:
+    """Regroupe les demandes de traduction concurrentes en un seul appel à generate
+
+    Les demandes arrivant pendant `max_wait_ms` sont rassemblées (jusqu'à
+    `max_batch_size`), traduites ensemble dans un batch paddé, puis les
+    résultats sont renvoyés à chaque appelant via un Future.
+    """
+
+    def __init__(self, tokenizer, model, max_batch_size=32, max_wait_ms=5, cache_size=10000, pair="de-fr"):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.pair = pair  # label des métriques
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.cache = TranslationCache(cache_size)
+        self.requests = Queue()
+        self.batches = 0
+        self.batched_texts = 0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, text):
+        """Soumet un texte et retourne un Future contenant sa traduction"""
+        key = normalize_text(text)
+        future = Future()
+        cached = self.cache.get(key)
+        if cached is not None:
+            future.set_result(cached)
+            return future
+        self.requests.put((key, future))
+        return future
+
+    def translate(self, text):
+        """Traduction bloquante d'un texte"""
+        return self.submit(text).result()
+
+    def translate_batch(self, texts):
+        """Traduit directement une liste de textes en un seul appel à generate"""
+        if not texts:
+            return []
+        inputs = self.tokenizer(list(texts), return_tensors="pt", padding=True)
+        start = time.perf_counter()
+        outputs = self.model.generate(**inputs)
+        observe_generate(self.pair, self.tokenizer, inputs, outputs, time.perf_counter() - start)
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+    def _collect(self):
+        """Attend une première demande puis celles arrivant dans la fenêtre"""
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Un même texte demandé plusieurs fois dans la fenêtre n'est traduit qu'une fois
+            pending = OrderedDict()
+            for key, future in batch:
+                pending.setdefault(key, []).append(future)
+
+            try:
+                translations = self.translate_batch(list(pending))
+            except Exception as e:
+                for futures in pending.values():
+                    for future in futures:
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_texts += len(pending)
+            for (key, futures), translation in zip(pending.items(), translations):
+                self.cache.put(key, translation)
+                for future in futures:
+                    future.set_result(translation)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "average_batch_size": self.batched_texts / self.batches if self.batches else 0.0,
+            "queued": self.requests.qsize(),
+            "cache": self.cache.stats()
+        }
+
+class TranscriptJob:
+    """Traduction des segments d'une transcription WhisperX via `batcher.submit`
+
+    Les textes des segments sont dédupliqués puis soumis au batcher par
+    longueur croissante (moins de padding dans chaque batch), au plus `window`
+    à la fois pour ne pas retarder les autres clients du même batcher. Les
+    textes déjà en cache sont résolus immédiatement par `submit`.
+    `translation_fr` est rempli sur place à mesure que les futures aboutissent;
+    un texte dont la traduction échoue garde son texte d'origine et ses
+    segments sont notés dans `failed`.
+    """
+
+    def __init__(self, transcript, batcher, window=None):
+        self.segments = transcript.get("segments", [])
+        self.window = window or 4 * batcher.max_batch_size
+        self.batcher = batcher
+
+        # Texte normalisé -> indices des segments qui l'utilisent
+        self.positions = OrderedDict()
+        for index, segment in enumerate(self.segments):
+            self.positions.setdefault(normalize_text(segment.get("text", "")), []).append(index)
+        self.total = len(self.positions)
+        self.done = 0
+        self.failed = []
+        self.in_flight = {}
+        self.ready = self.apply("", "") if "" in self.positions else []
+        self.pending = deque(sorted(self.positions, key=len))
+
+    def apply(self, key, translation):
+        """Remplit les segments de ce texte et retourne leurs indices
+
+        Avec `translation=None` (échec), chaque segment reprend son texte.
+        """
+        indices = self.positions.pop(key)
+        for index in indices:
+            segment = self.segments[index]
+            segment["translation_fr"] = segment.get("text", "") if translation is None else translation
+        if translation is None:
+            self.failed.extend(indices)
+        self.done += 1
+        return indices
+
+    def submit(self):
+        """Complète la fenêtre de textes en cours; retourne les futures en attente"""
+        while self.pending and len(self.in_flight) < self.window:
+            key = self.pending.popleft()
+            self.in_flight[self.batcher.submit(key)] = key
+        return list(self.in_flight)
+
+    def collect(self, futures):
+        """Applique les futures terminées; retourne les indices des segments traduits"""
+        indices = []
+        for future in futures:
+            key = self.in_flight.pop(future)
+            # Une erreur du batcher ne concerne que ce texte: le reste continue
+            translation = None if future.exception() else future.result()
+            indices.extend(self.apply(key, translation))
+        return sorted(indices)
+
+    def finished(self):
+        return not self.pending and not self.in_flight
+
+def iter_translate_transcript(transcript, batcher, window=None):
+    """Remplit `translation_fr` sur chaque segment d'une transcription WhisperX
+
+    La transcription est modifiée sur place; le générateur produit
+    `(traduits, total)` à chaque groupe de traductions terminées.
+    """
+    job = TranscriptJob(transcript, batcher, window)
+    yield job.done, job.total
+    while not job.finished():
+        done, _ = wait(job.submit(), return_when=FIRST_COMPLETED)
+        job.collect(done)
+        yield job.done, job.total
+
+def translate_transcript(transcript, batcher, window=None):
+    """Version bloquante de `iter_translate_transcript`"""
+    for _ in iter_translate_transcript(transcript, batcher, window):
+        pass
+    return transcript
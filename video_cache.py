@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Cache des réponses de GET /api/videos/{id}
+
+Les corps de réponse sont stockés déjà sérialisés et compressés (gzip), dans
+un LRU en mémoire et, si VIDEO_CACHE_REDIS est actif, dans Redis pour les
+autres processus de l'API. Chaque entrée est indexée par (id, version):
+
+  - avec Redis, la version est une valeur aléatoire `video:{id}:version`,
+    supprimée par Database à chaque écriture sur la vidéo (statut,
+    transcription, suppression), quel que soit le processus qui écrit. Le
+    premier lecteur suivant vérifie que la vidéo existe encore puis tire une
+    nouvelle valeur (SET NX): une version n'est jamais réutilisée, même après
+    une perte des clés Redis;
+  - sans Redis, la version est `updated_at`, relue par une requête sur la clé
+    primaire (résolution d'une seconde).
+
+La version sert aussi d'ETag: un client qui la connaît reçoit un 304 sans
+que le corps soit relu.
+
+Côté API, les lectures passent par le client Redis asyncio partagé de
+l'application (attribut `redis`); l'invalidation, appelée depuis les workers,
+reste synchrone.
+"""
+import asyncio
+import gzip
+import secrets
+import threading
+from collections import OrderedDict
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB,
+    VIDEO_CACHE_SIZE, VIDEO_CACHE_REDIS, VIDEO_CACHE_TTL
+)
+
+_redis = None
+_redis_lock = threading.Lock()
+
+def _redis_client():
+    global _redis
+    if not VIDEO_CACHE_REDIS:
+        return None
+    with _redis_lock:
+        if _redis is None:
+            import redis
+            _redis = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+        return _redis
+
+def version_key(video_id):
+    return f"video:{video_id}:version"
+
+def body_key(video_id, version):
+    return f"video:{video_id}:body:{version}"
+
+def invalidate_videos(video_ids):
+    """Retire la version des vidéos modifiées (appelé par Database après commit)"""
+    client = _redis_client()
+    if client is None:
+        return
+    try:
+        keys = [version_key(video_id) for video_id in video_ids]
+        if keys:
+            client.delete(*keys)
+    except Exception as e:
+        # L'API relit la base tant que Redis ne répond pas (voir VideoCache.version)
+        print(f"Erreur lors de l'invalidation du cache vidéo: {e}")
+
+def invalidate_video(video_id):
+    invalidate_videos([video_id])
+
+class VideoCache:
+    """LRU local + Redis optionnel des corps JSON compressés"""
+
+    def __init__(self, db, redis_client=None, max_entries=VIDEO_CACHE_SIZE, ttl=VIDEO_CACHE_TTL):
+        self.db = db
+        # Client redis.asyncio, fourni au démarrage de l'API
+        self.redis = redis_client if VIDEO_CACHE_REDIS else None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def version(self, video_id):
+        """Version courante de la vidéo, ou None si elle n'existe pas
+
+        Lève une exception si Redis est configuré mais indisponible: l'appelant
+        sert alors la réponse sans cache.
+        """
+        if self.redis is not None:
+            version = await self.redis.get(version_key(video_id))
+            if version is not None:
+                return version.decode()
+
+        loop = asyncio.get_running_loop()
+        updated_at = await loop.run_in_executor(None, self.db.get_video_updated_at, video_id)
+        if updated_at is None:
+            return None
+        if self.redis is None:
+            return updated_at.strftime("%Y%m%d%H%M%S")
+
+        # Nouvelle version: si un autre processus l'a tirée avant nous, c'est la sienne qui compte
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(version_key(video_id), secrets.token_hex(8), nx=True)
+        pipe.get(version_key(video_id))
+        _, version = await pipe.execute()
+        return version.decode()
+
+    @staticmethod
+    def etag(video_id, version):
+        return f'"v{video_id}-{version}"'
+
+    def _local_get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def _local_put(self, key, body):
+        with self.lock:
+            # Une seule version gardée par vidéo
+            for old in [k for k in self.entries if k[0] == key[0] and k != key]:
+                del self.entries[old]
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    async def get_body(self, video_id, version, load):
+        """Corps gzip de la réponse; `load()` (bloquant, exécuté hors de la boucle) retourne le JSON ou None"""
+        key = (video_id, version)
+        body = self._local_get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        if self.redis is not None:
+            body = await self.redis.get(body_key(video_id, version))
+            if body is not None:
+                self.redis_hits += 1
+                self._local_put(key, body)
+                return body
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        payload = await loop.run_in_executor(None, load)
+        if payload is None:
+            return None
+        body = gzip.compress(payload.encode("utf-8"), compresslevel=6)
+        self._local_put(key, body)
+        if self.redis is not None:
+            await self.redis.setex(body_key(video_id, version), self.ttl, body)
+        return body
+
+    def stats(self):
+        with self.lock:
+            size = len(self.entries)
+            stored = sum(len(body) for body in self.entries.values())
+        total = self.hits + self.redis_hits + self.misses
+        return {
+            "entries": size,
+            "bytes": stored,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.redis_hits) / total if total else 0.0
+        }
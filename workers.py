@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Présence des workers dans Redis
+
+Chaque worker signale sa présence toutes les WORKER_HEARTBEAT_INTERVAL
+secondes dans le sorted set WORKERS_KEY (membre `type:hôte:pid`, score =
+dernier signal). Un worker est considéré actif tant que son dernier signal
+date de moins de WORKER_TTL secondes; les entrées plus anciennes sont purgées
+à la lecture.
+
+Le même aller-retour envoie l'instantané des métriques du processus
+(metrics.py), agrégé par l'API sur /metrics.
+"""
+import os
+import socket
+import threading
+import time
+from config import WORKERS_KEY, METRICS_KEY, WORKER_HEARTBEAT_INTERVAL, WORKER_TTL
+from metrics import queue_push
+
+def worker_id(kind):
+    return f"{kind}:{socket.gethostname()}:{os.getpid()}"
+
+class WorkerHeartbeat:
+    """Thread signalant la présence d'un worker jusqu'à `stop()`"""
+
+    def __init__(self, redis_client, kind, interval=WORKER_HEARTBEAT_INTERVAL):
+        self.redis = redis_client
+        self.member = worker_id(kind)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="worker-heartbeat", daemon=True)
+
+    def start(self):
+        self.beat()
+        self.thread.start()
+        return self
+
+    def beat(self):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(WORKERS_KEY, {self.member: time.time()})
+        queue_push(pipe, self.member)
+        pipe.execute()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"Erreur lors du signal de présence de {self.member}: {e}")
+
+    def stop(self):
+        """Arrêt propre: le worker disparaît immédiatement du décompte"""
+        self.stopped.set()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrem(WORKERS_KEY, self.member)
+            pipe.hdel(METRICS_KEY, self.member)
+            pipe.execute()
+        except Exception:
+            pass
+
+def queue_active_workers(pipe):
+    """Ajoute à un pipeline (synchrone ou asyncio) la purge puis la lecture des workers
+
+    Le dernier résultat du pipeline est la liste des membres actifs.
+    """
+    pipe.zremrangebyscore(WORKERS_KEY, "-inf", time.time() - WORKER_TTL)
+    pipe.zrange(WORKERS_KEY, 0, -1)
+    return pipe
+
+def count_by_kind(members):
+    """Nombre de workers par type (transcription, translation, ...)"""
+    counts = {}
+    for member in members:
+        member = member.decode() if isinstance(member, bytes) else member
+        kind = member.split(":", 1)[0]
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+def active_workers(redis_client):
+    """Workers actifs, sous forme de liste `type:hôte:pid`"""
+    members = queue_active_workers(redis_client.pipeline()).execute()[-1]
+    return [m.decode() if isinstance(m, bytes) else m for m in members]
+
+def count_active_workers(redis_client):
+    """Nombre de workers actifs par type (transcription, translation, ...)"""
+    return count_by_kind(active_workers(redis_client))